@@ -1,4 +1,17 @@
+import os
+import sys
+
 from django.apps import AppConfig
+from django.conf import settings
+
+
+def _is_management_command():
+    """True for manage.py commands other than the development server"""
+    return (
+        len(sys.argv) > 1
+        and os.path.basename(sys.argv[0]) == "manage.py"
+        and sys.argv[1] != "runserver"
+    )
 
 
 class DeliveriesConfig(AppConfig):
@@ -6,13 +19,20 @@ class DeliveriesConfig(AppConfig):
     name = 'apps.deliveries'
 
     def ready(self):
-        """Start Kafka consumer when app is ready"""
+        """
+        Start the Kafka location consumer in this process when
+        LOCATION_CONSUMER_AUTOSTART is set. Dedicated workers run
+        `manage.py run_location_consumer` instead; other management commands
+        never start one.
+        """
+        if not settings.LOCATION_CONSUMER_AUTOSTART or _is_management_command():
+            return
         try:
             from apps.deliveries.consumers import location_consumer
             # Delay start slightly to allow Kafka to be ready
             import threading
             import time
-            
+
             def delayed_start():
                 time.sleep(2)  # Wait 2 seconds for Kafka to be ready
                 try:
@@ -20,7 +40,7 @@ class DeliveriesConfig(AppConfig):
                 except Exception as e:
                     print(f"Failed to start location consumer: {e}")
                     print("Note: If topics don't exist, run: python manage.py create_kafka_topics")
-            
+
             thread = threading.Thread(target=delayed_start, daemon=True)
             thread.start()
         except Exception as e:
@@ -0,0 +1,126 @@
+"""
+Throughput and lag metrics of the location consumer workers.
+
+Each worker keeps its counters in memory and writes them, at most once per
+flush interval, to a Redis hash with a short TTL. Workers register in a
+sorted set scored by their last heartbeat, so the metrics endpoint can list
+live workers without scanning keys.
+"""
+import json
+import os
+import time
+from typing import Any, Dict, Optional
+
+from django.conf import settings
+from infrastructure.cache import redis_client
+
+WORKERS_KEY = "location_consumer:workers"
+
+
+class ConsumerMetrics:
+    def __init__(self, worker_id: Optional[str] = None, flush_interval: float = 1.0, ttl: int = 60):
+        self._worker_id = worker_id
+        self.flush_interval = flush_interval
+        self.ttl = ttl
+        self.consumed = 0
+        self.processed = 0
+        self.skipped = 0
+        self.failed_batches = 0
+        self.last_batch_ms = 0.0
+        self.lag: Dict[str, int] = {}
+        self._window_started = time.monotonic()
+        self._window_consumed = 0
+        self._last_flush = 0.0
+
+    @property
+    def worker_id(self) -> str:
+        # Resolved per call: worker processes are forked after import
+        return self._worker_id or f"{settings.KAFKA_CLIENT_ID}-{os.getpid()}"
+
+    @staticmethod
+    def _key(worker_id) -> str:
+        return f"location_consumer:metrics:{worker_id}"
+
+    def record_batch(self, consumed: int, processed: int, skipped: int, duration: float, lag: Dict[str, int]):
+        self.consumed += consumed
+        self.processed += processed
+        self.skipped += skipped
+        self._window_consumed += consumed
+        self.last_batch_ms = duration * 1000
+        self.lag.update(lag)
+        self.flush()
+
+    def record_failure(self):
+        self.failed_batches += 1
+        self.flush()
+
+    def forget_partitions(self, partitions):
+        for partition in partitions:
+            self.lag.pop(partition, None)
+
+    def flush(self, force: bool = False):
+        now = time.monotonic()
+        if not force and now - self._last_flush < self.flush_interval:
+            return
+        elapsed = max(now - self._window_started, 1e-6)
+        metrics = {
+            "worker_id": self.worker_id,
+            "consumed": self.consumed,
+            "processed": self.processed,
+            "skipped": self.skipped,
+            "failed_batches": self.failed_batches,
+            "messages_per_second": round(self._window_consumed / elapsed, 1),
+            "last_batch_ms": round(self.last_batch_ms, 2),
+            "lag": json.dumps(self.lag),
+            "updated_at": time.time(),
+        }
+        try:
+            key = self._key(self.worker_id)
+            pipe = redis_client.pipeline()
+            pipe.delete(key)
+            pipe.hset(key, mapping=metrics)
+            pipe.expire(key, self.ttl)
+            pipe.zadd(WORKERS_KEY, {self.worker_id: time.time()})
+            pipe.execute()
+        except Exception as e:
+            print(f"Error writing location consumer metrics: {e}")
+        self._last_flush = now
+        self._window_started = now
+        self._window_consumed = 0
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Live workers' metrics plus totals across the consumer group"""
+        cutoff = time.time() - self.ttl
+        redis_client.zremrangebyscore(WORKERS_KEY, "-inf", cutoff)
+        worker_ids = redis_client.zrange(WORKERS_KEY, 0, -1)
+
+        pipe = redis_client.pipeline()
+        for worker_id in worker_ids:
+            pipe.hgetall(self._key(worker_id))
+        workers = []
+        lag = {}
+        for data in pipe.execute():
+            if not data:
+                continue
+            worker_lag = json.loads(data.get("lag") or "{}")
+            lag.update(worker_lag)
+            workers.append({
+                "worker_id": data["worker_id"],
+                "consumed": int(data["consumed"]),
+                "processed": int(data["processed"]),
+                "skipped": int(data["skipped"]),
+                "failed_batches": int(data["failed_batches"]),
+                "messages_per_second": float(data["messages_per_second"]),
+                "last_batch_ms": float(data["last_batch_ms"]),
+                "lag": worker_lag,
+                "updated_at": float(data["updated_at"]),
+            })
+        return {
+            "workers": workers,
+            "total_lag": sum(lag.values()),
+            "max_partition_lag": max(lag.values(), default=0),
+            "messages_per_second": round(sum(worker["messages_per_second"] for worker in workers), 1),
+        }
+
+
+consumer_metrics = ConsumerMetrics()
@@ -1,87 +1,316 @@
 """
-Kafka consumer for processing location update events
+Kafka consumer for processing location update events.
+
+Messages are consumed in batches. Within a batch only the newest location
+per rider is processed (messages are keyed by rider, so partition order is
+per-rider order), and the WebSocket fan-out for the survivors is sent
+concurrently. Offsets are committed per processed batch (at-least-once).
+Points older than LOCATION_CONSUMER_MAX_STALENESS_SECONDS are dropped and
+their partition jumps to the newest offset, so a consumer that fell behind
+catches up instead of replaying every stale point. Lag and throughput are
+published through consumer_metrics.
 """
-import json
+import asyncio
+import os
 import threading
-from confluent_kafka import Consumer, KafkaError
+import time
+from confluent_kafka import TIMESTAMP_NOT_AVAILABLE, Consumer, KafkaError, TopicPartition
 from django.conf import settings
 from asgiref.sync import async_to_sync
 from channels.layers import get_channel_layer
-from apps.deliveries.models import Delivery
+from apps.deliveries.consumer_metrics import consumer_metrics
+from apps.deliveries.context_cache import delivery_context_cache
+from apps.deliveries.eta import eta_service
+from apps.deliveries.route_progress import route_progress
 from apps.riders.services import rider_service
+from infrastructure.kafka_client import decode_message
 
 
 class LocationUpdateConsumer:
     """Consumes location update events from Kafka and broadcasts via WebSocket"""
     
-    def __init__(self):
-        self.consumer = Consumer({
+    def __init__(
+        self, batch_size: int, batch_timeout: float, fanout_concurrency: int, max_staleness: float
+    ):
+        self.batch_size = batch_size
+        self.batch_timeout = batch_timeout
+        self.fanout_concurrency = fanout_concurrency
+        self.max_staleness = max_staleness
+        # Next offset to commit per (topic, partition), i.e. processed so far
+        self._processed = {}
+        # Created on subscribe, so importing this module (and forking worker
+        # processes) never opens a broker connection
+        self.consumer = None
+        self.running = False
+        self.thread = None
+
+    def _create_consumer(self):
+        return Consumer({
             'bootstrap.servers': settings.KAFKA_BOOTSTRAP_SERVERS,
             'group.id': f"{settings.KAFKA_GROUP_ID}_location_updates",
+            'client.id': f"{settings.KAFKA_CLIENT_ID}-{os.getpid()}",
             'auto.offset.reset': 'latest',
-            'enable.auto.commit': True,
+            # Committed by the consume loop once a batch is processed
+            'enable.auto.commit': False,
+            # Incremental rebalances: adding or removing a worker only moves
+            # the partitions that change owner, the others keep consuming
+            'partition.assignment.strategy': 'cooperative-sticky',
         })
-        self.running = False
-        self.thread = None
-        
-    def start(self):
-        """Start consuming messages in a background thread"""
+
+    def subscribe(self) -> bool:
+        """Join the consumer group for the location topic"""
         from apps.deliveries.constants import KAFKA_TOPICS
         topic = KAFKA_TOPICS.get("RIDER_LOCATION_UPDATE")
         if not topic:
-            return
+            return False
         
         # Try to subscribe, but handle missing topic gracefully
         try:
-            self.consumer.subscribe([topic])
-            self.running = True
-            self.thread = threading.Thread(target=self._consume_loop, daemon=True)
-            self.thread.start()
+            if self.consumer is None:
+                self.consumer = self._create_consumer()
+            self.consumer.subscribe(
+                [topic], on_assign=self._on_assign, on_revoke=self._on_revoke, on_lost=self._on_lost
+            )
             print(f"Location update consumer started for topic: {topic}")
+            return True
         except Exception as e:
             print(f"Warning: Could not start location consumer for topic {topic}: {e}")
             print("Run 'python manage.py create_kafka_topics' to create the required topics.")
-        
+            return False
+
+    def start(self):
+        """Start consuming messages in a background thread"""
+        if self.running or not self.subscribe():
+            return
+        self.running = True
+        self.thread = threading.Thread(target=self._consume_loop, daemon=True)
+        self.thread.start()
+
+    def run(self):
+        """Consume in the calling thread until stop() is requested"""
+        if not self.subscribe():
+            return
+        self.running = True
+        try:
+            self._consume_loop()
+        finally:
+            self._close()
+
+    @staticmethod
+    def _format_partitions(partitions):
+        return ", ".join(f"{p.topic}[{p.partition}]" for p in partitions) or "none"
+
+    def _on_assign(self, consumer, partitions):
+        print(f"Location consumer {os.getpid()} assigned: {self._format_partitions(partitions)}")
+
+    def _on_revoke(self, consumer, partitions):
+        print(f"Location consumer {os.getpid()} revoked: {self._format_partitions(partitions)}")
+        # Hand over the revoked partitions with everything processed committed
+        revoked = {(p.topic, p.partition) for p in partitions}
+        self._commit(
+            {partition: offset for partition, offset in self._processed.items() if partition in revoked},
+            asynchronous=False,
+        )
+        self._forget(revoked)
+
+    def _on_lost(self, consumer, partitions):
+        print(f"Location consumer {os.getpid()} lost: {self._format_partitions(partitions)}")
+        # Already owned by another worker, committing would be rejected
+        self._forget({(p.topic, p.partition) for p in partitions})
+
+    def _forget(self, partitions):
+        for partition in partitions:
+            self._processed.pop(partition, None)
+        consumer_metrics.forget_partitions(f"{topic}[{partition}]" for topic, partition in partitions)
+
     def _consume_loop(self):
-        """Main consumption loop"""
+        """
+        Main consumption loop. Offsets are committed only once a batch has
+        been processed and fanned out (at-least-once); a failed batch is
+        re-read from its first offset.
+        """
         channel_layer = get_channel_layer()
         
         while self.running:
-            msg = self.consumer.poll(timeout=1.0)
-            if msg is None:
+            messages = self.consumer.consume(num_messages=self.batch_size, timeout=self.batch_timeout)
+            if not messages:
+                consumer_metrics.flush()  # heartbeat
                 continue
-                
-            if msg.error():
-                error_code = msg.error().code()
-                if error_code == KafkaError._PARTITION_EOF:
-                    continue
-                elif error_code == KafkaError.UNKNOWN_TOPIC_OR_PART:
-                    print(f"Kafka topic not found. Please run: python manage.py create_kafka_topics")
-                    # Wait a bit before retrying
-                    import time
-                    time.sleep(5)
-                    continue
-                else:
-                    print(f"Kafka error: {msg.error()}")
+
+            started = time.monotonic()
+            batch = []
+            # (topic, partition) -> [first offset, last offset] in this batch
+            offsets = {}
+            stale = set()
+            now_ms = time.time() * 1000
+            for msg in messages:
+                if msg.error():
+                    error_code = msg.error().code()
+                    if error_code == KafkaError._PARTITION_EOF:
+                        continue
+                    elif error_code == KafkaError.UNKNOWN_TOPIC_OR_PART:
+                        print(f"Kafka topic not found. Please run: python manage.py create_kafka_topics")
+                        # Wait a bit before retrying
+                        time.sleep(5)
+                        continue
+                    else:
+                        print(f"Kafka error: {msg.error()}")
+                        continue
+                partition = (msg.topic(), msg.partition())
+                offsets.setdefault(partition, [msg.offset(), msg.offset()])[1] = msg.offset()
+
+                timestamp_type, timestamp = msg.timestamp()
+                if (
+                    self.max_staleness
+                    and timestamp_type != TIMESTAMP_NOT_AVAILABLE
+                    and now_ms - timestamp > self.max_staleness * 1000
+                ):
+                    # Live locations: newest wins, a stale point is not worth sending
+                    stale.add(partition)
                     continue
-                    
+                try:
+                    batch.append(decode_message(msg.value(), msg.headers()))
+                except Exception as e:
+                    # Skipped, the rider's next ping supersedes it
+                    print(f"Error decoding location update: {e}")
+
+            try:
+                processed = self._process_batch(batch, channel_layer)
+            except Exception as e:
+                print(f"Error processing location updates, retrying batch: {e}")
+                consumer_metrics.record_failure()
+                self._rewind(offsets)
+                time.sleep(1)
+                continue
+
+            self._commit({partition: last + 1 for partition, (first, last) in offsets.items()})
+            skipped = len(messages) - len(batch) + self._skip_ahead(stale)
+            consumer_metrics.record_batch(
+                consumed=len(messages),
+                processed=processed,
+                skipped=skipped,
+                duration=time.monotonic() - started,
+                lag=self._lag(offsets),
+            )
+
+    def _commit(self, next_offsets, asynchronous=True):
+        """Commit the next offset to read per (topic, partition)"""
+        if not next_offsets:
+            return
+        self._processed.update(next_offsets)
+        try:
+            self.consumer.commit(
+                offsets=[TopicPartition(topic, partition, offset) for (topic, partition), offset in next_offsets.items()],
+                asynchronous=asynchronous,
+            )
+        except Exception as e:
+            print(f"Error committing location consumer offsets: {e}")
+
+    def _rewind(self, offsets):
+        for (topic, partition), (first, last) in offsets.items():
+            try:
+                self.consumer.seek(TopicPartition(topic, partition, first))
+            except Exception as e:
+                print(f"Error rewinding {topic}[{partition}] to {first}: {e}")
+
+    def _skip_ahead(self, partitions) -> int:
+        """
+        Jump partitions whose backlog is older than the freshness threshold
+        to their end: riders ping every few seconds, so the next points are
+        fresh. Returns how many messages were skipped.
+        """
+        skipped = 0
+        jumps = {}
+        for topic, partition in partitions:
+            try:
+                # Asks the broker: the cached watermark can predate the batch
+                # just read, the jump would then land behind the position
+                low, high = self.consumer.get_watermark_offsets(
+                    TopicPartition(topic, partition), timeout=5, cached=False
+                )
+                position = self._processed.get((topic, partition), high)
+                if high > position:
+                    self.consumer.seek(TopicPartition(topic, partition, high))
+                    skipped += high - position
+                    jumps[(topic, partition)] = high
+            except Exception as e:
+                print(f"Error skipping ahead on {topic}[{partition}]: {e}")
+        if jumps:
+            print(f"Location consumer skipped {skipped} stale messages")
+            self._commit(jumps)
+        return skipped
+
+    def _lag(self, offsets):
+        """Messages behind the high watermark per partition read in this batch"""
+        lag = {}
+        for topic, partition in offsets:
+            try:
+                low, high = self.consumer.get_watermark_offsets(TopicPartition(topic, partition), cached=True)
+            except Exception:
+                continue
+            position = self._processed.get((topic, partition))
+            if high >= 0 and position is not None:
+                lag[f"{topic}[{partition}]"] = max(high - position, 0)
+        return lag
+
+    @staticmethod
+    def coalesce(updates):
+        """Newest update per rider, in the order the riders were last seen"""
+        latest = {}
+        for data in updates:
+            rider_id = data.get('rider_id')
+            if rider_id:
+                latest.pop(rider_id, None)
+                latest[rider_id] = data
+        return list(latest.values())
+
+    def _process_batch(self, updates, channel_layer):
+        """
+        Process the newest update per rider and fan them out together.
+        Returns the number of updates processed.
+        """
+        if not channel_layer:
+            return 0
+        sends = []
+        latest = self.coalesce(updates)
+        for data in latest:
             try:
-                data = json.loads(msg.value().decode('utf-8'))
-                self._process_location_update(data, channel_layer)
+                sends.extend(self._process_location_update(data))
             except Exception as e:
                 print(f"Error processing location update: {e}")
-                
-    def _process_location_update(self, data, channel_layer):
-        """Process location update and broadcast via WebSocket"""
+        if sends:
+            async_to_sync(self._fanout)(channel_layer, sends)
+        return len(latest)
+
+    async def _fanout(self, channel_layer, sends):
+        semaphore = asyncio.Semaphore(self.fanout_concurrency)
+
+        async def send(group, message):
+            async with semaphore:
+                await channel_layer.group_send(group, message)
+
+        results = await asyncio.gather(
+            *(send(group, message) for group, message in sends), return_exceptions=True
+        )
+        # The batch is only committed once every send went out
+        errors = [result for result in results if isinstance(result, Exception)]
+        if errors:
+            raise Exception(f"{len(errors)} of {len(sends)} location sends failed: {errors[0]}")
+
+    def _process_location_update(self, data):
+        """
+        Process a location update: route progress and ETA for its delivery.
+        Returns the (group, message) WebSocket sends for it.
+        """
         rider_id = data.get('rider_id')
         delivery_id = data.get('delivery_id')
         location = data.get('location', {})
         
-        if not rider_id or not channel_layer:
-            return
+        if not rider_id:
+            return []
             
         # Notify rider channel
-        async_to_sync(channel_layer.group_send)(
+        sends = [(
             f"rider_{rider_id}",
             {
                 "type": "location_update",
@@ -91,33 +320,63 @@ class LocationUpdateConsumer:
                     "rider_id": rider_id
                 }
             }
-        )
+        )]
         
         # If delivery_id exists, notify order channel
         if delivery_id:
+            progress = None
             try:
-                delivery = Delivery.objects.get(id=delivery_id)
-                async_to_sync(channel_layer.group_send)(
-                    f"order_{delivery.order.id}",
+                progress = route_progress.on_location(delivery_id, location)
+            except Exception as e:
+                print(f"Error updating route progress for delivery {delivery_id}: {e}")
+
+            # Cheap incremental ETA, only writes/pushes when it moved enough
+            try:
+                eta_service.on_location(
+                    delivery_id,
+                    location,
+                    remaining_km=progress["remaining_km"] if progress and not progress["off_route"] else None,
+                )
+            except Exception as e:
+                print(f"Error updating ETA for delivery {delivery_id}: {e}")
+
+            context = delivery_context_cache.get(delivery_id)
+            if context:
+                sends.append((
+                    f"order_{context['order_id']}",
                     {
                         "type": "location_update",
                         "data": {
                             "rider_id": rider_id,
                             "location": location,
-                            "delivery_id": str(delivery_id)
+                            "delivery_id": str(delivery_id),
+                            "progress": progress
                         }
                     }
-                )
-            except Delivery.DoesNotExist:
-                pass
+                ))
+        return sends
                 
     def stop(self):
         """Stop consuming messages"""
         self.running = False
         if self.thread:
             self.thread.join(timeout=5)
-        self.consumer.close()
+            self._close()
+
+    def _close(self):
+        # Commits what was processed and leaves the group, so the partitions
+        # are handed to the remaining workers without waiting for a timeout
+        if self.consumer is not None:
+            self._commit(dict(self._processed), asynchronous=False)
+            self.consumer.close()
+            self.consumer = None
+            self._processed = {}
 
 
 # Global consumer instance
-location_consumer = LocationUpdateConsumer()
+location_consumer = LocationUpdateConsumer(
+    batch_size=settings.LOCATION_CONSUMER_BATCH_SIZE,
+    batch_timeout=settings.LOCATION_CONSUMER_BATCH_TIMEOUT,
+    fanout_concurrency=settings.LOCATION_CONSUMER_FANOUT_CONCURRENCY,
+    max_staleness=settings.LOCATION_CONSUMER_MAX_STALENESS_SECONDS,
+)
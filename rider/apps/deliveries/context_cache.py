@@ -0,0 +1,148 @@
+"""
+Delivery context cache (delivery_id -> order_id, rider_id, status) for the
+per-ping location fanout path.
+An in-process tier with a short TTL sits in front of Redis, the database is
+only hit on a miss in both. Entries are written at assignment time and
+refreshed/invalidated on delivery status transitions. Ids with no delivery
+are cached as a short-lived miss marker so unknown ids do not reach the
+database on every ping.
+"""
+import threading
+import time
+from typing import Any, Dict, Optional
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from infrastructure.cache import async_redis_client, redis_client
+
+CONTEXT_FIELDS = ("order_id", "rider_id", "status")
+TERMINAL_STATUSES = ("completed", "failed", "denied")
+MISSING = {"missing": "1"}
+
+
+class DeliveryContextCache:
+    def __init__(self, ttl: int, local_ttl: float, max_local_entries: int, miss_ttl: int):
+        self.ttl = ttl
+        self.miss_ttl = miss_ttl
+        self.local_ttl = local_ttl
+        self.max_local_entries = max_local_entries
+        self._local: Dict[str, tuple] = {}
+        self._lock = threading.Lock()
+
+    def get(self, delivery_id: str) -> Optional[Dict[str, Any]]:
+        delivery_id = str(delivery_id)
+        context = self._get_local(delivery_id)
+        if context:
+            return self._found(context)
+
+        key = f"delivery:context:{delivery_id}"
+        context = redis_client.hgetall(key)
+        if context:
+            self._set_local(delivery_id, context)
+            return self._found(context)
+
+        return self._load_from_db(delivery_id)
+
+    async def aget(self, delivery_id: str) -> Optional[Dict[str, Any]]:
+        """get() for the ASGI event loop: async Redis, database only off-loop"""
+        delivery_id = str(delivery_id)
+        context = self._get_local(delivery_id)
+        if context:
+            return self._found(context)
+
+        context = await async_redis_client.hgetall(f"delivery:context:{delivery_id}")
+        if context:
+            self._set_local(delivery_id, context)
+            return self._found(context)
+
+        return await sync_to_async(self._load_from_db)(delivery_id)
+
+    def set(self, delivery_id: str, context: Dict[str, Any]):
+        delivery_id = str(delivery_id)
+        context = {field: str(context[field]) for field in CONTEXT_FIELDS}
+        key = f"delivery:context:{delivery_id}"
+        pipe = redis_client.pipeline()
+        pipe.delete(key)  # may hold a miss marker
+        pipe.hset(key, mapping=context)
+        pipe.expire(key, self.ttl)
+        pipe.execute()
+        self._set_local(delivery_id, context)
+
+    def _set_missing(self, delivery_id: str):
+        key = f"delivery:context:{delivery_id}"
+        try:
+            pipe = redis_client.pipeline()
+            pipe.hset(key, mapping=MISSING)
+            pipe.expire(key, self.miss_ttl)
+            pipe.execute()
+        except Exception as e:
+            print(f"Error caching missing delivery context for {delivery_id}: {e}")
+        self._set_local(delivery_id, MISSING, ttl=min(self.local_ttl, self.miss_ttl))
+
+    @staticmethod
+    def _found(context: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        return None if context.get("missing") else context
+
+    def set_from_delivery(self, delivery):
+        """Refresh the entry after a status transition, drop it once the delivery is over"""
+        if delivery.status in TERMINAL_STATUSES:
+            self.invalidate(delivery.id)
+        else:
+            self.set(
+                delivery.id,
+                {
+                    "order_id": delivery.order_id,
+                    "rider_id": delivery.rider_id,
+                    "status": delivery.status,
+                },
+            )
+
+    def invalidate(self, delivery_id: str):
+        delivery_id = str(delivery_id)
+        redis_client.delete(f"delivery:context:{delivery_id}")
+        with self._lock:
+            self._local.pop(delivery_id, None)
+
+    def _get_local(self, delivery_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            entry = self._local.get(delivery_id)
+            if entry is None:
+                return None
+            expires_at, context = entry
+            if expires_at < time.monotonic():
+                del self._local[delivery_id]
+                return None
+            return context
+
+    def _set_local(self, delivery_id: str, context: Dict[str, Any], ttl: Optional[float] = None):
+        with self._lock:
+            if len(self._local) >= self.max_local_entries:
+                # Evict the oldest inserted entry (dicts keep insertion order)
+                self._local.pop(next(iter(self._local)))
+            self._local[delivery_id] = (time.monotonic() + (ttl or self.local_ttl), context)
+
+    def _load_from_db(self, delivery_id: str) -> Optional[Dict[str, Any]]:
+        from apps.deliveries.models import Delivery
+
+        try:
+            row = (
+                Delivery.objects.filter(id=delivery_id)
+                .values(*CONTEXT_FIELDS)
+                .first()
+            )
+        except Exception as e:
+            print(f"Error loading delivery context for {delivery_id}: {e}")
+            return None
+        if not row:
+            self._set_missing(delivery_id)
+            return None
+        self.set(delivery_id, row)
+        return self._get_local(delivery_id)
+
+
+delivery_context_cache = DeliveryContextCache(
+    ttl=settings.DELIVERY_CONTEXT_TTL,
+    local_ttl=settings.DELIVERY_CONTEXT_LOCAL_TTL,
+    max_local_entries=settings.DELIVERY_CONTEXT_LOCAL_MAX_ENTRIES,
+    miss_ttl=settings.DELIVERY_CONTEXT_MISS_TTL,
+)
@@ -0,0 +1,274 @@
+"""
+Global order-rider matching for dispatch ticks.
+
+Instead of assigning ready orders one at a time to their nearest rider, a
+tick collects every eligible order and candidate rider, builds one
+vectorized pickup distance matrix and solves a min-cost bipartite
+assignment over it. All resulting Delivery rows are committed in a single
+transaction.
+"""
+from typing import Any, Dict, List, Tuple
+
+import numpy as np
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from apps.orders.models import Order
+from apps.riders.models import Rider
+from apps.riders.services import rider_service
+
+from . import distance as geo
+from .models import Delivery
+
+
+def solve_assignment(cost) -> List[Tuple[int, int]]:
+    """
+    Min-cost rectangular assignment (Hungarian method with potentials,
+    shortest augmenting paths). `cost` is an (n, m) array where np.inf marks
+    an infeasible pair. Returns (row, col) pairs sorted by row; the number of
+    feasible pairs is maximised first, then their total cost minimised.
+    """
+    cost = np.asarray(cost, dtype=np.float64)
+    if cost.size == 0:
+        return []
+    transposed = cost.shape[0] > cost.shape[1]
+    if transposed:
+        cost = cost.T
+    n, m = cost.shape
+
+    feasible = np.isfinite(cost)
+    if not feasible.any():
+        return []
+    # Larger than any sum of feasible costs, so dropping a feasible pair never pays off
+    big = np.abs(cost[feasible]).sum() + 1.0
+    a = np.where(feasible, cost, big)
+
+    # 1-based as in the textbook formulation, column 0 is the virtual root
+    u = np.zeros(n + 1)
+    v = np.zeros(m + 1)
+    p = np.zeros(m + 1, dtype=np.int64)
+    way = np.zeros(m + 1, dtype=np.int64)
+    for i in range(1, n + 1):
+        p[0] = i
+        j0 = 0
+        minv = np.full(m + 1, np.inf)
+        used = np.zeros(m + 1, dtype=bool)
+        while True:
+            used[j0] = True
+            i0 = p[j0]
+            reduced = a[i0 - 1] - u[i0] - v[1:]
+            free = ~used[1:]
+            improve = free & (reduced < minv[1:])
+            minv[1:][improve] = reduced[improve]
+            way[1:][improve] = j0
+
+            masked = np.where(free, minv[1:], np.inf)
+            j1 = int(np.argmin(masked)) + 1
+            delta = masked[j1 - 1]
+
+            used_cols = np.nonzero(used)[0]
+            u[p[used_cols]] += delta
+            v[used_cols] -= delta
+            minv[~used] -= delta
+            j0 = j1
+            if p[j0] == 0:
+                break
+        # Flip the augmenting path
+        while j0:
+            j1 = way[j0]
+            p[j0] = p[j1]
+            j0 = j1
+
+    pairs = [
+        (int(p[j]) - 1, j - 1)
+        for j in range(1, m + 1)
+        if p[j] and feasible[p[j] - 1, j - 1]
+    ]
+    if transposed:
+        pairs = [(col, row) for row, col in pairs]
+    return sorted(pairs)
+
+
+class DispatchEngine:
+    def __init__(self, max_pickup_km: float, candidates_per_order: int):
+        self.max_pickup_km = max_pickup_km
+        self.candidates_per_order = candidates_per_order
+
+    def collect_riders(self) -> Tuple[List[Rider], np.ndarray]:
+        """
+        Available riders with a cached location, as (riders, [[lat, lng], ...]).
+        Riders without a cached location are left to the greedy path, which
+        places them on first assignment.
+        """
+        available = list(Rider.objects.filter(is_active=True, current_status="available"))
+        locations = rider_service.get_rider_locations([rider.id for rider in available])
+
+        riders = []
+        coords = []
+        for rider in available:
+            location = locations.get(str(rider.id))
+            if not location:
+                continue
+            riders.append(rider)
+            coords.append((float(location["lat"]), float(location["lng"])))
+        return riders, np.asarray(coords, dtype=np.float64).reshape(-1, 2)
+
+    def build_cost_matrix(self, orders: List[Order], rider_coords: np.ndarray) -> np.ndarray:
+        """Pickup distance (km) per order x rider, np.inf beyond the search radius"""
+        cost = geo.distance_matrix(
+            [float(order.pickup_lat) for order in orders],
+            [float(order.pickup_lng) for order in orders],
+            rider_coords[:, 0],
+            rider_coords[:, 1],
+        )
+        cost[cost > self.max_pickup_km] = np.inf
+        return cost
+
+    def plan(
+        self, orders: List[Order], riders: List[Rider], rider_coords: np.ndarray
+    ) -> List[Tuple[Order, Rider, float]]:
+        """Solve the matching for one tick, returns (order, rider, pickup_km) triples"""
+        if not orders or not riders:
+            return []
+        cost = self.build_cost_matrix(orders, rider_coords)
+
+        # Keep only each order's nearest candidates to bound the solver input
+        k = min(self.candidates_per_order, cost.shape[1])
+        nearest = np.argpartition(cost, k - 1, axis=1)[:, :k]
+        columns = np.unique(nearest[np.isfinite(np.take_along_axis(cost, nearest, axis=1))])
+        if columns.size == 0:
+            return []
+        reduced = cost[:, columns]
+
+        return [
+            (orders[row], riders[columns[col]], float(reduced[row, col]))
+            for row, col in solve_assignment(reduced)
+        ]
+
+    def dispatch(self, orders: List[Order]) -> Dict[str, Any]:
+        """Run one dispatch tick over `orders` (ready and not yet assigned)"""
+        from .services import DeliveryService
+
+        riders, rider_coords = self.collect_riders()
+        matches = self.plan(orders, riders, rider_coords)
+        matched_ids = {order.id for order, _, _ in matches}
+        unmatched = [order for order in orders if order.id not in matched_ids]
+
+        # Reserve every matched rider first so concurrent single-order
+        # assignments cannot take them; riders already reserved are skipped
+        # this tick and their orders stay ready for the next one.
+        reservations = {}
+        reserved_matches = []
+        for order, rider, distance in matches:
+            token = rider_service.reserve_rider(str(rider.id))
+            if token:
+                reservations[rider.id] = token
+                reserved_matches.append((order, rider, distance))
+            else:
+                unmatched.append(order)
+        try:
+            deliveries, dropped = self._commit(reserved_matches)
+        finally:
+            for rider_id, token in reservations.items():
+                DeliveryService.release_rider_reservation(rider_id, token)
+
+        # Orders left without a rider wait for a later tick with backoff.
+        # Outside the transaction: these rows are not locked by this tick.
+        Order.objects.filter(
+            id__in=[order.id for order in unmatched + dropped],
+            status="ready",
+        ).update(
+            assignment_retry_count=F("assignment_retry_count") + 1,
+            last_assignment_retry_at=timezone.now(),
+        )
+        return {
+            "orders": len(orders),
+            "riders": len(riders),
+            "assigned": len(deliveries),
+            "unassigned": len(orders) - len(deliveries),
+            "total_distance": sum(float(delivery.distance) for delivery in deliveries),
+        }
+
+    @staticmethod
+    def _commit(
+        matches: List[Tuple[Order, Rider, float]]
+    ) -> Tuple[List[Delivery], List[Order]]:
+        """
+        Persist a tick's matches in one transaction. Orders and riders are
+        re-read under row locks (skipping rows another worker holds) and any
+        match that is no longer valid is dropped rather than failing the tick.
+        Returns the created deliveries and the dropped orders that still
+        need a rider.
+        """
+        from .services import DeliveryService
+
+        now = timezone.now()
+        with transaction.atomic():
+            locked_orders = {
+                order.id: order
+                for order in Order.objects.select_for_update(skip_locked=True).filter(
+                    id__in=[order.id for order, _, _ in matches], status="ready"
+                )
+            }
+            locked_riders = {
+                rider.id: rider
+                for rider in Rider.objects.select_for_update(skip_locked=True).filter(
+                    id__in=[rider.id for _, rider, _ in matches],
+                    is_active=True,
+                    current_status="available",
+                )
+            }
+            already_assigned = set(
+                Delivery.objects.filter(order_id__in=locked_orders.keys())
+                .exclude(status__in=["failed", "completed"])
+                .values_list("order_id", flat=True)
+            )
+            assignments = []
+            dropped = []
+            for order, rider, distance in matches:
+                if order.id in already_assigned:
+                    continue
+                if order.id in locked_orders and rider.id in locked_riders:
+                    assignments.append((locked_orders[order.id], locked_riders[rider.id], distance))
+                else:
+                    dropped.append(order)
+
+            deliveries = Delivery.objects.bulk_create(
+                [
+                    Delivery(order=order, rider=rider, status="assigned", distance=round(distance, 2))
+                    for order, rider, distance in assignments
+                ]
+            )
+
+            for order, rider, _ in assignments:
+                rider.current_status = "busy"
+                rider.updated_at = now
+                order.assignment_retry_count = 0
+                order.last_assignment_retry_at = None
+                order.updated_at = now
+            Rider.objects.bulk_update(
+                [rider for _, rider, _ in assignments], ["current_status", "updated_at"]
+            )
+            Order.objects.bulk_update(
+                [order for order, _, _ in assignments],
+                ["assignment_retry_count", "last_assignment_retry_at", "updated_at"],
+            )
+
+            for delivery, (order, rider, distance) in zip(deliveries, assignments):
+                DeliveryService.record_assignment_event(delivery, order, rider, distance)
+                transaction.on_commit(
+                    lambda delivery=delivery, order=order, rider=rider, distance=distance: (
+                        DeliveryService.on_delivery_assigned(delivery, order, rider, distance)
+                    ),
+                    robust=True,
+                )
+
+        return deliveries, dropped
+
+
+dispatch_engine = DispatchEngine(
+    max_pickup_km=settings.RIDER_SEARCH_RADIUS_KM,
+    candidates_per_order=settings.RIDER_SEARCH_MAX_CANDIDATES,
+)
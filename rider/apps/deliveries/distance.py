@@ -0,0 +1,104 @@
+"""
+Vectorized distance kernels on NumPy arrays. All distances are in kilometers.
+
+Accuracy modes:
+    haversine        great-circle distance on a spherical earth (default)
+    equirectangular  flat-earth approximation, fastest, fine for city-scale distances
+    geodesic         exact WGS-84 distance through geopy, one Python call per pair (slow)
+"""
+from typing import Optional, Sequence, Tuple
+
+import numpy as np
+from django.conf import settings
+from geopy.distance import geodesic
+
+EARTH_RADIUS_KM = 6371.0088
+DISTANCE_MODES = ("haversine", "equirectangular", "geodesic")
+
+
+def _resolve_mode(mode: Optional[str]) -> str:
+    mode = mode or settings.DISTANCE_MODE
+    if mode not in DISTANCE_MODES:
+        raise ValueError(f"Unknown distance mode: {mode}. Expected one of {DISTANCE_MODES}")
+    return mode
+
+
+def _haversine(lat1, lng1, lat2, lng2):
+    lat1, lng1, lat2, lng2 = map(np.radians, (lat1, lng1, lat2, lng2))
+    a = (
+        np.sin((lat2 - lat1) / 2) ** 2
+        + np.cos(lat1) * np.cos(lat2) * np.sin((lng2 - lng1) / 2) ** 2
+    )
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+
+
+def _equirectangular(lat1, lng1, lat2, lng2):
+    lat1, lng1, lat2, lng2 = map(np.radians, (lat1, lng1, lat2, lng2))
+    x = (lng2 - lng1) * np.cos((lat1 + lat2) / 2)
+    y = lat2 - lat1
+    return EARTH_RADIUS_KM * np.hypot(x, y)
+
+
+def _geodesic(lat1, lng1, lat2, lng2):
+    lat1, lng1, lat2, lng2 = np.broadcast_arrays(lat1, lng1, lat2, lng2)
+    result = np.empty(lat1.shape, dtype=np.float64)
+    for index in np.ndindex(lat1.shape):
+        result[index] = geodesic(
+            (lat1[index], lng1[index]), (lat2[index], lng2[index])
+        ).kilometers
+    return result
+
+
+_KERNELS = {
+    "haversine": _haversine,
+    "equirectangular": _equirectangular,
+    "geodesic": _geodesic,
+}
+
+
+def pairwise_distance(lat1, lng1, lat2, lng2, mode: Optional[str] = None) -> np.ndarray:
+    """Element-wise distance between two sets of points (NumPy broadcasting rules apply)"""
+    kernel = _KERNELS[_resolve_mode(mode)]
+    return kernel(
+        np.asarray(lat1, dtype=np.float64),
+        np.asarray(lng1, dtype=np.float64),
+        np.asarray(lat2, dtype=np.float64),
+        np.asarray(lng2, dtype=np.float64),
+    )
+
+
+def point_distance(lat1: float, lng1: float, lat2: float, lng2: float, mode: Optional[str] = None) -> float:
+    return float(pairwise_distance(lat1, lng1, lat2, lng2, mode=mode))
+
+
+def one_to_many(lat: float, lng: float, lats, lngs, mode: Optional[str] = None) -> np.ndarray:
+    """Distances from one origin to every point in (lats, lngs), shape (n,)"""
+    return pairwise_distance(lat, lng, lats, lngs, mode=mode)
+
+
+def distance_matrix(lats1, lngs1, lats2=None, lngs2=None, mode: Optional[str] = None) -> np.ndarray:
+    """
+    Many-to-many distance matrix of shape (n, m), where matrix[i, j] is the distance
+    from point i of the first set to point j of the second set.
+    Omit the second set for the symmetric (n, n) matrix of the first set.
+    """
+    lats1 = np.asarray(lats1, dtype=np.float64)
+    lngs1 = np.asarray(lngs1, dtype=np.float64)
+    if lats2 is None:
+        lats2, lngs2 = lats1, lngs1
+    lats2 = np.asarray(lats2, dtype=np.float64)
+    lngs2 = np.asarray(lngs2, dtype=np.float64)
+    return pairwise_distance(
+        lats1[:, np.newaxis], lngs1[:, np.newaxis], lats2[np.newaxis, :], lngs2[np.newaxis, :], mode=mode
+    )
+
+
+def polyline_length(points: Sequence[Tuple[float, float]], mode: Optional[str] = None) -> float:
+    """Total length of a route given as a sequence of (lat, lng) points"""
+    if len(points) < 2:
+        return 0.0
+    coords = np.asarray(points, dtype=np.float64)
+    segments = pairwise_distance(
+        coords[:-1, 0], coords[:-1, 1], coords[1:, 0], coords[1:, 1], mode=mode
+    )
+    return float(segments.sum())
@@ -0,0 +1,189 @@
+"""
+ETA engine for Order.estimated_delivery_time.
+
+The initial ETA is computed at assignment from the route length (rider ->
+pickup -> drop, straight-line legs scaled by ETA_ROUTE_FACTOR) and the
+vehicle type's speed profile. The per-delivery state lives in a Redis hash.
+
+Each location ping only re-measures the leg to the next stop and blends the
+reported speed into a smoothed speed. The order row is written and an
+eta_update is pushed to the order group only when the ETA moves by at least
+ETA_UPDATE_THRESHOLD_SECONDS, so pings do not turn into DB writes.
+"""
+import time
+from datetime import datetime, timezone as dt_timezone
+from typing import Any, Dict, Optional
+
+from django.conf import settings
+from infrastructure.cache import redis_client
+
+from apps.orders.models import Order
+
+from . import distance as geo
+
+# Typical urban average speeds (km/h) per vehicle type
+VEHICLE_SPEED_KMH = {
+    "bike": 22.0,
+    "scooter": 25.0,
+    "car": 20.0,
+}
+DEFAULT_SPEED_KMH = 20.0
+
+TO_PICKUP = "to_pickup"
+TO_DROP = "to_drop"
+PICKED_UP_STATUSES = ("collected", "in_progress")
+
+
+class EtaService:
+    def __init__(
+        self,
+        route_factor: float,
+        handover_minutes: float,
+        threshold_seconds: float,
+        speed_smoothing: float,
+        ttl: int = 7200,
+    ):
+        self.route_factor = route_factor
+        self.handover_seconds = handover_minutes * 60
+        self.threshold_seconds = threshold_seconds
+        self.speed_smoothing = speed_smoothing
+        self.ttl = ttl
+
+    @staticmethod
+    def _key(delivery_id) -> str:
+        return f"delivery:eta:{delivery_id}"
+
+    def start(self, delivery, order, rider, rider_location: Optional[Dict[str, Any]] = None):
+        """Compute and publish the initial ETA for a new assignment"""
+        pickup = (float(order.pickup_lat), float(order.pickup_lng))
+        drop = (float(order.delivery_lat), float(order.delivery_lng))
+        profile_speed = VEHICLE_SPEED_KMH.get(rider.vehicle_type, DEFAULT_SPEED_KMH)
+        state = {
+            "order_id": str(order.id),
+            "phase": TO_PICKUP,
+            "pickup_lat": pickup[0],
+            "pickup_lng": pickup[1],
+            "drop_lat": drop[0],
+            "drop_lng": drop[1],
+            # Pickup -> drop leg, fixed for the whole delivery
+            "delivery_leg_km": self._leg_km(pickup, drop),
+            "profile_speed": profile_speed,
+            "speed": profile_speed,
+            "pushed_eta": 0,
+        }
+        position = (
+            (float(rider_location["lat"]), float(rider_location["lng"]))
+            if rider_location else pickup
+        )
+        return self._update(delivery.id, state, position, force=True)
+
+    def on_location(
+        self, delivery_id, location: Dict[str, Any], remaining_km: Optional[float] = None
+    ) -> Optional[float]:
+        """
+        Incremental update from a location ping. `remaining_km` is the
+        distance left along the planned route when known, otherwise the
+        straight-line legs are used. Returns the new ETA (unix time) or None
+        when the delivery has no ETA state.
+        """
+        state = redis_client.hgetall(self._key(delivery_id))
+        if not state:
+            return None
+        reported = location.get("speed")
+        if reported:
+            # Smooth the reported speed, bounded around the vehicle profile so a
+            # red light or a GPS spike does not swing the ETA
+            profile = float(state["profile_speed"])
+            observed = min(max(float(reported), 0.5 * profile), 1.5 * profile)
+            state["speed"] = (
+                self.speed_smoothing * observed
+                + (1 - self.speed_smoothing) * float(state["speed"])
+            )
+        return self._update(
+            delivery_id, state, (float(location["lat"]), float(location["lng"])),
+            remaining_km=remaining_km,
+        )
+
+    def on_status_change(self, delivery, location: Optional[Dict[str, Any]] = None):
+        """Switch to the drop leg once the order is picked up, clear it when done"""
+        if delivery.status in ("completed", "failed", "denied"):
+            self.clear(delivery.id)
+            return
+        if delivery.status not in PICKED_UP_STATUSES:
+            return
+        state = redis_client.hgetall(self._key(delivery.id))
+        if not state or state["phase"] == TO_DROP:
+            return
+        state["phase"] = TO_DROP
+        position = (
+            (float(location["lat"]), float(location["lng"]))
+            if location else (float(state["pickup_lat"]), float(state["pickup_lng"]))
+        )
+        self._update(delivery.id, state, position, force=True)
+
+    def get(self, delivery_id) -> Optional[Dict[str, Any]]:
+        return redis_client.hgetall(self._key(delivery_id)) or None
+
+    def clear(self, delivery_id):
+        redis_client.delete(self._key(delivery_id))
+
+    def _leg_km(self, origin, destination) -> float:
+        return geo.point_distance(*origin, *destination) * self.route_factor
+
+    def _update(
+        self,
+        delivery_id,
+        state: Dict[str, Any],
+        position,
+        force: bool = False,
+        remaining_km: Optional[float] = None,
+    ) -> float:
+        if remaining_km is None:
+            if state["phase"] == TO_PICKUP:
+                target = (float(state["pickup_lat"]), float(state["pickup_lng"]))
+                remaining_km = self._leg_km(position, target) + float(state["delivery_leg_km"])
+            else:
+                target = (float(state["drop_lat"]), float(state["drop_lng"]))
+                remaining_km = self._leg_km(position, target)
+
+        eta = time.time() + remaining_km / float(state["speed"]) * 3600 + self.handover_seconds
+        state["remaining_km"] = round(remaining_km, 3)
+        state["eta"] = eta
+
+        moved = abs(eta - float(state["pushed_eta"])) >= self.threshold_seconds
+        if force or moved:
+            state["pushed_eta"] = eta
+            self._publish(delivery_id, state)
+
+        key = self._key(delivery_id)
+        pipe = redis_client.pipeline()
+        pipe.hset(key, mapping=state)
+        pipe.expire(key, self.ttl)
+        pipe.execute()
+        return eta
+
+    @staticmethod
+    def _publish(delivery_id, state: Dict[str, Any]):
+        """Persist the ETA on the order and push it to the tracking page"""
+        from .services import DeliveryService
+
+        estimated = datetime.fromtimestamp(float(state["eta"]), tz=dt_timezone.utc)
+        Order.objects.filter(id=state["order_id"]).update(estimated_delivery_time=estimated)
+        DeliveryService.send_websocket_notification(
+            f"order_{state['order_id']}",
+            "eta_update",
+            {
+                "delivery_id": str(delivery_id),
+                "estimated_delivery": estimated.isoformat(),
+                "remaining_km": float(state["remaining_km"]),
+                "phase": state["phase"],
+            },
+        )
+
+
+eta_service = EtaService(
+    route_factor=settings.ETA_ROUTE_FACTOR,
+    handover_minutes=settings.ETA_HANDOVER_MINUTES,
+    threshold_seconds=settings.ETA_UPDATE_THRESHOLD_SECONDS,
+    speed_smoothing=settings.ETA_SPEED_SMOOTHING,
+)
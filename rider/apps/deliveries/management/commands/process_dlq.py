@@ -50,10 +50,11 @@ class Command(BaseCommand):
                 entry.status = 'retrying'
                 entry.save()
                 
-                # Attempt to republish
+                # Attempt to republish, waiting for the broker to confirm
                 success = kafka_client.publish(
                     topic=entry.topic,
-                    event_data=entry.event_data
+                    event_data=entry.event_data,
+                    wait=True
                 )
                 
                 if success:
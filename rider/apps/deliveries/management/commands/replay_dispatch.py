@@ -0,0 +1,268 @@
+"""
+Management command to compare assignment strategies offline.
+Loads historical orders and rider location tracks (or generates a synthetic
+day) into an in-memory world and replays it on a virtual clock through each
+strategy (greedy, global, batching). Reports assignment latency, pickup
+wait, delivery time, distance and solver CPU time per strategy.
+Nothing is written and Kafka, Redis and the network are not used.
+Usage: python manage.py replay_dispatch --source history --hours 24
+       python manage.py replay_dispatch --source generate --orders 500 --riders 60
+"""
+import copy
+import math
+import random
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from apps.deliveries.replay import ReplayWorld, SimOrder, SimRider, build_strategy
+from apps.orders.models import Order
+from apps.riders.models import Rider, RiderCurrentLocation, RiderLocation
+
+STRATEGIES = ("greedy", "global", "batching")
+# Generated city: centre (Delhi) and spread of pickups, drops and riders
+GENERATED_CENTER = (28.6139, 77.2090)
+GENERATED_RADIUS_KM = 8.0
+KM_PER_DEGREE = 111.2
+
+
+class Command(BaseCommand):
+    help = 'Replay historical or generated orders through dispatch strategies in memory'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--strategy',
+            choices=STRATEGIES + ('all',),
+            default='all',
+            help='Strategy to replay (default: all)',
+        )
+        parser.add_argument(
+            '--source',
+            choices=('history', 'generate'),
+            default='generate',
+            help='Load orders and rider tracks from the database or generate them (default: generate)',
+        )
+        parser.add_argument(
+            '--hours',
+            type=float,
+            default=24,
+            help='History: replay the last N hours (default: 24)',
+        )
+        parser.add_argument(
+            '--orders',
+            type=int,
+            default=300,
+            help='Generate: number of orders (default: 300)',
+        )
+        parser.add_argument(
+            '--riders',
+            type=int,
+            default=40,
+            help='Generate: number of riders (default: 40)',
+        )
+        parser.add_argument(
+            '--duration-minutes',
+            type=float,
+            default=120,
+            help='Generate: period over which orders arrive (default: 120)',
+        )
+        parser.add_argument(
+            '--prep-min',
+            type=float,
+            default=30,
+            help='Minimum preparation time in seconds (default: 30)',
+        )
+        parser.add_argument(
+            '--prep-max',
+            type=float,
+            default=60,
+            help='Maximum preparation time in seconds (default: 60)',
+        )
+        parser.add_argument(
+            '--tick-seconds',
+            type=float,
+            default=10,
+            help='Dispatch tick interval in virtual seconds (default: 10)',
+        )
+        parser.add_argument(
+            '--track-step-seconds',
+            type=float,
+            default=30,
+            help='History: keep at most one rider location per N seconds (default: 30)',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=3,
+            help='Batching: max orders per rider (default: 3)',
+        )
+        parser.add_argument(
+            '--batch-radius-km',
+            type=float,
+            default=1.0,
+            help='Batching: max distance between batched pickups (default: 1.0)',
+        )
+        parser.add_argument(
+            '--seed',
+            type=int,
+            default=42,
+            help='Random seed for generated data and preparation times (default: 42)',
+        )
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        if options['source'] == 'history':
+            orders, riders = self._load_history(options, rng)
+        else:
+            orders, riders = self._generate(options, rng)
+        if not orders or not riders:
+            raise CommandError('Nothing to replay: need at least one order and one rider')
+
+        self.stdout.write(f'Replaying {len(orders)} orders with {len(riders)} riders')
+        strategies = STRATEGIES if options['strategy'] == 'all' else (options['strategy'],)
+        results = {}
+        for name in strategies:
+            strategy = build_strategy(
+                name,
+                batch_size=options['batch_size'],
+                batch_radius_km=options['batch_radius_km'],
+            )
+            world = ReplayWorld(
+                # Every strategy starts from the same untouched world
+                copy.deepcopy(orders),
+                copy.deepcopy(riders),
+                strategy,
+                tick_seconds=options['tick_seconds'],
+                route_factor=settings.ETA_ROUTE_FACTOR,
+                handover_seconds=settings.ETA_HANDOVER_MINUTES * 60,
+            )
+            results[name] = world.run()
+
+        self._print_report(results)
+
+    def _prep_seconds(self, options, rng):
+        return rng.uniform(options['prep_min'], options['prep_max'])
+
+    def _load_history(self, options, rng):
+        end = timezone.now()
+        start = end - timedelta(hours=options['hours'])
+
+        def offset(moment):
+            return (moment - start).total_seconds()
+
+        orders = []
+        rows = Order.objects.filter(
+            created_at__gte=start,
+            created_at__lt=end,
+            pickup_lat__isnull=False,
+            pickup_lng__isnull=False,
+            delivery_lat__isnull=False,
+            delivery_lng__isnull=False,
+        ).order_by('created_at').values_list(
+            'id', 'created_at', 'pickup_lat', 'pickup_lng', 'delivery_lat', 'delivery_lng'
+        )
+        for order_id, created_at, pickup_lat, pickup_lng, delivery_lat, delivery_lng in rows.iterator(chunk_size=2000):
+            created = offset(created_at)
+            orders.append(SimOrder(
+                id=str(order_id),
+                created_at=created,
+                # Preparation time is not recorded, draw it as create_order does
+                ready_at=created + self._prep_seconds(options, rng),
+                pickup_lat=float(pickup_lat),
+                pickup_lng=float(pickup_lng),
+                delivery_lat=float(delivery_lat),
+                delivery_lng=float(delivery_lng),
+            ))
+
+        vehicle_types = dict(Rider.objects.filter(is_active=True).values_list('id', 'vehicle_type'))
+        riders = {}
+        pings = RiderLocation.objects.filter(
+            timestamp__gte=start, timestamp__lt=end, rider_id__in=list(vehicle_types)
+        ).order_by('rider_id', 'timestamp').values_list('rider_id', 'timestamp', 'lat', 'lng')
+        for rider_id, timestamp, lat, lng in pings.iterator(chunk_size=5000):
+            at, position = offset(timestamp), (float(lat), float(lng))
+            rider = riders.get(rider_id)
+            if rider is None:
+                rider = riders[rider_id] = SimRider(
+                    id=str(rider_id), vehicle_type=vehicle_types[rider_id], lat=position[0], lng=position[1]
+                )
+            elif at - rider.track_times[-1] < options['track_step_seconds']:
+                continue
+            rider.track_times.append(at)
+            rider.track_coords.append(position)
+
+        # Active riders without pings in the window start at their last known position
+        snapshots = RiderCurrentLocation.objects.filter(
+            rider_id__in=[rider_id for rider_id in vehicle_types if rider_id not in riders]
+        ).values_list('rider_id', 'lat', 'lng')
+        for rider_id, lat, lng in snapshots:
+            riders[rider_id] = SimRider(
+                id=str(rider_id), vehicle_type=vehicle_types[rider_id], lat=float(lat), lng=float(lng)
+            )
+        return orders, list(riders.values())
+
+    def _generate(self, options, rng):
+        def point():
+            # Uniform in a disc around the city centre
+            radius = GENERATED_RADIUS_KM * math.sqrt(rng.random()) / KM_PER_DEGREE
+            angle = rng.uniform(0, 2 * math.pi)
+            lat = GENERATED_CENTER[0] + radius * math.sin(angle)
+            lng = GENERATED_CENTER[1] + radius * math.cos(angle) / math.cos(math.radians(GENERATED_CENTER[0]))
+            return lat, lng
+
+        duration = options['duration_minutes'] * 60
+        orders = []
+        for index in range(options['orders']):
+            created = rng.uniform(0, duration)
+            pickup, drop = point(), point()
+            orders.append(SimOrder(
+                id=f'SIM-{index}',
+                created_at=created,
+                ready_at=created + self._prep_seconds(options, rng),
+                pickup_lat=pickup[0],
+                pickup_lng=pickup[1],
+                delivery_lat=drop[0],
+                delivery_lng=drop[1],
+            ))
+        orders.sort(key=lambda order: order.created_at)
+
+        riders = []
+        for index in range(options['riders']):
+            lat, lng = point()
+            riders.append(SimRider(
+                id=f'SIM-R{index}',
+                vehicle_type=rng.choice(('bike', 'scooter', 'car')),
+                lat=lat,
+                lng=lng,
+            ))
+        return orders, riders
+
+    def _print_report(self, results):
+        rows = [
+            ('delivered', 'delivered', '{:.0f}'),
+            ('unassigned', 'unassigned', '{:.0f}'),
+            ('assign latency p50/p95 (s)', 'assign_latency_s', None),
+            ('pickup wait p50/p95 (s)', 'pickup_wait_s', None),
+            ('delivery time p50/p95 (s)', 'delivery_time_s', None),
+            ('distance total (km)', 'km_total', '{:.1f}'),
+            ('distance empty (km)', 'km_empty', '{:.1f}'),
+            ('km per order', 'km_per_order', '{:.2f}'),
+            ('solver calls', 'solver_calls', '{:.0f}'),
+            ('solver CPU total (ms)', 'solver_cpu_ms_total', '{:.1f}'),
+            ('solver CPU p95/max (ms)', 'solver_cpu_ms', None),
+        ]
+        names = list(results)
+        self.stdout.write(f'{"":30}' + ''.join(f'{name:>18}' for name in names))
+        for label, key, fmt in rows:
+            cells = []
+            for name in names:
+                result = results[name]
+                if fmt:
+                    cells.append(fmt.format(result[key]))
+                elif key == 'solver_cpu_ms':
+                    cells.append(f'{result["solver_cpu_ms_p95"]:.2f}/{result["solver_cpu_ms_max"]:.2f}')
+                else:
+                    cells.append(f'{result[key + "_p50"]:.0f}/{result[key + "_p95"]:.0f}')
+            self.stdout.write(f'{label:30}' + ''.join(f'{cell:>18}' for cell in cells))
@@ -22,6 +22,12 @@ class Command(BaseCommand):
             default=24,
             help='Maximum age in hours before cancelling order (default: 24)'
         )
+        parser.add_argument(
+            '--strategy',
+            choices=['greedy', 'global'],
+            default=None,
+            help='Assignment strategy (default: DISPATCH_STRATEGY setting)'
+        )
 
     def handle(self, *args, **options):
         max_retries = options['max_retries']
@@ -31,7 +37,8 @@ class Command(BaseCommand):
         
         result = delivery_service.retry_unassigned_orders(
             max_retries=max_retries,
-            max_age_hours=max_age_hours
+            max_age_hours=max_age_hours,
+            strategy=options['strategy']
         )
         
         self.stdout.write(
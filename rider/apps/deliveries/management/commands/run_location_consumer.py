@@ -0,0 +1,98 @@
+"""
+Management command to run dedicated Kafka location consumer workers.
+Starts N worker processes in the location consumer group. Partitions are
+spread over all workers of the group (cooperative-sticky assignment), so
+throughput scales with partitions, not with web replicas. Set
+LOCATION_CONSUMER_AUTOSTART=false on web processes when running this.
+SIGTERM/SIGINT stop the workers gracefully: each finishes its batch and
+leaves the group so its partitions are reassigned at once. Workers that
+die are restarted.
+Usage: python manage.py run_location_consumer --workers 4
+"""
+import multiprocessing
+import signal
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from infrastructure.kafka_client import kafka_client
+
+from apps.deliveries.consumers import location_consumer
+
+
+def _run_worker():
+    def shutdown(signum, frame):
+        location_consumer.running = False
+
+    signal.signal(signal.SIGTERM, shutdown)
+    signal.signal(signal.SIGINT, shutdown)
+    location_consumer.run()
+
+
+class Command(BaseCommand):
+    help = 'Run dedicated Kafka location consumer worker processes'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=1,
+            help='Worker processes, at most one per partition is useful (default: 1)',
+        )
+        parser.add_argument(
+            '--restart-delay',
+            type=float,
+            default=5.0,
+            help='Seconds before restarting a worker that exited (default: 5.0)',
+        )
+
+    def handle(self, *args, **options):
+        if options['workers'] <= 1:
+            self.stdout.write('Running location consumer in this process')
+            _run_worker()
+            return
+
+        self.stopping = False
+        signal.signal(signal.SIGTERM, self._shutdown)
+        signal.signal(signal.SIGINT, self._shutdown)
+
+        # Workers are forked, they must not share the parent's DB connections
+        # nor librdkafka handles (created lazily, so none exists unless
+        # something in this process already used Kafka)
+        connections.close_all()
+        if kafka_client.initialized:
+            raise CommandError('Kafka client was used before forking workers, librdkafka is not fork-safe')
+        context = multiprocessing.get_context('fork')
+        workers = [self._spawn(context) for _ in range(options['workers'])]
+        self.stdout.write(f'Started {len(workers)} location consumer workers')
+
+        exited_at = {}
+        while not self.stopping:
+            time.sleep(1)
+            for index, worker in enumerate(workers):
+                if worker.is_alive() or self.stopping:
+                    continue
+                exited_at.setdefault(index, time.monotonic())
+                if time.monotonic() - exited_at[index] < options['restart_delay']:
+                    continue
+                self.stderr.write(f'Worker {worker.pid} exited with {worker.exitcode}, restarting')
+                del exited_at[index]
+                workers[index] = self._spawn(context)
+
+        for worker in workers:
+            if worker.is_alive():
+                worker.terminate()  # SIGTERM: graceful stop in the worker
+        for worker in workers:
+            worker.join(timeout=30)
+            if worker.is_alive():
+                worker.kill()
+        self.stdout.write(self.style.SUCCESS('Location consumer workers stopped'))
+
+    @staticmethod
+    def _spawn(context):
+        worker = context.Process(target=_run_worker, daemon=False)
+        worker.start()
+        return worker
+
+    def _shutdown(self, signum, frame):
+        self.stopping = True
@@ -0,0 +1,301 @@
+"""
+Offline dispatch replay.
+
+An in-memory world of orders and riders is replayed on a virtual clock:
+orders become ready at their recorded (or generated) time, riders follow
+their recorded location track while idle and move along their planned
+stops at their vehicle's speed while busy. An assignment strategy is asked
+to match ready orders to idle riders as orders become ready and on every
+dispatch tick. Nothing touches Kafka, Redis, the database or the network.
+
+The strategies call the production planners (dispatch_engine.plan,
+optimize_batch_route) on plain in-memory objects.
+"""
+import heapq
+import time
+from bisect import bisect_right
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+from django.conf import settings
+
+from . import distance as geo
+from .dispatch import dispatch_engine
+from .eta import DEFAULT_SPEED_KMH, VEHICLE_SPEED_KMH
+from .route_optimizer import PICKUP, optimize_batch_route
+
+ORDER_READY = 0
+RIDER_FREE = 1
+DISPATCH_TICK = 2
+
+
+@dataclass(eq=False)
+class SimOrder:
+    id: str
+    created_at: float
+    ready_at: float
+    pickup_lat: float
+    pickup_lng: float
+    delivery_lat: float
+    delivery_lng: float
+    assigned_at: Optional[float] = None
+    rider_arrived_at: Optional[float] = None
+    picked_up_at: Optional[float] = None
+    delivered_at: Optional[float] = None
+
+
+@dataclass(eq=False)
+class SimRider:
+    id: str
+    vehicle_type: str
+    lat: float
+    lng: float
+    # Recorded positions (virtual seconds, lat, lng), followed while idle
+    track_times: List[float] = field(default_factory=list)
+    track_coords: List[Tuple[float, float]] = field(default_factory=list)
+    busy: bool = False
+    free_at: float = float("-inf")
+    km_empty: float = 0.0
+    km_loaded: float = 0.0
+
+    @property
+    def speed_kmh(self) -> float:
+        return VEHICLE_SPEED_KMH.get(self.vehicle_type, DEFAULT_SPEED_KMH)
+
+    def position(self, now: float) -> Tuple[float, float]:
+        """Latest recorded position at `now` while idle, else where it stopped"""
+        index = bisect_right(self.track_times, now) - 1
+        if index >= 0 and self.track_times[index] >= self.free_at:
+            return self.track_coords[index]
+        return self.lat, self.lng
+
+
+@dataclass
+class Assignment:
+    rider: SimRider
+    stops: List[Tuple[SimOrder, str]]
+
+
+class GreedyStrategy:
+    """
+    Current production behaviour: each order takes the nearest idle rider as
+    soon as it is ready, orders left over are retried on the next tick.
+    """
+
+    name = "greedy"
+    immediate = True
+
+    def __init__(self, max_pickup_km: float):
+        self.max_pickup_km = max_pickup_km
+
+    def assign(self, orders, riders, coords) -> List[Assignment]:
+        assignments = []
+        free = np.ones(len(riders), dtype=bool)
+        for order in orders:
+            if not free.any():
+                break
+            distances = geo.one_to_many(order.pickup_lat, order.pickup_lng, coords[:, 0], coords[:, 1])
+            distances[~free] = np.inf
+            best = int(np.argmin(distances))
+            if distances[best] > self.max_pickup_km:
+                continue
+            free[best] = False
+            assignments.append(Assignment(riders[best], [(order, "pickup"), (order, "drop")]))
+        return assignments
+
+
+class GlobalStrategy:
+    """Min-cost matching of all ready orders and idle riders per tick"""
+
+    name = "global"
+    immediate = False
+
+    def assign(self, orders, riders, coords) -> List[Assignment]:
+        return [
+            Assignment(rider, [(order, "pickup"), (order, "drop")])
+            for order, rider, _ in dispatch_engine.plan(orders, riders, coords)
+        ]
+
+
+class BatchingStrategy:
+    """
+    Groups ready orders with nearby pickups (up to `batch_size`) and gives
+    each group to the idle rider nearest its oldest order, with the batch
+    route optimizer ordering the stops.
+    """
+
+    name = "batching"
+    immediate = False
+
+    def __init__(self, max_pickup_km: float, batch_size: int, batch_radius_km: float):
+        self.max_pickup_km = max_pickup_km
+        self.batch_size = batch_size
+        self.batch_radius_km = batch_radius_km
+
+    def assign(self, orders, riders, coords) -> List[Assignment]:
+        assignments = []
+        pending = list(orders)
+        free = np.ones(len(riders), dtype=bool)
+        while pending and free.any():
+            seed = pending[0]
+            others = pending[1:]
+            group = [seed]
+            if others:
+                distances = geo.one_to_many(
+                    seed.pickup_lat, seed.pickup_lng,
+                    [order.pickup_lat for order in others], [order.pickup_lng for order in others],
+                )
+                nearby = np.argsort(distances)[:self.batch_size - 1]
+                group += [others[i] for i in nearby if distances[i] <= self.batch_radius_km]
+            for order in group:
+                pending.remove(order)
+
+            distances = geo.one_to_many(seed.pickup_lat, seed.pickup_lng, coords[:, 0], coords[:, 1])
+            distances[~free] = np.inf
+            best = int(np.argmin(distances))
+            if distances[best] > self.max_pickup_km:
+                continue
+            free[best] = False
+            stops, _ = optimize_batch_route(group, start=tuple(coords[best]))
+            assignments.append(Assignment(riders[best], stops))
+        return assignments
+
+
+def build_strategy(name: str, batch_size: int = 3, batch_radius_km: float = 1.0):
+    max_pickup_km = settings.RIDER_SEARCH_RADIUS_KM
+    if name == "greedy":
+        return GreedyStrategy(max_pickup_km)
+    if name == "global":
+        return GlobalStrategy()
+    if name == "batching":
+        return BatchingStrategy(max_pickup_km, batch_size, batch_radius_km)
+    raise ValueError(f"Unknown strategy: {name}")
+
+
+class ReplayWorld:
+    def __init__(
+        self,
+        orders: Sequence[SimOrder],
+        riders: Sequence[SimRider],
+        strategy,
+        tick_seconds: float,
+        route_factor: float,
+        handover_seconds: float,
+    ):
+        self.orders = list(orders)
+        self.riders = list(riders)
+        self.strategy = strategy
+        self.tick_seconds = tick_seconds
+        self.route_factor = route_factor
+        self.handover_seconds = handover_seconds
+        self.pending: List[SimOrder] = []
+        self.solver_seconds: List[float] = []
+        self._events = []
+        self._seq = 0
+
+    def _push(self, at: float, kind: int, payload=None):
+        self._seq += 1
+        heapq.heappush(self._events, (at, kind, self._seq, payload))
+
+    def run(self) -> Dict[str, float]:
+        for order in self.orders:
+            self._push(order.ready_at, ORDER_READY, order)
+        if self.orders:
+            self._push(min(order.ready_at for order in self.orders), DISPATCH_TICK)
+
+        while self._events:
+            now, kind, _, payload = heapq.heappop(self._events)
+            if kind == ORDER_READY:
+                self.pending.append(payload)
+                if self.strategy.immediate:
+                    self._dispatch(now)
+            elif kind == RIDER_FREE:
+                payload.busy = False
+            elif kind == DISPATCH_TICK:
+                self._dispatch(now)
+                # Only one tick is queued at a time: keep ticking while orders
+                # are still to arrive or riders still to finish
+                if self._events:
+                    self._push(now + self.tick_seconds, DISPATCH_TICK)
+        return self.report()
+
+    def _dispatch(self, now: float):
+        idle = [rider for rider in self.riders if not rider.busy]
+        if not self.pending or not idle:
+            return
+        coords = np.asarray([rider.position(now) for rider in idle], dtype=np.float64).reshape(-1, 2)
+        started = time.process_time()
+        assignments = self.strategy.assign(list(self.pending), idle, coords)
+        self.solver_seconds.append(time.process_time() - started)
+
+        for assignment in assignments:
+            rider = assignment.rider
+            rider.lat, rider.lng = rider.position(now)
+            for order, stop in assignment.stops:
+                if stop == PICKUP:
+                    order.assigned_at = now
+                    self.pending.remove(order)
+            self._drive(rider, assignment.stops, now)
+
+    def _drive(self, rider: SimRider, stops, now: float):
+        """Run the rider along its stops, recording pickup and drop times"""
+        rider.busy = True
+        clock = now
+        lat, lng = rider.lat, rider.lng
+        on_board = 0
+        for order, stop in stops:
+            target = (order.pickup_lat, order.pickup_lng) if stop == PICKUP else (
+                order.delivery_lat, order.delivery_lng
+            )
+            km = geo.point_distance(lat, lng, *target) * self.route_factor
+            if on_board:
+                rider.km_loaded += km
+            else:
+                rider.km_empty += km
+            clock += km / rider.speed_kmh * 3600
+            lat, lng = target
+            if stop == PICKUP:
+                order.rider_arrived_at = clock
+                clock = max(clock, order.ready_at) + self.handover_seconds
+                order.picked_up_at = clock
+                on_board += 1
+            else:
+                clock += self.handover_seconds
+                order.delivered_at = clock
+                on_board -= 1
+        rider.lat, rider.lng = lat, lng
+        rider.free_at = clock
+        self._push(clock, RIDER_FREE, rider)
+
+    def report(self) -> Dict[str, float]:
+        delivered = [order for order in self.orders if order.delivered_at is not None]
+
+        def percentiles(prefix, values):
+            values = np.asarray(values, dtype=np.float64)
+            if values.size == 0:
+                return {f"{prefix}_p50": 0.0, f"{prefix}_p95": 0.0}
+            return {
+                f"{prefix}_p50": float(np.percentile(values, 50)),
+                f"{prefix}_p95": float(np.percentile(values, 95)),
+            }
+
+        km_empty = sum(rider.km_empty for rider in self.riders)
+        km_loaded = sum(rider.km_loaded for rider in self.riders)
+        solver_ms = np.asarray(self.solver_seconds) * 1000
+        return {
+            "orders": len(self.orders),
+            "delivered": len(delivered),
+            "unassigned": len(self.orders) - len(delivered),
+            **percentiles("assign_latency_s", [o.assigned_at - o.ready_at for o in delivered]),
+            # Time the ready order waits for its rider to arrive at the pickup
+            **percentiles("pickup_wait_s", [max(o.rider_arrived_at - o.ready_at, 0.0) for o in delivered]),
+            **percentiles("delivery_time_s", [o.delivered_at - o.created_at for o in delivered]),
+            "km_total": km_empty + km_loaded,
+            "km_empty": km_empty,
+            "km_per_order": (km_empty + km_loaded) / len(delivered) if delivered else 0.0,
+            "solver_calls": len(solver_ms),
+            "solver_cpu_ms_total": float(solver_ms.sum()),
+            "solver_cpu_ms_p95": float(np.percentile(solver_ms, 95)) if solver_ms.size else 0.0,
+            "solver_cpu_ms_max": float(solver_ms.max()) if solver_ms.size else 0.0,
+        }
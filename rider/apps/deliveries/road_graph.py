@@ -0,0 +1,314 @@
+"""
+In-process road routing over a graph loaded from a local OSM extract.
+
+The graph is stored as compact NumPy arrays: node coordinates plus a CSR
+adjacency (indptr / indices / weights in km). Shortest paths are answered with
+A* using the great-circle distance to the target as heuristic, computed only
+for the nodes the search reaches. Points are snapped to the graph through a
+uniform lat/lng grid built once at load time, so a lookup only measures the
+nodes of the few cells around the point.
+
+Supported inputs are OSM XML extracts (.osm, .osm.bz2, .osm.gz) and graphs
+compiled ahead of time with `python manage.py build_road_graph` (.npz).
+"""
+import bz2
+import gzip
+import heapq
+import math
+import os
+import threading
+import xml.etree.ElementTree as ET
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+from django.conf import settings
+
+from . import distance as geo
+
+ROUTABLE_HIGHWAYS = {
+    "motorway", "motorway_link", "trunk", "trunk_link", "primary", "primary_link",
+    "secondary", "secondary_link", "tertiary", "tertiary_link", "unclassified",
+    "residential", "living_street", "service", "road",
+}
+# Spatial grid cell size (~1.1 km of latitude)
+GRID_CELL_DEGREES = 0.01
+_KM_PER_DEGREE = math.pi / 180 * geo.EARTH_RADIUS_KM
+# Cell rows and columns are packed into one int64 key: row * _GRID_STRIDE + column
+_GRID_STRIDE = 1 << 32
+# Rings searched around a point before falling back to scanning every node
+GRID_MAX_RINGS = 64
+
+
+class RoadGraph:
+    def __init__(self, node_lat, node_lng, indptr, indices, weights):
+        self.node_lat = np.asarray(node_lat, dtype=np.float64)
+        self.node_lng = np.asarray(node_lng, dtype=np.float64)
+        self.indptr = np.asarray(indptr, dtype=np.int64)
+        self.indices = np.asarray(indices, dtype=np.int32)
+        self.weights = np.asarray(weights, dtype=np.float32)
+        self._build_grid()
+
+    def _build_grid(self):
+        """Nodes sorted by grid cell, with the sorted cell keys to bisect"""
+        rows, columns = self._cell(self.node_lat, self.node_lng)
+        keys = self._cell_key(rows, columns)
+        self._grid_order = np.argsort(keys, kind="stable")
+        self._grid_keys = keys[self._grid_order]
+        self._grid_extent = (
+            (int(rows.min()), int(rows.max()), int(columns.min()), int(columns.max()))
+            if self.node_count else (0, 0, 0, 0)
+        )
+
+    @staticmethod
+    def _cell(lat, lng):
+        return (
+            np.floor(np.asarray(lat) / GRID_CELL_DEGREES).astype(np.int64),
+            np.floor(np.asarray(lng) / GRID_CELL_DEGREES).astype(np.int64),
+        )
+
+    @staticmethod
+    def _cell_key(row, column):
+        return row * _GRID_STRIDE + column
+
+    def _cell_nodes(self, keys: np.ndarray) -> np.ndarray:
+        """Node indices of the grid cells in `keys`"""
+        starts = np.searchsorted(self._grid_keys, keys, side="left")
+        ends = np.searchsorted(self._grid_keys, keys, side="right")
+        if not np.any(ends > starts):
+            return np.empty(0, dtype=np.int64)
+        return np.concatenate([self._grid_order[start:end] for start, end in zip(starts, ends) if end > start])
+
+    @property
+    def node_count(self) -> int:
+        return len(self.node_lat)
+
+    @property
+    def edge_count(self) -> int:
+        return len(self.indices)
+
+    @classmethod
+    def load(cls, path: str) -> "RoadGraph":
+        """Load a compiled .npz graph, or parse an OSM extract"""
+        if path.endswith(".npz"):
+            with np.load(path) as data:
+                return cls(data["node_lat"], data["node_lng"], data["indptr"], data["indices"], data["weights"])
+        return cls.from_osm(path)
+
+    def save(self, path: str):
+        np.savez_compressed(
+            path,
+            node_lat=self.node_lat,
+            node_lng=self.node_lng,
+            indptr=self.indptr,
+            indices=self.indices,
+            weights=self.weights,
+        )
+
+    @classmethod
+    def from_osm(cls, path: str) -> "RoadGraph":
+        """Build the graph from the routable highway ways of an OSM XML extract"""
+        opener = bz2.open if path.endswith(".bz2") else gzip.open if path.endswith(".gz") else open
+        coords: Dict[int, Tuple[float, float]] = {}
+        ways: List[Tuple[List[int], int]] = []
+
+        with opener(path, "rb") as source:
+            root = None
+            for event, element in ET.iterparse(source, events=("start", "end")):
+                if event == "start":
+                    if root is None:
+                        root = element
+                    continue
+                if element.tag == "node":
+                    coords[int(element.get("id"))] = (float(element.get("lat")), float(element.get("lon")))
+                elif element.tag == "way":
+                    tags = {tag.get("k"): tag.get("v") for tag in element.iter("tag")}
+                    if tags.get("highway") in ROUTABLE_HIGHWAYS:
+                        refs = [int(nd.get("ref")) for nd in element.iter("nd")]
+                        ways.append((refs, cls._oneway_direction(tags)))
+                elif element.tag != "relation":
+                    continue
+                # Drop parsed top-level elements, iterparse keeps the tree otherwise
+                element.clear()
+                root.clear()
+
+        # Compact node ids: only nodes referenced by routable ways are kept
+        node_index: Dict[int, int] = {}
+        src, dst = [], []
+        for refs, direction in ways:
+            refs = [ref for ref in refs if ref in coords]
+            for a, b in zip(refs, refs[1:]):
+                ia = node_index.setdefault(a, len(node_index))
+                ib = node_index.setdefault(b, len(node_index))
+                if direction >= 0:
+                    src.append(ia)
+                    dst.append(ib)
+                if direction <= 0:
+                    src.append(ib)
+                    dst.append(ia)
+
+        node_lat = np.empty(len(node_index), dtype=np.float64)
+        node_lng = np.empty(len(node_index), dtype=np.float64)
+        for osm_id, index in node_index.items():
+            node_lat[index], node_lng[index] = coords[osm_id]
+
+        src = np.asarray(src, dtype=np.int64)
+        dst = np.asarray(dst, dtype=np.int32)
+        weights = geo.pairwise_distance(node_lat[src], node_lng[src], node_lat[dst], node_lng[dst])
+
+        order = np.argsort(src, kind="stable")
+        indptr = np.zeros(len(node_index) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(src, minlength=len(node_index)), out=indptr[1:])
+        return cls(node_lat, node_lng, indptr, dst[order], weights[order])
+
+    @staticmethod
+    def _oneway_direction(tags: Dict[str, str]) -> int:
+        """1 = forward only, -1 = reverse only, 0 = both directions"""
+        oneway = tags.get("oneway")
+        if oneway in ("yes", "true", "1"):
+            return 1
+        if oneway == "-1":
+            return -1
+        if tags.get("junction") == "roundabout" or tags.get("highway") == "motorway":
+            return 1 if oneway != "no" else 0
+        return 0
+
+    def nearest_node(self, lat: float, lng: float, max_km: Optional[float] = None) -> Tuple[int, float]:
+        """
+        Closest graph node to a point, returns (node, distance_km).
+        Searches rings of grid cells outwards from the point's cell until no
+        unsearched cell can hold a closer node. With `max_km` the search also
+        stops once everything left is farther than that, the result may then
+        be (-1, inf) or a node beyond `max_km`.
+        """
+        if not self.node_count:
+            return -1, math.inf
+        row, column = (int(value) for value in self._cell(lat, lng))
+        min_row, max_row, min_column, max_column = self._grid_extent
+        # Rings between the point and the grid are empty
+        first_ring = max(min_row - row, row - max_row, min_column - column, column - max_column, 0)
+        last_ring = max(row - min_row, max_row - row, column - min_column, max_column - column)
+
+        best_node, best_km = -1, math.inf
+        for ring in range(first_ring, last_ring + 1):
+            if ring - first_ring >= GRID_MAX_RINGS:
+                # Sparse surroundings, a full scan is cheaper than more rings
+                return self._scan_nearest_node(lat, lng)
+            if ring == 0:
+                rows, columns = np.array([row]), np.array([column])
+            else:
+                span = np.arange(-ring, ring + 1)
+                edge = np.full(len(span), ring)
+                rows = row + np.concatenate([-edge, edge, span[1:-1], span[1:-1]])
+                columns = column + np.concatenate([span, span, -edge[1:-1], edge[1:-1]])
+                inside = (
+                    (rows >= min_row) & (rows <= max_row) & (columns >= min_column) & (columns <= max_column)
+                )
+                rows, columns = rows[inside], columns[inside]
+            candidates = self._cell_nodes(self._cell_key(rows, columns))
+            if len(candidates):
+                distances = geo.one_to_many(
+                    lat, lng, self.node_lat[candidates], self.node_lng[candidates], mode="equirectangular"
+                )
+                index = int(np.argmin(distances))
+                if distances[index] < best_km:
+                    best_node, best_km = int(candidates[index]), float(distances[index])
+            # Every node outside the searched rings is at least ring cells away
+            # (narrowest cell side: longitude degrees shrink towards the poles)
+            edge_lat = min(abs(lat) + (ring + 1) * GRID_CELL_DEGREES, 90.0)
+            reach_km = ring * GRID_CELL_DEGREES * _KM_PER_DEGREE * math.cos(math.radians(edge_lat))
+            if best_km <= reach_km or (max_km is not None and reach_km > max_km):
+                break
+        return best_node, best_km
+
+    def _scan_nearest_node(self, lat: float, lng: float) -> Tuple[int, float]:
+        distances = geo.one_to_many(lat, lng, self.node_lat, self.node_lng, mode="equirectangular")
+        node = int(np.argmin(distances))
+        return node, float(distances[node])
+
+    def shortest_path(self, source: int, target: int) -> Optional[Tuple[List[int], float]]:
+        """A* search between two nodes, returns (node path, length_km) or None"""
+        if source == target:
+            return [source], 0.0
+
+        node_lat, node_lng = self.node_lat, self.node_lng
+        target_lat = math.radians(node_lat[target])
+        target_lng = math.radians(node_lng[target])
+        cos_target = math.cos(target_lat)
+
+        def heuristic(node: int) -> float:
+            """Great-circle distance to the target, only for nodes the search reaches"""
+            lat, lng = math.radians(node_lat[node]), math.radians(node_lng[node])
+            a = (
+                math.sin((target_lat - lat) / 2) ** 2
+                + math.cos(lat) * cos_target * math.sin((target_lng - lng) / 2) ** 2
+            )
+            return 2 * geo.EARTH_RADIUS_KM * math.asin(math.sqrt(min(a, 1.0)))
+
+        indptr, indices, weights = self.indptr, self.indices, self.weights
+        best = {source: 0.0}
+        came_from = {}
+        closed = set()
+        frontier = [(heuristic(source), 0.0, source)]
+
+        while frontier:
+            _, cost, node = heapq.heappop(frontier)
+            if node == target:
+                path = [node]
+                while node in came_from:
+                    node = came_from[node]
+                    path.append(node)
+                return path[::-1], cost
+            if node in closed:
+                continue
+            closed.add(node)
+
+            start, end = indptr[node], indptr[node + 1]
+            for neighbour, weight in zip(indices[start:end].tolist(), weights[start:end].tolist()):
+                new_cost = cost + weight
+                if new_cost < best.get(neighbour, float("inf")):
+                    best[neighbour] = new_cost
+                    came_from[neighbour] = node
+                    heapq.heappush(frontier, (new_cost + heuristic(neighbour), new_cost, neighbour))
+        return None
+
+    def route(self, points: List[Tuple[float, float]], max_snap_km: float) -> Optional[List[Tuple[float, float]]]:
+        """
+        Road route through consecutive (lat, lng) waypoints.
+        Returns None if a waypoint is farther than max_snap_km from the road
+        network or two waypoints are not connected.
+        """
+        nodes = []
+        for lat, lng in points:
+            node, snap_km = self.nearest_node(lat, lng, max_km=max_snap_km)
+            if snap_km > max_snap_km:
+                return None
+            nodes.append(node)
+
+        polyline = [tuple(points[0])]
+        for source, target in zip(nodes, nodes[1:]):
+            result = self.shortest_path(source, target)
+            if result is None:
+                return None
+            path, _ = result
+            polyline.extend(zip(self.node_lat[path].tolist(), self.node_lng[path].tolist()))
+        polyline.append(tuple(points[-1]))
+        return polyline
+
+
+_road_graph = None
+_road_graph_lock = threading.Lock()
+
+
+def get_road_graph() -> Optional[RoadGraph]:
+    """Lazily load the graph configured in ROUTING_GRAPH_PATH (once per process)"""
+    global _road_graph
+    if _road_graph is None and settings.ROUTING_GRAPH_PATH:
+        with _road_graph_lock:
+            if _road_graph is None:
+                path = settings.ROUTING_GRAPH_PATH
+                if not os.path.exists(path):
+                    print(f"Road graph not found at {path}")
+                    return None
+                _road_graph = RoadGraph.load(path)
+                print(f"Road graph loaded: {_road_graph.node_count} nodes, {_road_graph.edge_count} edges")
+    return _road_graph
@@ -0,0 +1,146 @@
+"""
+Two-tier cache for computed routes: an in-process LRU in front of a shared
+Redis tier with TTL. Routes are keyed by quantized start/end/via coordinates
+and stored as encoded polylines (a few bytes per point instead of JSON floats).
+"""
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+from django.conf import settings
+from infrastructure.cache import redis_client
+
+
+def encode_polyline(points: List[Tuple[float, float]], precision: int = 5) -> str:
+    """Encode (lat, lng) points with the Google encoded polyline algorithm"""
+    factor = 10 ** precision
+    encoded = []
+    prev_lat = prev_lng = 0
+    for lat, lng in points:
+        lat_i, lng_i = int(round(lat * factor)), int(round(lng * factor))
+        for delta in (lat_i - prev_lat, lng_i - prev_lng):
+            value = ~(delta << 1) if delta < 0 else delta << 1
+            while value >= 0x20:
+                encoded.append(chr((0x20 | (value & 0x1F)) + 63))
+                value >>= 5
+            encoded.append(chr(value + 63))
+        prev_lat, prev_lng = lat_i, lng_i
+    return "".join(encoded)
+
+
+def decode_polyline(encoded: str, precision: int = 5) -> List[Tuple[float, float]]:
+    factor = 10 ** precision
+    points = []
+    index = lat = lng = 0
+    while index < len(encoded):
+        deltas = []
+        for _ in range(2):
+            shift = result = 0
+            while True:
+                byte = ord(encoded[index]) - 63
+                index += 1
+                result |= (byte & 0x1F) << shift
+                shift += 5
+                if byte < 0x20:
+                    break
+            deltas.append(~(result >> 1) if result & 1 else result >> 1)
+        lat += deltas[0]
+        lng += deltas[1]
+        points.append((lat / factor, lng / factor))
+    return points
+
+
+class RouteCache:
+    def __init__(self, max_bytes: int, ttl: int, key_precision: int):
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.key_precision = key_precision
+        self._entries: "OrderedDict[str, str]" = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+        self._counters = {
+            "local_hits": 0,
+            "redis_hits": 0,
+            "misses": 0,
+            "evictions": 0,
+            "redis_errors": 0,
+        }
+
+    def make_key(
+        self,
+        start: Tuple[float, float],
+        end: Tuple[float, float],
+        via_points: Optional[List[Tuple[float, float]]] = None,
+    ) -> str:
+        points = [start, *(via_points or []), end]
+        coords = ";".join(
+            f"{lat:.{self.key_precision}f},{lng:.{self.key_precision}f}" for lat, lng in points
+        )
+        return f"route:{settings.ROUTING_BACKEND}:{coords}"
+
+    def get(self, key: str) -> Optional[List[Tuple[float, float]]]:
+        with self._lock:
+            encoded = self._entries.get(key)
+            if encoded is not None:
+                self._entries.move_to_end(key)
+                self._counters["local_hits"] += 1
+                return decode_polyline(encoded)
+
+        try:
+            encoded = redis_client.get(key)
+        except Exception as e:
+            print(f"Route cache Redis get error for key {key}: {e}")
+            encoded = None
+            with self._lock:
+                self._counters["redis_errors"] += 1
+
+        with self._lock:
+            if encoded is None:
+                self._counters["misses"] += 1
+                return None
+            self._counters["redis_hits"] += 1
+            self._store_local(key, encoded)
+        return decode_polyline(encoded)
+
+    def set(self, key: str, route: List[Tuple[float, float]]):
+        encoded = encode_polyline(route)
+        with self._lock:
+            self._store_local(key, encoded)
+        try:
+            redis_client.setex(key, self.ttl, encoded)
+        except Exception as e:
+            print(f"Route cache Redis set error for key {key}: {e}")
+            with self._lock:
+                self._counters["redis_errors"] += 1
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self._counters["local_hits"] + self._counters["redis_hits"] + self._counters["misses"]
+            hits = lookups - self._counters["misses"]
+            return {
+                **self._counters,
+                "entries": len(self._entries),
+                "bytes": self._size,
+                "hit_ratio": hits / lookups if lookups else 0.0,
+            }
+
+    def _store_local(self, key: str, encoded: str):
+        """Insert into the LRU, evicting least recently used routes by size (lock held)"""
+        previous = self._entries.pop(key, None)
+        if previous is not None:
+            self._size -= len(previous)
+        if len(encoded) > self.max_bytes:
+            return
+        self._entries[key] = encoded
+        self._size += len(encoded)
+        while self._size > self.max_bytes:
+            _, evicted = self._entries.popitem(last=False)
+            self._size -= len(evicted)
+            self._counters["evictions"] += 1
+
+
+route_cache = RouteCache(
+    max_bytes=settings.ROUTE_CACHE_MAX_BYTES,
+    ttl=settings.ROUTE_CACHE_TTL,
+    key_precision=settings.ROUTE_CACHE_KEY_PRECISION,
+)
@@ -0,0 +1,363 @@
+"""
+Progress along a delivery's route.
+
+Each delivery's route polyline (rider -> pickup -> drop) is stored once in
+Redis as compact float32 arrays of lat, lng and cumulative distance. Each
+ping is projected onto the route: first onto the segments in a window around
+the last matched index, then onto the whole route only if the window does
+not explain the position. Distance along the route is cum_km[i] plus the
+offset inside segment i. Lookups by distance (e.g. where the pickup lies)
+bisect the cumulative array.
+
+Outputs are remaining distance, progress, off-route detection (with re-route
+after repeated misses) and a one-shot rider_nearby event for the order.
+
+Routing calls OSRM, so routes are never built on the ping path: they are
+built in a small background pool when the assignment commits (or, failing
+that, on the first ping, which then reports no progress until the route
+exists). Pings only read the progress fields from Redis; the decoded route
+arrays are kept per process and only fetched again when the route changes.
+"""
+import base64
+import threading
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+from django.conf import settings
+from django.db import close_old_connections
+from infrastructure.cache import redis_client
+
+from apps.orders.models import Order
+
+from . import distance as geo
+from .context_cache import delivery_context_cache
+from .routing_service import RoutingService
+
+_KM_PER_DEGREE = np.pi / 180 * geo.EARTH_RADIUS_KM
+PICKED_UP_STATUSES = ("collected", "in_progress")
+PROGRESS_FIELDS = ("version", "index", "along_km", "misses", "nearby_sent", "pickup_km", "order_id")
+
+
+def _pack(values: np.ndarray) -> str:
+    return base64.b64encode(np.asarray(values, dtype=np.float32).tobytes()).decode("ascii")
+
+
+def _unpack(data: str) -> np.ndarray:
+    return np.frombuffer(base64.b64decode(data), dtype=np.float32).astype(np.float64)
+
+
+class RouteIndex:
+    """Route polyline with precomputed cumulative distances (km)"""
+
+    def __init__(self, lats: np.ndarray, lngs: np.ndarray, cum_km: np.ndarray):
+        self.lats = lats
+        self.lngs = lngs
+        self.cum_km = cum_km
+
+    @classmethod
+    def from_points(cls, points: List[Tuple[float, float]]) -> "RouteIndex":
+        coords = np.asarray(points, dtype=np.float64).reshape(-1, 2)
+        lats, lngs = coords[:, 0], coords[:, 1]
+        legs = geo.pairwise_distance(lats[:-1], lngs[:-1], lats[1:], lngs[1:])
+        return cls(lats, lngs, np.concatenate(([0.0], np.cumsum(legs))))
+
+    @property
+    def total_km(self) -> float:
+        return float(self.cum_km[-1])
+
+    @property
+    def num_segments(self) -> int:
+        return max(len(self.lats) - 1, 0)
+
+    def _project_segments(self, lat: float, lng: float, start: int, stop: int):
+        """
+        Closest point on segments [start, stop) in a local flat frame centred
+        on the ping. Returns (segment, fraction, offset_km).
+        """
+        cos_lat = np.cos(np.radians(lat))
+        x = (self.lngs[start:stop + 1] - lng) * cos_lat * _KM_PER_DEGREE
+        y = (self.lats[start:stop + 1] - lat) * _KM_PER_DEGREE
+        ax, ay, dx, dy = x[:-1], y[:-1], np.diff(x), np.diff(y)
+        length_sq = dx * dx + dy * dy
+        with np.errstate(invalid="ignore", divide="ignore"):
+            t = np.where(length_sq > 0, -(ax * dx + ay * dy) / length_sq, 0.0)
+        t = np.clip(t, 0.0, 1.0)
+        offsets = np.hypot(ax + t * dx, ay + t * dy)
+        best = int(np.argmin(offsets))
+        return start + best, float(t[best]), float(offsets[best])
+
+    def project(
+        self, lat: float, lng: float, hint: int = 0, window: int = 25, max_offset_km: float = 0.1
+    ) -> Tuple[int, float, float]:
+        """
+        Project a position onto the route. Returns (segment, along_km, offset_km).
+        Only segments near `hint` are searched unless none is within
+        `max_offset_km`, then the whole route is.
+        """
+        if self.num_segments == 0:
+            offset = geo.point_distance(lat, lng, self.lats[0], self.lngs[0])
+            return 0, 0.0, offset
+        start = min(max(hint - window // 4, 0), self.num_segments - 1)
+        stop = min(hint + window, self.num_segments)
+        segment, t, offset = self._project_segments(lat, lng, start, stop)
+        if offset > max_offset_km and (start > 0 or stop < self.num_segments):
+            segment, t, offset = self._project_segments(lat, lng, 0, self.num_segments)
+        seg_len = self.cum_km[segment + 1] - self.cum_km[segment]
+        return segment, float(self.cum_km[segment] + t * seg_len), offset
+
+    def locate(self, along_km: float) -> int:
+        """Segment containing the point `along_km` into the route (bisect)"""
+        index = int(np.searchsorted(self.cum_km, along_km, side="right")) - 1
+        return min(max(index, 0), max(self.num_segments - 1, 0))
+
+    def to_mapping(self) -> Dict[str, Any]:
+        return {
+            "lats": _pack(self.lats),
+            "lngs": _pack(self.lngs),
+            "cum_km": _pack(self.cum_km),
+            "total_km": self.total_km,
+        }
+
+    @classmethod
+    def from_mapping(cls, mapping: Dict[str, str]) -> "RouteIndex":
+        return cls(_unpack(mapping["lats"]), _unpack(mapping["lngs"]), _unpack(mapping["cum_km"]))
+
+
+class RouteProgressService:
+    # Progress is only written to the route it was computed on
+    UPDATE_SCRIPT = """
+    if redis.call('HGET', KEYS[1], 'version') ~= ARGV[1] then
+        return 0
+    end
+    redis.call('HSET', KEYS[1], unpack(ARGV, 2))
+    return 1
+    """
+
+    def __init__(
+        self,
+        off_route_meters: float,
+        reroute_after: int,
+        nearby_km: float,
+        window: int,
+        build_workers: int,
+        max_local_routes: int,
+        ttl: int = 7200,
+        build_lock_seconds: int = 30,
+    ):
+        self.off_route_km = off_route_meters / 1000.0
+        self.reroute_after = reroute_after
+        self.nearby_km = nearby_km
+        self.window = window
+        self.build_workers = build_workers
+        self.max_local_routes = max_local_routes
+        self.ttl = ttl
+        self.build_lock_seconds = build_lock_seconds
+        self._routes: "OrderedDict[str, Tuple[str, RouteIndex]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._executor: Optional[ThreadPoolExecutor] = None
+
+    @staticmethod
+    def _key(delivery_id) -> str:
+        return f"delivery:route:{delivery_id}"
+
+    def schedule_build(self, delivery_id, position: Tuple[float, float]) -> bool:
+        """
+        Build the route in the background pool unless a build for this
+        delivery is already running somewhere. Returns whether one was queued.
+        """
+        lock_key = f"{self._key(delivery_id)}:building"
+        if not redis_client.set(lock_key, 1, nx=True, ex=self.build_lock_seconds):
+            return False
+        with self._lock:
+            # Created on first use: consumer workers are forked after import
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(
+                    max_workers=self.build_workers, thread_name_prefix="route-build"
+                )
+        self._executor.submit(self._build_in_background, str(delivery_id), position, lock_key)
+        return True
+
+    def _build_in_background(self, delivery_id: str, position: Tuple[float, float], lock_key: str):
+        try:
+            close_old_connections()
+            self.build_route(delivery_id, position)
+        except Exception as e:
+            print(f"Error building route for delivery {delivery_id}: {e}")
+        finally:
+            close_old_connections()
+            redis_client.delete(lock_key)
+
+    def build_route(self, delivery_id, position: Tuple[float, float]) -> Optional[Dict[str, Any]]:
+        """
+        Route from `position` to the drop, via the pickup until it is collected.
+        Stored with its cumulative distances; returns the stored mapping.
+        Blocks on the routing service, use schedule_build() on hot paths.
+        """
+        context = delivery_context_cache.get(delivery_id)
+        if not context:
+            return None
+        order = Order.objects.filter(id=context["order_id"]).values(
+            "pickup_lat", "pickup_lng", "delivery_lat", "delivery_lng"
+        ).first()
+        if not order or None in order.values():
+            return None
+        pickup = (float(order["pickup_lat"]), float(order["pickup_lng"]))
+        drop = (float(order["delivery_lat"]), float(order["delivery_lng"]))
+        picked_up = context["status"] in PICKED_UP_STATUSES
+
+        # Routed leg by leg: the pickup -> drop leg is shared by every rider
+        # (route cache) and the direct-line fallback still passes the pickup
+        if picked_up:
+            points, pickup_km = RoutingService.calculate_route(position, drop), 0.0
+        else:
+            to_pickup = RoutingService.calculate_route(position, pickup)
+            pickup_km = RouteIndex.from_points(to_pickup).total_km
+            points = list(to_pickup) + list(RoutingService.calculate_route(pickup, drop))[1:]
+        route = RouteIndex.from_points(points)
+
+        version = uuid.uuid4().hex
+        mapping = {
+            **route.to_mapping(),
+            "version": version,
+            "order_id": context["order_id"],
+            "pickup_km": pickup_km,
+            "pickup_index": route.locate(pickup_km),
+            "index": 0,
+            "along_km": 0.0,
+            "misses": 0,
+            "nearby_sent": 0,
+        }
+        key = self._key(delivery_id)
+        pipe = redis_client.pipeline()
+        pipe.delete(key)
+        pipe.hset(key, mapping=mapping)
+        pipe.expire(key, self.ttl)
+        pipe.execute()
+        self._cache_route(str(delivery_id), version, route)
+        return {key: str(value) for key, value in mapping.items()}
+
+    def _get_route(self, delivery_id: str, version: str) -> Optional[RouteIndex]:
+        """Decoded route for `version`, from this process's cache or Redis"""
+        with self._lock:
+            cached = self._routes.get(delivery_id)
+            if cached and cached[0] == version:
+                self._routes.move_to_end(delivery_id)
+                return cached[1]
+        lats, lngs, cum_km, stored_version = redis_client.hmget(
+            self._key(delivery_id), ["lats", "lngs", "cum_km", "version"]
+        )
+        if lats is None:
+            return None
+        route = RouteIndex.from_mapping({"lats": lats, "lngs": lngs, "cum_km": cum_km})
+        self._cache_route(delivery_id, stored_version, route)
+        return route
+
+    def _cache_route(self, delivery_id: str, version: str, route: RouteIndex):
+        with self._lock:
+            self._routes[delivery_id] = (version, route)
+            self._routes.move_to_end(delivery_id)
+            while len(self._routes) > self.max_local_routes:
+                self._routes.popitem(last=False)
+
+    def on_location(self, delivery_id, location: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """
+        Project a ping onto the delivery's route and update its progress.
+        Returns None while the route is still being built.
+        """
+        delivery_id = str(delivery_id)
+        position = (float(location["lat"]), float(location["lng"]))
+        state = dict(zip(PROGRESS_FIELDS, redis_client.hmget(self._key(delivery_id), PROGRESS_FIELDS)))
+        if state["version"] is None:
+            self.schedule_build(delivery_id, position)
+            return None
+        route = self._get_route(delivery_id, state["version"])
+        if route is None:
+            return None
+
+        index, along_km, offset_km = route.project(
+            *position, hint=int(state["index"]), window=self.window, max_offset_km=self.off_route_km
+        )
+        off_route = offset_km > self.off_route_km
+        misses = int(state["misses"]) + 1 if off_route else 0
+        if off_route:
+            # Do not move the matched position on an unexplained ping
+            index, along_km = int(state["index"]), float(state["along_km"])
+            if misses >= self.reroute_after:
+                # Persistently off the planned route: plan again from here,
+                # progress resumes on the new route once it is stored
+                self.schedule_build(delivery_id, position)
+
+        progress = {
+            "index": index,
+            "along_km": round(along_km, 4),
+            "remaining_km": round(route.total_km - along_km, 4),
+            "total_km": round(route.total_km, 4),
+            "progress": round(along_km / route.total_km, 4) if route.total_km else 1.0,
+            "offset_m": round(offset_km * 1000, 1),
+            "off_route": off_route,
+            "passed_pickup": along_km >= float(state["pickup_km"]),
+        }
+        updates = {"index": index, "along_km": along_km, "misses": misses}
+
+        if progress["remaining_km"] <= self.nearby_km and state["nearby_sent"] == "0":
+            updates["nearby_sent"] = 1
+            self._notify_nearby(delivery_id, state["order_id"], progress)
+
+        redis_client.eval(
+            self.UPDATE_SCRIPT,
+            1,
+            self._key(delivery_id),
+            state["version"],
+            *[item for pair in updates.items() for item in pair],
+        )
+        return progress
+
+    def get_progress(self, delivery_id) -> Optional[Dict[str, Any]]:
+        """Last matched position, e.g. to restore a simulation"""
+        state = redis_client.hmget(
+            self._key(delivery_id), ["index", "pickup_index", "along_km", "total_km", "pickup_km"]
+        )
+        if state[0] is None:
+            return None
+        index, pickup_index = int(state[0]), int(state[1])
+        along_km, total_km, pickup_km = map(float, state[2:])
+        return {
+            "index": index,
+            "pickup_index": pickup_index,
+            "along_km": round(along_km, 4),
+            "remaining_km": round(total_km - along_km, 4),
+            "total_km": round(total_km, 4),
+            "progress": round(along_km / total_km, 4) if total_km else 1.0,
+            "passed_pickup": along_km >= pickup_km,
+        }
+
+    def clear(self, delivery_id):
+        redis_client.delete(self._key(delivery_id))
+        with self._lock:
+            self._routes.pop(str(delivery_id), None)
+
+    @staticmethod
+    def _notify_nearby(delivery_id, order_id, progress):
+        from .services import DeliveryService
+
+        DeliveryService.send_websocket_notification(
+            f"order_{order_id}",
+            "rider_nearby",
+            {
+                "delivery_id": str(delivery_id),
+                "remaining_km": progress["remaining_km"],
+            },
+        )
+
+
+route_progress = RouteProgressService(
+    off_route_meters=settings.ROUTE_OFF_ROUTE_METERS,
+    reroute_after=settings.ROUTE_REROUTE_AFTER,
+    nearby_km=settings.ROUTE_NEARBY_KM,
+    window=settings.ROUTE_SEARCH_WINDOW,
+    build_workers=settings.ROUTE_BUILD_WORKERS,
+    max_local_routes=settings.ROUTE_LOCAL_CACHE_ENTRIES,
+)
@@ -1,10 +1,14 @@
 """
 Route calculation service using OSRM (Open Source Routing Machine)
-Falls back to direct line if OSRM is unavailable
+or the in-process road graph (ROUTING_BACKEND=local).
+Falls back to direct line if no route can be found
 """
 import requests
+from django.conf import settings
 from typing import List, Tuple, Optional
-from .services import DeliveryService
+from . import distance as geo
+from .road_graph import get_road_graph
+from .route_cache import route_cache
 
 
 class RoutingService:
@@ -17,9 +21,34 @@ class RoutingService:
         via_points: Optional[List[Tuple[float, float]]] = None
     ) -> List[Tuple[float, float]]:
         """
-        Calculate route between points using OSRM.
+        Calculate route between points using OSRM or the local road graph.
+        Computed routes are cached, repeated pickup -> drop pairs skip routing.
         Returns list of (lat, lng) tuples.
         """
+        key = route_cache.make_key(start, end, via_points)
+        route = route_cache.get(key)
+        if route:
+            return route
+
+        if settings.ROUTING_BACKEND == "local":
+            route = RoutingService._local_route(start, end, via_points)
+        else:
+            route = RoutingService._osrm_route(start, end, via_points)
+
+        if route:
+            route_cache.set(key, route)
+            return route
+
+        # Fallback to direct line with intermediate points (never cached)
+        return RoutingService._direct_route(start, end)
+
+    @staticmethod
+    def _osrm_route(
+        start: Tuple[float, float],
+        end: Tuple[float, float],
+        via_points: Optional[List[Tuple[float, float]]] = None
+    ) -> Optional[List[Tuple[float, float]]]:
+        """Route from the OSRM HTTP API, None if unavailable"""
         try:
             # Build coordinates string
             coords = [f"{start[1]},{start[0]}"]  # OSRM uses lng,lat
@@ -41,10 +70,25 @@ class RoutingService:
                     return [(coord[1], coord[0]) for coord in geometry]
         except Exception as e:
             print(f"OSRM routing failed: {e}, using direct route")
-        
-        # Fallback to direct line with intermediate points
-        return RoutingService._direct_route(start, end)
-    
+        return None
+
+    @staticmethod
+    def _local_route(
+        start: Tuple[float, float],
+        end: Tuple[float, float],
+        via_points: Optional[List[Tuple[float, float]]] = None
+    ) -> Optional[List[Tuple[float, float]]]:
+        """Shortest road route from the in-process graph, None if unavailable"""
+        try:
+            graph = get_road_graph()
+            if graph is None:
+                return None
+            points = [start, *(via_points or []), end]
+            return graph.route(points, max_snap_km=settings.ROUTING_MAX_SNAP_KM)
+        except Exception as e:
+            print(f"Local routing failed: {e}, using direct route")
+            return None
+
     @staticmethod
     def _direct_route(
         start: Tuple[float, float],
@@ -63,16 +107,7 @@ class RoutingService:
     @staticmethod
     def calculate_route_distance(route_points: List[Tuple[float, float]]) -> float:
         """Calculate total distance for a route"""
-        if len(route_points) < 2:
-            return 0.0
-        
-        total = 0.0
-        for i in range(len(route_points) - 1):
-            total += DeliveryService.calculate_distance(
-                route_points[i][0], route_points[i][1],
-                route_points[i + 1][0], route_points[i + 1][1]
-            )
-        return total
+        return geo.polyline_length(route_points)
 
 
 routing_service = RoutingService()
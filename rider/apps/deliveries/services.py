@@ -1,6 +1,5 @@
 import json
 from typing import Any, Dict, Optional, List, Tuple
-from geopy.distance import geodesic
 from asgiref.sync import async_to_sync
 from channels.layers import get_channel_layer
 from infrastructure.cache import redis_client
@@ -9,10 +8,17 @@ from apps.riders.services import rider_service
 from apps.orders.models import Order
 from apps.events.services import event_service
 from apps.events.constants import EventTypes
+from django.conf import settings
 from django.db import transaction
 from django.utils import timezone
 from datetime import timedelta
 import math
+import numpy as np
+from . import distance as geo
+from .context_cache import delivery_context_cache
+from .eta import eta_service
+from .route_progress import route_progress
+from .route_optimizer import PICKUP, optimize_batch_route
 from .models import Delivery, DeadLetterQueue
 
 
@@ -34,12 +40,10 @@ class DeliveryService:
     @staticmethod
     def calculate_distance(lat1: float, lng1: float, lat2: float, lng2: float) -> float:
         """
-        Calculate distance between two points using geodesic distance (more accurate than Haversine).
+        Calculate distance between two points using the configured DISTANCE_MODE.
         Returns distance in kilometers.
         """
-        point1 = (lat1, lng1)
-        point2 = (lat2, lng2)
-        return geodesic(point1, point2).kilometers
+        return geo.point_distance(lat1, lng1, lat2, lng2)
 
     @staticmethod
     def calculate_route_distance(points: List[Tuple[float, float]]) -> float:
@@ -47,24 +51,104 @@ class DeliveryService:
         Calculate total distance for a route with multiple points.
         Points should be a list of (lat, lng) tuples.
         """
-        if len(points) < 2:
-            return 0.0
-        
-        total_distance = 0.0
-        for i in range(len(points) - 1):
-            total_distance += DeliveryService.calculate_distance(
-                points[i][0], points[i][1],
-                points[i + 1][0], points[i + 1][1]
-            )
-        return total_distance
+        return geo.polyline_length(points)
 
     @staticmethod
     def find_nearest_available_rider(
-        pickup_lat: float, pickup_lng: float, exclude_rider_id: str = None
+        pickup_lat: float,
+        pickup_lng: float,
+        exclude_rider_id: str = None,
+        vehicle_type: str = None,
+        exclude_rider_ids=None,
     ):
         """
         Find the nearest available rider to a pickup location.
-        Riders start at random nearby locations (within 5km radius).
+        Queries the available riders geo index first and only falls back to
+        scanning every available rider when nobody is indexed within range.
+        """
+        candidates = rider_service.find_available_riders_near(
+            pickup_lat,
+            pickup_lng,
+            radius_km=settings.RIDER_SEARCH_RADIUS_KM,
+            count=settings.RIDER_SEARCH_MAX_CANDIDATES,
+            vehicle_type=vehicle_type,
+        )
+        excluded = {str(rider_id) for rider_id in (exclude_rider_ids or ())}
+        if exclude_rider_id:
+            excluded.add(str(exclude_rider_id))
+        if excluded:
+            candidates = [c for c in candidates if c[0] not in excluded]
+
+        if candidates:
+            riders = {
+                str(rider.id): rider
+                for rider in Rider.objects.filter(id__in=[c[0] for c in candidates])
+            }
+            for rider_id, distance in candidates:
+                rider = riders.get(rider_id)
+                if rider and rider.is_active and rider.current_status == "available":
+                    return rider, distance
+                # Stale index entry, the rider went busy/offline without a sync
+                rider_service.mark_rider_unavailable(rider_id)
+
+        return DeliveryService._scan_nearest_available_rider(
+            pickup_lat, pickup_lng, vehicle_type=vehicle_type, exclude_rider_ids=excluded
+        )
+
+    @staticmethod
+    def reserve_nearest_available_rider(
+        pickup_lat: float,
+        pickup_lng: float,
+        exclude_rider_id: str = None,
+        vehicle_type: str = None,
+        max_attempts: int = 5,
+    ):
+        """
+        Find the nearest available rider and atomically reserve it in Redis so
+        concurrent assignments cannot pick the same rider.
+        Returns (rider, distance, reservation_token) or (None, None, None).
+        """
+        taken = set()
+        for _ in range(max_attempts):
+            rider, distance = DeliveryService.find_nearest_available_rider(
+                pickup_lat,
+                pickup_lng,
+                exclude_rider_id=exclude_rider_id,
+                vehicle_type=vehicle_type,
+                exclude_rider_ids=taken,
+            )
+            if not rider:
+                break
+            token = rider_service.reserve_rider(str(rider.id))
+            if token:
+                return rider, distance, token
+            # Reserved by a concurrent assignment, try the next nearest rider
+            taken.add(str(rider.id))
+        return None, None, None
+
+    @staticmethod
+    def release_rider_reservation(rider_id, token):
+        """
+        Drop a reservation once its assignment committed or failed. Reserving
+        takes the rider out of the geo index, so its availability is re-synced
+        from the database here (a no-op for riders that went busy).
+        """
+        rider_service.release_rider(str(rider_id), token)
+        rider = Rider.objects.filter(id=rider_id).first()
+        if rider:
+            rider_service.sync_rider_availability(rider)
+
+    @staticmethod
+    def _scan_nearest_available_rider(
+        pickup_lat: float,
+        pickup_lng: float,
+        vehicle_type: str = None,
+        exclude_rider_ids=None,
+    ):
+        """
+        Scan every available rider for the nearest one (geo index miss / cold start).
+        Riders without a location start at random nearby locations (within 5km radius).
+        Every scanned rider is (re)added to the geo index.
         """
         import random
         import math
@@ -72,17 +156,26 @@ class DeliveryService:
         available_riders = Rider.objects.filter(
             is_active=True, current_status="available"
         )
-        if exclude_rider_id:
-            available_riders = available_riders.exclude(id=exclude_rider_id)
+        if exclude_rider_ids:
+            available_riders = available_riders.exclude(id__in=exclude_rider_ids)
+        if vehicle_type:
+            available_riders = available_riders.filter(vehicle_type=vehicle_type)
         
-        if not available_riders:
+        riders = list(available_riders)
+        if not riders:
             return None, None
-        
-        nearest_rider = None
-        min_distance = float('inf')
 
-        for rider in available_riders:
-            location = rider_service.get_rider_location(str(rider.id))
+        rider_ids = [str(rider.id) for rider in riders]
+        reserved = rider_service.get_reserved_riders(rider_ids)
+        cached_locations = rider_service.get_rider_locations(rider_ids)
+
+        locations = []
+        unreserved = []
+        for rider in riders:
+            # Reserved riders are mid-assignment elsewhere, keep them out of the index
+            if str(rider.id) in reserved:
+                continue
+            location = cached_locations.get(str(rider.id))
             
             # If rider doesn't have a location, assign a random nearby location
             if not location:
@@ -100,96 +193,66 @@ class DeliveryService:
                     'lng': pickup_lng + lng_offset
                 }
                 # Set this as the rider's location
-                rider_service.set_rider_location(
-                    str(rider.id),
-                    location,
-                    ttl=300
-                )
+                rider_service.set_rider_location(str(rider.id), location)
 
-            distance = DeliveryService.calculate_distance(
-                pickup_lat, pickup_lng, location['lat'], location['lng']
-            )
-            if distance < min_distance:
-                min_distance = distance
-                nearest_rider = rider
+            rider_service.mark_rider_available(str(rider.id), rider.vehicle_type, location)
+            locations.append((float(location['lat']), float(location['lng'])))
+            unreserved.append(rider)
+
+        riders = unreserved
+        if not riders:
+            return None, None
 
-        return (nearest_rider, min_distance) if nearest_rider else (None, None)
+        # One vectorized pass over all riders instead of a distance call per rider
+        coords = np.asarray(locations)
+        distances = geo.one_to_many(pickup_lat, pickup_lng, coords[:, 0], coords[:, 1])
+        nearest = int(np.argmin(distances))
+        return riders[nearest], float(distances[nearest])
 
     @staticmethod
-    def find_best_rider_for_batch(orders: List[Order]) -> Tuple[Rider, List[Order], float]:
+    def find_best_rider_for_batch(orders: List[Order]) -> Tuple[Rider, List[Tuple[Order, str]], float, str]:
         """
-        Find the best rider for a batch of orders using nearest neighbor algorithm.
-        Returns (rider, optimized_order_sequence, total_distance)
+        Find the best rider for a batch of orders and plan the batch route.
+        The rider is reserved for the caller, who must release the reservation.
+        Returns (rider, route_stops, total_distance, reservation_token) where
+        route_stops is [(order, 'pickup' | 'drop'), ...] in visiting order.
         """
         if not orders:
-            return None, [], 0.0
+            return None, [], 0.0, None
         
         # Group orders by proximity to find potential batch assignments
         # For simplicity, we'll find the rider closest to the first order's pickup
         # and optimize the delivery sequence
         
         first_order = orders[0]
-        rider, distance = DeliveryService.find_nearest_available_rider(
+        rider, distance, reservation_token = DeliveryService.reserve_nearest_available_rider(
             float(first_order.pickup_lat), float(first_order.pickup_lng)
         )
         
         if not rider:
-            return None, [], 0.0
-        
-        # Optimize delivery sequence using nearest neighbor
-        optimized_sequence = DeliveryService.optimize_delivery_sequence(orders)
+            return None, [], 0.0, None
         
-        # Calculate total route distance
-        route_points = []
+        # Plan pickups and drops from the rider's position
         rider_location = rider_service.get_rider_location(str(rider.id))
-        if rider_location:
-            route_points.append((rider_location['lat'], rider_location['lng']))
-        
-        for order in optimized_sequence:
-            route_points.append((float(order.pickup_lat), float(order.pickup_lng)))
-            route_points.append((float(order.delivery_lat), float(order.delivery_lng)))
-        
-        total_distance = DeliveryService.calculate_route_distance(route_points)
+        start = (
+            (float(rider_location['lat']), float(rider_location['lng']))
+            if rider_location else None
+        )
+        route_stops, total_distance = optimize_batch_route(orders, start=start)
         
-        return rider, optimized_sequence, total_distance
+        return rider, route_stops, total_distance, reservation_token
 
     @staticmethod
     def optimize_delivery_sequence(orders: List[Order]) -> List[Order]:
         """
-        Optimize delivery sequence using nearest neighbor algorithm.
-        Returns orders in optimal sequence.
+        Optimize delivery sequence with the batch route optimizer.
+        Returns orders in the sequence their pickups are visited.
         """
         if len(orders) <= 1:
             return orders
         
-        # Start with first order
-        sequence = [orders[0]]
-        remaining = orders[1:]
-        
-        current_point = (float(orders[0].delivery_lat), float(orders[0].delivery_lng))
-        
-        while remaining:
-            nearest_order = None
-            min_distance = float('inf')
-            
-            for order in remaining:
-                # Calculate distance from current delivery point to next pickup
-                distance = DeliveryService.calculate_distance(
-                    current_point[0], current_point[1],
-                    float(order.pickup_lat), float(order.pickup_lng)
-                )
-                if distance < min_distance:
-                    min_distance = distance
-                    nearest_order = order
-            
-            if nearest_order:
-                sequence.append(nearest_order)
-                remaining.remove(nearest_order)
-                current_point = (float(nearest_order.delivery_lat), float(nearest_order.delivery_lng))
-            else:
-                break
-        
-        return sequence
+        route_stops, _ = optimize_batch_route(orders)
+        return [order for order, stop in route_stops if stop == PICKUP]
 
     @staticmethod
     def send_websocket_notification(group_name: str, message_type: str, data: dict):
@@ -205,34 +268,144 @@ class DeliveryService:
             )
 
     @staticmethod
-    def assign_delivery(order_id, retry_count=0):
+    def record_assignment_event(delivery, order, rider, distance):
+        """
+        RIDER_ASSIGNED event, written to the outbox inside the assignment
+        transaction so it is published if and only if the assignment commits.
+        """
+        event_data = {
+            'rider_name': rider.name,
+            'rider_phone': rider.phone,
+            'distance': float(distance) if distance else None
+        }
+        
+        event_service.create_event(
+            delivery_id=delivery.id,
+            order_id = order.id,
+            rider_id = rider.id,
+            event_type= EventTypes.RIDER_ASSIGNED,
+            event_data=event_data
+        )
+
+    @staticmethod
+    def on_delivery_assigned(delivery, order, rider, distance):
+        """
+        Side effects of a committed assignment: rider availability and
+        active delivery caches, delivery context, initial ETA, the route
+        (built in the background) and the order/rider WebSocket notifications.
+        """
+        rider_service.sync_rider_availability(rider)
+        rider_service.add_active_delivery(str(rider.id), str(delivery.id))
+        delivery_context_cache.set_from_delivery(delivery)
+        rider_location = rider_service.get_rider_location(str(rider.id))
+        try:
+            eta_service.start(delivery, order, rider, rider_location)
+        except Exception as e:
+            print(f"Error computing initial ETA for delivery {delivery.id}: {e}")
+        if rider_location:
+            try:
+                route_progress.schedule_build(
+                    delivery.id, (float(rider_location["lat"]), float(rider_location["lng"]))
+                )
+            except Exception as e:
+                print(f"Error scheduling route for delivery {delivery.id}: {e}")
+        
+        # Send WebSocket notification
+        DeliveryService.send_websocket_notification(
+            f"order_{order.id}",
+            "rider_assigned",
+            {
+                "delivery_id": str(delivery.id),
+                "rider": {
+                    "id": str(rider.id),
+                    "name": rider.name,
+                    "phone": rider.phone
+                },
+                "distance": float(distance) if distance else None
+            }
+        )
+        
+        # Also notify rider channel
+        DeliveryService.send_websocket_notification(
+            f"rider_{rider.id}",
+            "delivery_assigned",
+            {
+                "delivery_id": str(delivery.id),
+                "order_id": str(order.id),
+                "order_number": order.order_number,
+                "pickup_location": {
+                    "lat": float(order.pickup_lat),
+                    "lng": float(order.pickup_lng),
+                    "address": order.pickup_address
+                },
+                "delivery_location": {
+                    "lat": float(order.delivery_lat),
+                    "lng": float(order.delivery_lng),
+                    "address": order.delivery_address
+                }
+            }
+        )
+
+    @staticmethod
+    def assign_delivery(order_id, retry_count=0, rider_id=None):
         """
         Assign a delivery to the nearest available rider.
         Accepts orders with status 'pending' or 'ready'.
+        With `rider_id` the order goes to that rider instead; the caller is
+        expected to hold the rider's reservation (batch assignment).
+
+        Runs in two phases so row locks are only held for the writes:
+        the rider is searched for and reserved in Redis without any lock,
+        then a short transaction locks the order and rider, re-checks both,
+        creates the delivery and its outbox event. Caches and notifications
+        run after the commit.
         """
+        # Phase 1: candidate selection, no row locks held
+        order = Order.objects.get(id=order_id)
+        if order.status not in ['pending', 'ready']:
+            raise ValueError(f'Order is not in a valid state for assignment. Current status: {order.status}')
+
+        existing_delivery = Delivery.objects.filter(order=order).exclude(status__in=['failed', 'completed']).first()
+        if existing_delivery and existing_delivery.status == 'assigned':
+            return existing_delivery  # Already assigned
+
+        reservation_token = None
+        if rider_id:
+            rider_location = rider_service.get_rider_location(str(rider_id))
+            distance = DeliveryService.calculate_distance(
+                float(rider_location['lat']), float(rider_location['lng']),
+                float(order.pickup_lat), float(order.pickup_lng)
+            ) if rider_location else None
+        else:
+            rider, distance, reservation_token = DeliveryService.reserve_nearest_available_rider(
+                float(order.pickup_lat), float(order.pickup_lng)
+            )
+            if not rider:
+                # Update retry count and timestamp
+                Order.objects.filter(id=order.id).update(
+                    assignment_retry_count=retry_count + 1,
+                    last_assignment_retry_at=timezone.now(),
+                )
+                raise Exception('No available riders found !!')
+            rider_id = rider.id
+
         try:
+            # Phase 2: short locked commit, re-checking what phase 1 saw
             with transaction.atomic():
                 order = Order.objects.select_for_update().get(id=order_id)
-                
-                # Accept both 'pending' and 'ready' status orders
                 if order.status not in ['pending', 'ready']:
                     raise ValueError(f'Order is not in a valid state for assignment. Current status: {order.status}')
-                
-                # Check if delivery already exists
-                if Delivery.objects.filter(order=order).exclude(status__in=['failed', 'completed']).exists():
-                    existing_delivery = Delivery.objects.filter(order=order).exclude(status__in=['failed', 'completed']).first()
-                    if existing_delivery.status == 'assigned':
-                        return existing_delivery  # Already assigned
-                
-                rider, distance = DeliveryService.find_nearest_available_rider(
-                    float(order.pickup_lat), float(order.pickup_lng)
-                )
-                if not rider:
-                    # Update retry count and timestamp
-                    order.assignment_retry_count = retry_count + 1
-                    order.last_assignment_retry_at = timezone.now()
-                    order.save()
-                    raise Exception('No available riders found !!')
+                existing_delivery = Delivery.objects.filter(order=order).exclude(
+                    status__in=['failed', 'completed']
+                ).first()
+                if existing_delivery and existing_delivery.status == 'assigned':
+                    return existing_delivery  # Assigned concurrently
+
+                rider = Rider.objects.select_for_update().get(id=rider_id, is_active=True)
+                # The reservation guards against other workers, the row lock
+                # against a status change since the search
+                if reservation_token and rider.current_status != 'available':
+                    raise Exception('Selected rider is no longer available')
 
                 delivery = Delivery.objects.create(
                     order=order,
@@ -242,79 +415,42 @@ class DeliveryService:
                 )
 
                 rider.current_status = 'busy'
-                rider.save()
+                rider.save(update_fields=['current_status', 'updated_at'])
 
                 # Reset retry count on successful assignment
                 order.assignment_retry_count = 0
                 order.last_assignment_retry_at = None
-                
+
                 # Order status remains 'preparing' or 'ready' until rider accepts
                 # Only change if order is still pending
                 if order.status == 'pending':
                     order.status = 'preparing'
-                order.save()
+                order.save(update_fields=[
+                    'assignment_retry_count', 'last_assignment_retry_at', 'status', 'updated_at'
+                ])
+                DeliveryService.record_assignment_event(delivery, order, rider, distance)
 
-                rider_service.add_active_delivery(str(rider.id), str(delivery.id))
-                
-                event_data = {
-                    'rider_name': rider.name,
-                    'rider_phone': rider.phone,
-                    'distance': float(distance) if distance else None
-                }
-                
-                event_service.create_event(
-                    delivery_id=delivery.id,
-                    order_id = order.id,
-                    rider_id = rider.id,
-                    event_type= EventTypes.RIDER_ASSIGNED,
-                    event_data=event_data
-                )
-                
-                # Send WebSocket notification
-                DeliveryService.send_websocket_notification(
-                    f"order_{order.id}",
-                    "rider_assigned",
-                    {
-                        "delivery_id": str(delivery.id),
-                        "rider": {
-                            "id": str(rider.id),
-                            "name": rider.name,
-                            "phone": rider.phone
-                        },
-                        "distance": float(distance) if distance else None
-                    }
-                )
-                
-                # Also notify rider channel
-                DeliveryService.send_websocket_notification(
-                    f"rider_{rider.id}",
-                    "delivery_assigned",
-                    {
-                        "delivery_id": str(delivery.id),
-                        "order_id": str(order.id),
-                        "order_number": order.order_number,
-                        "pickup_location": {
-                            "lat": float(order.pickup_lat),
-                            "lng": float(order.pickup_lng),
-                            "address": order.pickup_address
-                        },
-                        "delivery_location": {
-                            "lat": float(order.delivery_lat),
-                            "lng": float(order.delivery_lng),
-                            "address": order.delivery_address
-                        }
-                    }
+                # Side effects must not run for a rolled back assignment, nor
+                # keep the locks held while they talk to Redis/channels
+                transaction.on_commit(
+                    lambda: DeliveryService.on_delivery_assigned(delivery, order, rider, distance),
+                    robust=True,
                 )
-                
-                return delivery
-        except Exception as e:
-            raise e
+
+            return delivery
+        finally:
+            if reservation_token:
+                DeliveryService.release_rider_reservation(rider_id, reservation_token)
 
     @staticmethod
-    def retry_unassigned_orders(max_retries=10, max_age_hours=24):
+    def retry_unassigned_orders(max_retries=10, max_age_hours=24, strategy=None):
         """
         Retry assignment for orders that are ready but haven't been assigned.
         Uses exponential backoff for retry timing.
+        strategy 'greedy' assigns orders one by one to their nearest rider,
+        'global' matches all due orders at once (see dispatch.DispatchEngine).
+        'retried' counts every order attempted in this sweep, whether or not
+        it got a rider; 'assigned' counts the ones that did.
         """
         from django.utils import timezone
         from datetime import timedelta
@@ -326,8 +462,10 @@ class DeliveryService:
             id__in=Delivery.objects.exclude(status__in=['failed', 'completed']).values_list('order_id', flat=True)
         )
         
+        strategy = strategy or settings.DISPATCH_STRATEGY
         retried_count = 0
         assigned_count = 0
+        due_orders = []
         
         for order in ready_orders:
             # Check if order is too old (more than max_age_hours)
@@ -351,6 +489,10 @@ class DeliveryService:
                 if timezone.now() < next_retry_time:
                     continue  # Not time to retry yet
             
+            if strategy == 'global':
+                due_orders.append(order)
+                continue
+            
             # Attempt assignment
             try:
                 DeliveryService.assign_delivery(str(order.id), retry_count=retry_count)
@@ -360,6 +502,16 @@ class DeliveryService:
                 retried_count += 1
                 print(f"Retry assignment failed for order {order.id}: {e}")
         
+        if due_orders:
+            from .dispatch import dispatch_engine
+            try:
+                result = dispatch_engine.dispatch(due_orders)
+                assigned_count += result['assigned']
+            except Exception as e:
+                print(f"Global dispatch failed for {len(due_orders)} orders: {e}")
+            # Counted like the greedy path: one attempt per due order
+            retried_count += len(due_orders)
+        
         return {
             'retried': retried_count,
             'assigned': assigned_count
@@ -377,12 +529,6 @@ class DeliveryService:
                 if location:
                     delivery.last_location_lat = location.get('lat')
                     delivery.last_location_lng = location.get('lng')
-                    # Also update rider location in database
-                    rider_service.update_rider_location(
-                        str(delivery.rider.id),
-                        location,
-                        delivery_id=str(delivery_id)
-                    )
                 
                 # Persist simulation state if provided
                 if route_index is not None:
@@ -408,7 +554,6 @@ class DeliveryService:
                     order.actual_delivery_time = timezone.now()
                     order.save()
                     delivery.completed_at = timezone.now()
-                    rider_service.remove_active_delivery(str(delivery.rider.id), str(delivery.id))
                     delivery.rider.current_status = 'available'
                     delivery.rider.save()
                 elif new_status == 'failed':
@@ -432,19 +577,13 @@ class DeliveryService:
                         },
                         location = location
                     )
-                
-                # Send WebSocket notification with order status update
-                DeliveryService.send_websocket_notification(
-                    f"order_{delivery.order.id}",
-                    "order_update",
-                    {
-                        "delivery_id": str(delivery.id),
-                        "delivery_status": new_status,
-                        "order_status": order.status,
-                        "old_status": old_status,
-                        "location": location,
-                        "timestamp": timezone.now().isoformat()
-                    }
+
+                # Caches, ETA and notifications only follow a committed change
+                transaction.on_commit(
+                    lambda: DeliveryService.on_delivery_status_changed(
+                        delivery, order, old_status, location
+                    ),
+                    robust=True,
                 )
                 
                 return delivery
@@ -452,4 +591,39 @@ class DeliveryService:
         except Exception as e:
             raise e
 
+    @staticmethod
+    def on_delivery_status_changed(delivery, order, old_status, location=None):
+        """
+        Side effects of a committed status change: rider location and
+        availability, delivery context, ETA and route progress caches and the
+        order WebSocket notification.
+        """
+        rider_id = str(delivery.rider_id)
+        if location:
+            rider_service.update_rider_location(rider_id, location, delivery_id=str(delivery.id))
+        if delivery.status == 'completed':
+            rider_service.remove_active_delivery(rider_id, str(delivery.id))
+            rider_service.sync_rider_availability(delivery.rider)
+        delivery_context_cache.set_from_delivery(delivery)
+        try:
+            eta_service.on_status_change(delivery, location)
+        except Exception as e:
+            print(f"Error updating ETA for delivery {delivery.id}: {e}")
+        if delivery.status in ('completed', 'failed'):
+            route_progress.clear(delivery.id)
+
+        # Send WebSocket notification with order status update
+        DeliveryService.send_websocket_notification(
+            f"order_{order.id}",
+            "order_update",
+            {
+                "delivery_id": str(delivery.id),
+                "delivery_status": delivery.status,
+                "order_status": order.status,
+                "old_status": old_status,
+                "location": location,
+                "timestamp": timezone.now().isoformat()
+            }
+        )
+
 delivery_service = DeliveryService()
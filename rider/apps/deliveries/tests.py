@@ -1,3 +1,664 @@
-from django.test import TestCase
+import heapq
+import itertools
+import json
+import math
+import random
+import time
+import uuid
+from types import SimpleNamespace
+from unittest import mock
 
-# Create your tests here.
+import fakeredis
+import numpy as np
+from django.test import SimpleTestCase
+from infrastructure.kafka_client import (
+    CODEC_HEADER,
+    JSON_CODEC,
+    LOCATION_CODEC_V1,
+    KafkaClient,
+    LocationCodecV1,
+    decode_message,
+)
+
+from confluent_kafka import TIMESTAMP_CREATE_TIME
+
+from apps.deliveries import distance as geo
+from apps.deliveries.consumers import LocationUpdateConsumer
+from apps.deliveries.dispatch import DispatchEngine, solve_assignment
+from apps.deliveries.eta import TO_DROP, TO_PICKUP, EtaService
+from apps.deliveries.road_graph import RoadGraph
+from apps.deliveries.route_cache import RouteCache
+from apps.deliveries.route_progress import RouteIndex, RouteProgressService
+from apps.deliveries.route_optimizer import (
+    DROP,
+    PICKUP,
+    _is_feasible,
+    _nearest_neighbour,
+    _path_cost,
+    optimize_batch_route,
+)
+
+
+def brute_force_assignment(cost):
+    """(pairs, total cost) of the best matching: most feasible pairs, then cheapest"""
+    n, m = cost.shape
+    best = (0, 0.0)
+    options = list(range(m)) + [None] * n
+    for columns in set(itertools.permutations(options, n)):
+        pairs = [(row, col) for row, col in enumerate(columns) if col is not None]
+        if any(not np.isfinite(cost[row, col]) for row, col in pairs):
+            continue
+        total = sum(cost[row, col] for row, col in pairs)
+        if len(pairs) > best[0] or (len(pairs) == best[0] and total < best[1]):
+            best = (len(pairs), total)
+    return best
+
+
+class SolveAssignmentTests(SimpleTestCase):
+    def test_matches_brute_force(self):
+        rng = random.Random(7)
+        for _ in range(3000):
+            n, m = rng.randint(1, 5), rng.randint(1, 5)
+            cost = np.array([[rng.uniform(0, 10) for _ in range(m)] for _ in range(n)])
+            cost[np.array([[rng.random() < 0.3 for _ in range(m)] for _ in range(n)])] = np.inf
+
+            pairs = solve_assignment(cost)
+            rows = [row for row, _ in pairs]
+            columns = [col for _, col in pairs]
+            self.assertEqual(len(set(rows)), len(rows))
+            self.assertEqual(len(set(columns)), len(columns))
+            self.assertTrue(all(np.isfinite(cost[row, col]) for row, col in pairs))
+
+            expected_count, expected_total = brute_force_assignment(cost)
+            self.assertEqual(len(pairs), expected_count, cost)
+            self.assertAlmostEqual(sum(cost[row, col] for row, col in pairs), expected_total, msg=cost)
+
+    def test_empty_and_infeasible(self):
+        self.assertEqual(solve_assignment(np.zeros((0, 3))), [])
+        self.assertEqual(solve_assignment(np.full((2, 2), np.inf)), [])
+
+
+class DispatchPlanTests(SimpleTestCase):
+    @staticmethod
+    def order(order_id, lat, lng):
+        return SimpleNamespace(id=order_id, pickup_lat=lat, pickup_lng=lng)
+
+    def setUp(self):
+        # Both orders are nearest to rider "a"; "b" is a bit further, "c" out of range
+        self.orders = [self.order(1, 28.6000, 77.2000), self.order(2, 28.6010, 77.2000)]
+        self.riders = [SimpleNamespace(id=rider_id) for rider_id in ("a", "b", "c")]
+        self.coords = np.array([[28.6005, 77.2000], [28.6050, 77.2000], [28.9000, 77.2000]])
+
+    def test_plan_assigns_each_order_a_distinct_rider(self):
+        engine = DispatchEngine(max_pickup_km=5.0, candidates_per_order=2)
+        matches = engine.plan(self.orders, self.riders, self.coords)
+        self.assertEqual(sorted((order.id, rider.id) for order, rider, _ in matches), [(1, "a"), (2, "b")])
+        for order, rider, distance in matches:
+            self.assertLess(distance, 5.0)
+
+    def test_plan_prunes_riders_outside_top_k(self):
+        # With a single candidate per order only rider "a" is kept, so one order waits
+        engine = DispatchEngine(max_pickup_km=5.0, candidates_per_order=1)
+        matches = engine.plan(self.orders, self.riders, self.coords)
+        self.assertEqual(len(matches), 1)
+        self.assertEqual(matches[0][1].id, "a")
+
+    def test_plan_ignores_riders_beyond_radius(self):
+        engine = DispatchEngine(max_pickup_km=5.0, candidates_per_order=3)
+        matches = engine.plan(self.orders, self.riders[2:], self.coords[2:])
+        self.assertEqual(matches, [])
+
+
+class BatchRouteTests(SimpleTestCase):
+    start = (28.6, 77.2)
+
+    @staticmethod
+    def random_orders(rng, count):
+        def point():
+            return 28.5 + rng.random() * 0.2, 77.1 + rng.random() * 0.2
+
+        orders = []
+        for order_id in range(count):
+            (pickup_lat, pickup_lng), (delivery_lat, delivery_lng) = point(), point()
+            orders.append(
+                SimpleNamespace(
+                    id=order_id,
+                    pickup_lat=pickup_lat,
+                    pickup_lng=pickup_lng,
+                    delivery_lat=delivery_lat,
+                    delivery_lng=delivery_lng,
+                )
+            )
+        return orders
+
+    def cost_matrix(self, orders):
+        lats, lngs = [self.start[0]], [self.start[1]]
+        for order in orders:
+            lats.extend([order.pickup_lat, order.delivery_lat])
+            lngs.extend([order.pickup_lng, order.delivery_lng])
+        return geo.distance_matrix(lats, lngs)
+
+    def assert_precedence(self, orders, stops):
+        expected = sorted((order.id, kind) for order in orders for kind in (PICKUP, DROP))
+        self.assertEqual(sorted((order.id, kind) for order, kind in stops), expected)
+        seen = set()
+        for order, kind in stops:
+            if kind == DROP:
+                self.assertIn(order.id, seen, stops)
+            seen.add(order.id)
+
+    def test_pickup_precedes_drop(self):
+        rng = random.Random(11)
+        for _ in range(200):
+            orders = self.random_orders(rng, rng.randint(1, 8))
+            stops, total_km = optimize_batch_route(orders, self.start, time_budget_ms=20)
+            self.assert_precedence(orders, stops)
+            self.assertGreater(total_km, 0)
+
+    def test_small_batches_match_brute_force(self):
+        rng = random.Random(5)
+        for _ in range(200):
+            orders = self.random_orders(rng, rng.choice([2, 3]))
+            cost = self.cost_matrix(orders)
+            nodes = range(1, 2 * len(orders) + 1)
+            best = min(
+                _path_cost(cost, route)
+                for route in itertools.permutations(nodes)
+                if _is_feasible(route, len(orders))
+            )
+            _, total_km = optimize_batch_route(orders, self.start, time_budget_ms=1000)
+            self.assertAlmostEqual(total_km, best, places=9)
+
+    def test_stops_at_the_deadline(self):
+        rng = random.Random(2)
+        orders = self.random_orders(rng, 40)
+        started = time.monotonic()
+        stops, _ = optimize_batch_route(orders, self.start, time_budget_ms=10)
+        # Unbounded, local search on 80 stops runs for about a second
+        self.assertLess(time.monotonic() - started, 0.5)
+        self.assert_precedence(orders, stops)
+
+    def test_no_budget_returns_the_greedy_route(self):
+        orders = self.random_orders(random.Random(4), 3)
+        greedy = _nearest_neighbour(self.cost_matrix(orders), len(orders))
+        stops, total_km = optimize_batch_route(orders, self.start, time_budget_ms=0)
+        self.assertEqual(
+            [(order.id, kind) for order, kind in stops],
+            [((node - 1) // 2, PICKUP if node % 2 else DROP) for node in greedy],
+        )
+        self.assertAlmostEqual(total_km, _path_cost(self.cost_matrix(orders), greedy))
+
+
+class EtaServiceTests(SimpleTestCase):
+    def setUp(self):
+        self.redis = fakeredis.FakeRedis(decode_responses=True)
+        patch = mock.patch("apps.deliveries.eta.redis_client", self.redis)
+        patch.start()
+        self.addCleanup(patch.stop)
+        self.published = []
+        patch = mock.patch.object(
+            EtaService, "_publish", side_effect=lambda delivery_id, state: self.published.append(dict(state))
+        )
+        patch.start()
+        self.addCleanup(patch.stop)
+
+        self.eta = EtaService(route_factor=1.3, handover_minutes=3, threshold_seconds=60, speed_smoothing=0.2)
+        self.delivery = SimpleNamespace(id="d1", status="assigned")
+        order = SimpleNamespace(
+            id="o1", pickup_lat=28.60, pickup_lng=77.20, delivery_lat=28.65, delivery_lng=77.25
+        )
+        self.eta.start(self.delivery, order, SimpleNamespace(vehicle_type="bike"), {"lat": 28.58, "lng": 77.18})
+
+    def state(self):
+        return self.eta.get(self.delivery.id)
+
+    def test_start_publishes_the_initial_eta(self):
+        self.assertEqual(len(self.published), 1)
+        state = self.state()
+        self.assertEqual(state["phase"], TO_PICKUP)
+        self.assertEqual(float(state["speed"]), 22.0)
+        self.assertGreater(float(state["remaining_km"]), float(state["delivery_leg_km"]))
+
+    def test_reported_speed_is_clamped_around_the_profile(self):
+        # 200 km/h is clamped to 1.5 x 22 before smoothing
+        self.eta.on_location(self.delivery.id, {"lat": 28.58, "lng": 77.18, "speed": 200})
+        self.assertAlmostEqual(float(self.state()["speed"]), 0.2 * 33.0 + 0.8 * 22.0)
+
+        self.redis.hset(self.eta._key(self.delivery.id), "speed", 22.0)
+        # ... and a near standstill to 0.5 x 22
+        self.eta.on_location(self.delivery.id, {"lat": 28.58, "lng": 77.18, "speed": 1})
+        self.assertAlmostEqual(float(self.state()["speed"]), 0.2 * 11.0 + 0.8 * 22.0)
+
+        # No reported speed leaves the smoothed speed alone
+        before = self.state()["speed"]
+        self.eta.on_location(self.delivery.id, {"lat": 28.58, "lng": 77.18})
+        self.assertEqual(self.state()["speed"], before)
+
+    def test_small_moves_are_not_published(self):
+        self.eta.on_location(self.delivery.id, {"lat": 28.5801, "lng": 77.1801})
+        self.assertEqual(len(self.published), 1)
+        self.eta.on_location(self.delivery.id, {"lat": 28.60, "lng": 77.20})
+        self.assertEqual(len(self.published), 2)
+
+    def test_status_transitions(self):
+        self.delivery.status = "accepted"
+        self.eta.on_status_change(self.delivery)
+        self.assertEqual(self.state()["phase"], TO_PICKUP)
+        self.assertEqual(len(self.published), 1)
+
+        self.delivery.status = "collected"
+        self.eta.on_status_change(self.delivery)
+        state = self.state()
+        self.assertEqual(state["phase"], TO_DROP)
+        # From the pickup only the drop leg is left
+        self.assertAlmostEqual(float(state["remaining_km"]), float(state["delivery_leg_km"]), places=3)
+        self.assertEqual(len(self.published), 2)
+
+        # Already on the drop leg
+        self.delivery.status = "in_progress"
+        self.eta.on_status_change(self.delivery, {"lat": 28.62, "lng": 77.22})
+        self.assertEqual(len(self.published), 2)
+
+        self.delivery.status = "completed"
+        self.eta.on_status_change(self.delivery)
+        self.assertIsNone(self.state())
+        self.assertIsNone(self.eta.on_location(self.delivery.id, {"lat": 28.62, "lng": 77.22}))
+
+
+def straight_route(points=60):
+    """Route due east along latitude 28.6, segments of ~98 m"""
+    return RouteIndex.from_points([(28.6, 77.2 + 0.001 * n) for n in range(points)])
+
+
+class RouteIndexTests(SimpleTestCase):
+    def setUp(self):
+        self.route = straight_route()
+
+    def test_cumulative_distances(self):
+        self.assertEqual(self.route.num_segments, 59)
+        self.assertEqual(self.route.cum_km[0], 0.0)
+        legs = np.diff(self.route.cum_km)
+        self.assertTrue(np.allclose(legs, legs[0]))
+        self.assertAlmostEqual(self.route.total_km, geo.point_distance(28.6, 77.2, 28.6, 77.259), places=3)
+
+    def test_project_onto_nearby_segment(self):
+        # ~33 m north of the middle of segment 10
+        segment, along_km, offset_km = self.route.project(28.6003, 77.2105, hint=10)
+        self.assertEqual(segment, 10)
+        middle = (self.route.cum_km[10] + self.route.cum_km[11]) / 2
+        self.assertAlmostEqual(along_km, middle, places=3)
+        self.assertAlmostEqual(offset_km, 0.0334, places=3)
+
+    def test_locate_bisects_cumulative_distance(self):
+        cum_km = self.route.cum_km
+        self.assertEqual(self.route.locate(cum_km[7]), 7)
+        self.assertEqual(self.route.locate(cum_km[7] - 1e-6), 6)
+        self.assertEqual(self.route.locate(-1.0), 0)
+        # The route end belongs to the last segment
+        self.assertEqual(self.route.locate(self.route.total_km + 1.0), self.route.num_segments - 1)
+
+    def test_window_is_searched_before_the_whole_route(self):
+        with mock.patch.object(RouteIndex, "_project_segments", wraps=self.route._project_segments) as project:
+            self.assertEqual(self.route.project(28.6, 77.2125, hint=10, window=8)[0], 12)
+            self.assertEqual(project.call_count, 1)
+            self.assertEqual(project.call_args.args[2:], (8, 18))
+
+            # Nothing near the hint explains a ping by segment 50: full search
+            project.reset_mock()
+            segment, _, offset_km = self.route.project(28.6, 77.2505, hint=0, window=8)
+            self.assertEqual(segment, 50)
+            self.assertLess(offset_km, 0.001)
+            self.assertEqual(project.call_count, 2)
+
+    def test_single_point_route(self):
+        route = RouteIndex.from_points([(28.6, 77.2)])
+        self.assertEqual(route.total_km, 0.0)
+        segment, along_km, offset_km = route.project(28.601, 77.2)
+        self.assertEqual((segment, along_km), (0, 0.0))
+        self.assertAlmostEqual(offset_km, 0.111, places=3)
+        self.assertEqual(route.locate(1.0), 0)
+
+    def test_mapping_round_trip(self):
+        route = RouteIndex.from_mapping(self.route.to_mapping())
+        self.assertTrue(np.allclose(route.cum_km, self.route.cum_km, atol=1e-5))
+        self.assertTrue(np.allclose(route.lngs, self.route.lngs, atol=1e-4))
+
+
+class RouteProgressTests(SimpleTestCase):
+    delivery_id = "d1"
+
+    def setUp(self):
+        self.redis = fakeredis.FakeRedis(decode_responses=True)
+        patch = mock.patch("apps.deliveries.route_progress.redis_client", self.redis)
+        patch.start()
+        self.addCleanup(patch.stop)
+        self.progress = RouteProgressService(
+            off_route_meters=75, reroute_after=3, nearby_km=0.5, window=25,
+            build_workers=1, max_local_routes=10,
+        )
+        patch = mock.patch.object(self.progress, "schedule_build")
+        self.schedule_build = patch.start()
+        self.addCleanup(patch.stop)
+
+        route = straight_route()
+        self.redis.hset(
+            self.progress._key(self.delivery_id),
+            mapping={
+                **route.to_mapping(),
+                "version": "v1",
+                "order_id": "o1",
+                "pickup_km": float(route.cum_km[20]),
+                "pickup_index": 20,
+                "index": 0,
+                "along_km": 0.0,
+                "misses": 0,
+                "nearby_sent": 0,
+            },
+        )
+
+    def ping(self, lat, lng):
+        return self.progress.on_location(self.delivery_id, {"lat": lat, "lng": lng})
+
+    def test_progress_along_the_route(self):
+        progress = self.ping(28.6, 77.2105)
+        self.assertFalse(progress["off_route"])
+        self.assertEqual(progress["index"], 10)
+        self.assertFalse(progress["passed_pickup"])
+        self.assertAlmostEqual(progress["remaining_km"], progress["total_km"] - progress["along_km"], places=3)
+        self.assertTrue(self.ping(28.6, 77.2305)["passed_pickup"])
+
+    def test_off_route_pings_hold_position_then_reroute(self):
+        self.ping(28.6, 77.2105)
+        for miss in range(1, 4):
+            # ~330 m north of the route
+            progress = self.ping(28.603, 77.2155)
+            self.assertTrue(progress["off_route"])
+            self.assertEqual(progress["index"], 10)
+            self.assertEqual(self.redis.hget(self.progress._key(self.delivery_id), "misses"), str(miss))
+        self.schedule_build.assert_called_once_with(self.delivery_id, (28.603, 77.2155))
+
+        # Back on the route resets the miss count
+        self.assertFalse(self.ping(28.6, 77.2155)["off_route"])
+        self.assertEqual(self.redis.hget(self.progress._key(self.delivery_id), "misses"), "0")
+
+    def test_progress_is_only_written_to_its_route_version(self):
+        key = self.progress._key(self.delivery_id)
+        # Computed on a route that has since been replaced
+        self.assertEqual(self.redis.eval(RouteProgressService.UPDATE_SCRIPT, 1, key, "v0", "index", 40), 0)
+        self.assertEqual(self.redis.hget(key, "index"), "0")
+
+        self.assertEqual(self.redis.eval(RouteProgressService.UPDATE_SCRIPT, 1, key, "v1", "index", 40), 1)
+        self.assertEqual(self.redis.hget(key, "index"), "40")
+
+
+class ConsumeLoopTests(SimpleTestCase):
+    topic = "delivery.rider.location"
+
+    def setUp(self):
+        patches = [
+            mock.patch("apps.deliveries.consumers.consumer_metrics"),
+            mock.patch("apps.deliveries.consumers.get_channel_layer"),
+            mock.patch("apps.deliveries.consumers.time.sleep"),
+        ]
+        self.metrics = patches[0].start()
+        for patch in patches[1:]:
+            patch.start()
+        for patch in patches:
+            self.addCleanup(patch.stop)
+        self.location_consumer = LocationUpdateConsumer(
+            batch_size=100, batch_timeout=0.1, fanout_concurrency=10, max_staleness=30
+        )
+        self.kafka = mock.Mock()
+        self.kafka.get_watermark_offsets.return_value = (0, 500)
+        self.location_consumer.consumer = self.kafka
+        self.processed = []
+        patch = mock.patch.object(
+            self.location_consumer, "_process_batch",
+            side_effect=lambda updates, channel_layer: self.processed.append(updates) or len(updates),
+        )
+        patch.start()
+        self.addCleanup(patch.stop)
+
+    def message(self, partition, offset, age_seconds=0):
+        value = json.dumps({"rider_id": f"r{partition}", "location": {"lat": 28.6, "lng": 77.2}})
+        return mock.Mock(
+            **{
+                "error.return_value": None,
+                "topic.return_value": self.topic,
+                "partition.return_value": partition,
+                "offset.return_value": offset,
+                "timestamp.return_value": (TIMESTAMP_CREATE_TIME, (time.time() - age_seconds) * 1000),
+                "value.return_value": value.encode("utf-8"),
+                "headers.return_value": None,
+            }
+        )
+
+    def run_batches(self, *batches):
+        batches = list(batches)
+
+        def consume(num_messages, timeout):
+            if not batches:
+                self.location_consumer.running = False
+                return []
+            return batches.pop(0)
+
+        self.kafka.consume.side_effect = consume
+        self.location_consumer.running = True
+        self.location_consumer._consume_loop()
+
+    def commits(self):
+        return [
+            sorted((tp.partition, tp.offset) for tp in call.kwargs["offsets"])
+            for call in self.kafka.commit.call_args_list
+        ]
+
+    def seeks(self):
+        return [(call.args[0].partition, call.args[0].offset) for call in self.kafka.seek.call_args_list]
+
+    def test_batch_is_committed_after_processing(self):
+        self.run_batches([self.message(0, 10), self.message(1, 3), self.message(0, 11)])
+        self.assertEqual(len(self.processed), 1)
+        self.assertEqual(len(self.processed[0]), 3)
+        # Next offset to read per partition
+        self.assertEqual(self.commits(), [[(0, 12), (1, 4)]])
+        self.assertEqual(self.seeks(), [])
+
+    def test_failed_batch_is_rewound_and_not_committed(self):
+        self.location_consumer._process_batch.side_effect = Exception("channel layer down")
+        self.run_batches([self.message(0, 10), self.message(0, 11), self.message(1, 3)])
+        self.kafka.commit.assert_not_called()
+        self.assertEqual(sorted(self.seeks()), [(0, 10), (1, 3)])
+
+    def test_retried_batch_is_committed_once_it_succeeds(self):
+        batch = [self.message(0, 10), self.message(0, 11)]
+        self.location_consumer._process_batch.side_effect = [Exception("channel layer down"), 2]
+        self.run_batches(batch, batch)
+        self.assertEqual(self.seeks(), [(0, 10)])
+        self.assertEqual(self.commits(), [[(0, 12)]])
+
+    def test_stale_partition_skips_ahead_to_a_fresh_watermark(self):
+        self.run_batches([self.message(0, 10, age_seconds=120), self.message(0, 11, age_seconds=120)])
+        self.assertEqual(self.processed, [[]])
+        self.kafka.get_watermark_offsets.assert_any_call(mock.ANY, timeout=5, cached=False)
+        # Batch committed, then the jump to the end of the partition
+        self.assertEqual(self.seeks(), [(0, 500)])
+        self.assertEqual(self.commits(), [[(0, 12)], [(0, 500)]])
+        self.assertEqual(self.metrics.record_batch.call_args.kwargs["skipped"], 2 + 500 - 12)
+
+    def test_no_jump_when_already_at_the_watermark(self):
+        self.kafka.get_watermark_offsets.return_value = (0, 12)
+        self.run_batches([self.message(0, 10, age_seconds=120), self.message(0, 11, age_seconds=120)])
+        self.assertEqual(self.seeks(), [])
+        self.assertEqual(self.commits(), [[(0, 12)]])
+
+
+class RoadGraphTests(SimpleTestCase):
+    size = 30
+
+    def setUp(self):
+        # Jittered size x size street grid, ~100 m blocks, two-way streets
+        rng = np.random.default_rng(3)
+        n = self.size
+        lat = 28.5 + np.repeat(np.arange(n), n) * 0.001 + rng.normal(0, 0.0002, n * n)
+        lng = 77.1 + np.tile(np.arange(n), n) * 0.001 + rng.normal(0, 0.0002, n * n)
+        edges = []
+        for node in range(n * n):
+            if node % n + 1 < n:
+                edges += [(node, node + 1), (node + 1, node)]
+            if node + n < n * n:
+                edges += [(node, node + n), (node + n, node)]
+        src, dst = np.array(edges).T
+        order = np.argsort(src, kind="stable")
+        indptr = np.zeros(n * n + 1, dtype=np.int64)
+        np.cumsum(np.bincount(src, minlength=n * n), out=indptr[1:])
+        weights = geo.pairwise_distance(lat[src], lng[src], lat[dst], lng[dst])
+        self.graph = RoadGraph(lat, lng, indptr, dst[order], weights[order])
+        self.rng = rng
+
+    def dijkstra(self, source, target):
+        graph = self.graph
+        best, frontier = {source: 0.0}, [(0.0, source)]
+        while frontier:
+            cost, node = heapq.heappop(frontier)
+            if node == target:
+                return cost
+            for edge in range(graph.indptr[node], graph.indptr[node + 1]):
+                neighbour, new_cost = int(graph.indices[edge]), cost + float(graph.weights[edge])
+                if new_cost < best.get(neighbour, math.inf):
+                    best[neighbour] = new_cost
+                    heapq.heappush(frontier, (new_cost, neighbour))
+        return None
+
+    def test_nearest_node_matches_full_scan(self):
+        points = [(28.48 + self.rng.random() * 0.07, 77.08 + self.rng.random() * 0.07) for _ in range(300)]
+        # Far outside the grid as well
+        points += [(28.0, 77.0), (40.0, 10.0), (-33.9, 151.2)]
+        for lat, lng in points:
+            node, distance_km = self.graph.nearest_node(lat, lng)
+            self.assertAlmostEqual(distance_km, self.graph._scan_nearest_node(lat, lng)[1], places=9)
+            self.assertAlmostEqual(
+                distance_km,
+                geo.point_distance(lat, lng, self.graph.node_lat[node], self.graph.node_lng[node], mode="equirectangular"),
+                places=9,
+            )
+
+    def test_nearest_node_stops_at_max_distance(self):
+        node, distance_km = self.graph.nearest_node(28.3, 77.1, max_km=1.0)
+        self.assertGreater(distance_km, 1.0)
+        self.assertIsNone(self.graph.route([(28.3, 77.1), (28.51, 77.11)], max_snap_km=1.0))
+        self.assertEqual(RoadGraph([], [], [0], [], []).nearest_node(28.5, 77.1), (-1, math.inf))
+
+    def test_shortest_path_matches_dijkstra(self):
+        for _ in range(30):
+            source, target = (int(node) for node in self.rng.integers(self.size ** 2, size=2))
+            path, length_km = self.graph.shortest_path(source, target)
+            self.assertEqual((path[0], path[-1]), (source, target))
+            self.assertAlmostEqual(length_km, self.dijkstra(source, target), places=4)
+
+
+class RouteCacheTests(SimpleTestCase):
+    route = [(28.6, 77.2), (28.61, 77.21), (28.62, 77.2)]
+
+    def setUp(self):
+        self.redis = fakeredis.FakeRedis(decode_responses=True)
+        patch = mock.patch("apps.deliveries.route_cache.redis_client", self.redis)
+        patch.start()
+        self.addCleanup(patch.stop)
+        self.cache = RouteCache(max_bytes=1024, ttl=60, key_precision=4)
+        self.key = self.cache.make_key(self.route[0], self.route[-1])
+
+    def test_stats_count_each_tier(self):
+        self.assertIsNone(self.cache.get(self.key))
+        self.cache.set(self.key, self.route)
+        self.assertEqual(self.cache.get(self.key), self.route)
+        # Another process only finds it in Redis, then locally
+        other = RouteCache(max_bytes=1024, ttl=60, key_precision=4)
+        self.assertEqual(other.get(self.key), self.route)
+        self.assertEqual(other.get(self.key), self.route)
+
+        stats = self.cache.stats()
+        self.assertEqual((stats["local_hits"], stats["redis_hits"], stats["misses"]), (1, 0, 1))
+        self.assertEqual(stats["hit_ratio"], 0.5)
+        self.assertEqual(stats["entries"], 1)
+        other_stats = other.stats()
+        self.assertEqual((other_stats["local_hits"], other_stats["redis_hits"]), (1, 1))
+
+    def test_stats_endpoint(self):
+        with mock.patch("apps.deliveries.views.route_cache", self.cache):
+            self.cache.get(self.key)
+            response = self.client.get("/api/v1/deliveries/route_cache_stats/")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["misses"], 1)
+
+
+class LocationCodecTests(SimpleTestCase):
+    def message(self, **location):
+        return {
+            "rider_id": str(uuid.uuid4()),
+            "delivery_id": str(uuid.uuid4()),
+            "location": {
+                "lat": 28.613912,
+                "lng": 77.209023,
+                "accuracy": 5.0,
+                "speed": 12.5,
+                "heading": 90.0,
+                "battery_level": 80,
+                "timestamp": "2026-10-17T10:15:30.123000",
+                **location,
+            },
+        }
+
+    @staticmethod
+    def headers(codec_name):
+        return [(CODEC_HEADER, codec_name.encode("ascii"))]
+
+    def test_round_trip(self):
+        message = self.message()
+        value, codec_name = KafkaClient._encode(message, LOCATION_CODEC_V1)
+        self.assertEqual(codec_name, LOCATION_CODEC_V1)
+        self.assertEqual(len(value), 62)
+
+        decoded = decode_message(value, self.headers(codec_name))
+        self.assertEqual(decoded["rider_id"], message["rider_id"])
+        self.assertEqual(decoded["delivery_id"], message["delivery_id"])
+        self.assertEqual(decoded["timestamp"], message["location"]["timestamp"])
+        for field, expected in message["location"].items():
+            if isinstance(expected, float):
+                self.assertAlmostEqual(decoded["location"][field], expected, places=5)
+            else:
+                self.assertEqual(decoded["location"][field], expected)
+
+    def test_missing_delivery_id(self):
+        message = self.message()
+        message["delivery_id"] = None
+        decoded = LocationCodecV1.decode(LocationCodecV1.encode(message))
+        self.assertIsNone(decoded["delivery_id"])
+        self.assertEqual(decoded["rider_id"], message["rider_id"])
+
+    def test_missing_optional_fields(self):
+        message = self.message(accuracy=None, speed=None, heading=None, battery_level=None)
+        location = LocationCodecV1.decode(LocationCodecV1.encode(message))["location"]
+        for field in ("accuracy", "speed", "heading", "battery_level"):
+            self.assertIsNone(location[field])
+
+    def test_nan_optional_fields_decode_as_missing(self):
+        message = self.message(accuracy=math.nan, speed=math.nan)
+        location = LocationCodecV1.decode(LocationCodecV1.encode(message))["location"]
+        self.assertIsNone(location["accuracy"])
+        self.assertIsNone(location["speed"])
+
+    def test_unrepresentable_event_falls_back_to_json(self):
+        # battery_level is a signed byte on the wire
+        message = self.message(battery_level=200)
+        value, codec_name = KafkaClient._encode(message, LOCATION_CODEC_V1)
+        self.assertEqual(codec_name, JSON_CODEC)
+        self.assertEqual(decode_message(value, self.headers(codec_name)), message)
+
+    def test_message_without_header_is_json(self):
+        message = self.message()
+        self.assertEqual(decode_message(json.dumps(message).encode("utf-8")), message)
+        self.assertEqual(decode_message(json.dumps(message).encode("utf-8"), []), message)
+
+    def test_unknown_codec_is_rejected(self):
+        with self.assertRaises(ValueError):
+            decode_message(b"\x00" * 62, self.headers("location.v9"))
@@ -2,6 +2,11 @@ from rest_framework import status, viewsets
 from rest_framework.decorators import action
 from rest_framework.response import Response
 
+from .consumer_metrics import consumer_metrics
+from .context_cache import delivery_context_cache
+from .eta import eta_service
+from .route_cache import route_cache
+from .route_progress import route_progress
 from .models import Delivery
 from .serializers import DeliverySerializer
 from .services import delivery_service
@@ -95,6 +100,21 @@ class DeliveryViewSet(viewsets.ViewSet):
                 {"detail": str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR
             )
     
+    @action(detail=False, methods=["get"])
+    def consumer_metrics(self, request):
+        """Location consumer workers' throughput and per-partition lag"""
+        try:
+            return Response(consumer_metrics.snapshot(), status=status.HTTP_200_OK)
+        except Exception as e:
+            return Response(
+                {"detail": str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR
+            )
+
+    @action(detail=False, methods=["get"])
+    def route_cache_stats(self, request):
+        """Hit/miss counters and size of this process's route cache"""
+        return Response(route_cache.stats(), status=status.HTTP_200_OK)
+
     @action(detail=True, methods=["get"])
     def state(self, request, pk=None):
         """Get delivery state including simulation progress for restoration"""
@@ -105,6 +125,8 @@ class DeliveryViewSet(viewsets.ViewSet):
                 "status": delivery.status,
                 "simulation_status": delivery.simulation_status,
                 "current_route_index": delivery.current_route_index,
+                # Server-side position along the planned route (None until the first ping)
+                "route_progress": route_progress.get_progress(delivery.id),
                 "last_location": {
                     "lat": float(delivery.last_location_lat) if delivery.last_location_lat else None,
                     "lng": float(delivery.last_location_lng) if delivery.last_location_lng else None,
@@ -216,6 +238,9 @@ class DeliveryViewSet(viewsets.ViewSet):
             
             delivery.status = 'denied'
             delivery.save()
+            delivery_context_cache.invalidate(delivery.id)
+            eta_service.clear(delivery.id)
+            route_progress.clear(delivery.id)
             
             # Increment denial count on order
             from apps.orders.models import Order
@@ -305,7 +330,7 @@ class DeliveryViewSet(viewsets.ViewSet):
                     {"detail": "No pending orders found"}, status=status.HTTP_400_BAD_REQUEST
                 )
             
-            rider, optimized_orders, total_distance = delivery_service.find_best_rider_for_batch(
+            rider, route_stops, total_distance, reservation_token = delivery_service.find_best_rider_for_batch(
                 list(orders)
             )
             
@@ -314,11 +339,15 @@ class DeliveryViewSet(viewsets.ViewSet):
                     {"detail": "No available riders found"}, status=status.HTTP_404_NOT_FOUND
                 )
             
-            # Create deliveries for each order
+            # Create deliveries in pickup order, all for the reserved rider
+            optimized_orders = [order for order, stop in route_stops if stop == "pickup"]
             deliveries = []
-            for order in optimized_orders:
-                delivery = delivery_service.assign_delivery(str(order.id))
-                deliveries.append(delivery)
+            try:
+                for order in optimized_orders:
+                    delivery = delivery_service.assign_delivery(str(order.id), rider_id=str(rider.id))
+                    deliveries.append(delivery)
+            finally:
+                delivery_service.release_rider_reservation(rider.id, reservation_token)
             
             return Response(
                 {
@@ -326,7 +355,16 @@ class DeliveryViewSet(viewsets.ViewSet):
                     "rider_name": rider.name,
                     "total_distance": total_distance,
                     "deliveries": [DeliverySerializer(d).data for d in deliveries],
-                    "optimized_sequence": [str(o.id) for o in optimized_orders]
+                    "optimized_sequence": [str(o.id) for o in optimized_orders],
+                    "route": [
+                        {
+                            "order_id": str(order.id),
+                            "stop": stop,
+                            "lat": float(order.pickup_lat if stop == "pickup" else order.delivery_lat),
+                            "lng": float(order.pickup_lng if stop == "pickup" else order.delivery_lng),
+                        }
+                        for order, stop in route_stops
+                    ]
                 },
                 status=status.HTTP_201_CREATED
             )
@@ -1,5 +1,6 @@
 from django.contrib import admin
 
-from .models import DeliveryEvent
+from .models import DeliveryEvent, OutboxEvent
 
 admin.site.register(DeliveryEvent)
+admin.site.register(OutboxEvent)
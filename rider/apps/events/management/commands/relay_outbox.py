@@ -0,0 +1,92 @@
+"""
+Management command to publish outbox events to Kafka.
+Claims pending rows with SKIP LOCKED, publishes them in producer batches
+and marks them sent; several relays can run at once. Events of one delivery
+are published in order. Failed rows are retried with backoff and parked
+after --max-attempts. Sent rows older than the retention are purged
+periodically.
+SIGTERM/SIGINT stop the relay after the current batch.
+Usage: python manage.py relay_outbox --batch-size 500
+       python manage.py relay_outbox --once
+"""
+import signal
+import time
+
+from django.core.management.base import BaseCommand
+
+from apps.events.outbox import OutboxRelay
+
+
+class Command(BaseCommand):
+    help = 'Publish pending outbox events to Kafka'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=500,
+            help='Events claimed and published per batch (default: 500)',
+        )
+        parser.add_argument(
+            '--poll-interval',
+            type=float,
+            default=0.5,
+            help='Seconds to wait when the outbox is empty (default: 0.5)',
+        )
+        parser.add_argument(
+            '--retention-hours',
+            type=float,
+            default=24,
+            help='Delete sent events older than this (default: 24)',
+        )
+        parser.add_argument(
+            '--max-attempts',
+            type=int,
+            default=10,
+            help='Park an event after this many failed publishes (default: 10)',
+        )
+        parser.add_argument(
+            '--once',
+            action='store_true',
+            help='Drain the outbox once and exit',
+        )
+
+    def handle(self, *args, **options):
+        relay = OutboxRelay(batch_size=options['batch_size'], max_attempts=options['max_attempts'])
+        self.stopping = False
+        signal.signal(signal.SIGTERM, self._shutdown)
+        signal.signal(signal.SIGINT, self._shutdown)
+
+        total_sent = total_failed = 0
+        last_purge = 0.0
+        while not self.stopping:
+            try:
+                result = relay.relay_batch()
+            except Exception as e:
+                self.stderr.write(f'Error relaying outbox events: {e}')
+                result = {'sent': 0, 'failed': 0, 'parked': 0}
+                time.sleep(options['poll_interval'])
+            total_sent += result['sent']
+            total_failed += result['failed']
+
+            if time.monotonic() - last_purge > 3600:
+                purged = relay.purge_sent(options['retention_hours'])
+                if purged:
+                    self.stdout.write(f'Purged {purged} sent outbox events')
+                last_purge = time.monotonic()
+
+            drained = result['sent'] + result['failed'] < options['batch_size']
+            if options['once'] and (drained or result['sent'] == 0):
+                break
+            if drained:
+                time.sleep(options['poll_interval'])
+            elif result['failed']:
+                # Broker trouble, back off instead of spinning on the same rows
+                time.sleep(options['poll_interval'])
+
+        self.stdout.write(
+            self.style.SUCCESS(f'Relayed {total_sent} events ({total_failed} failed attempts)')
+        )
+
+    def _shutdown(self, signum, frame):
+        self.stopping = True
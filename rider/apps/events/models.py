@@ -46,3 +46,43 @@ class DeliveryEvent(TimeStampedUUIDModel):
 
     def __str__(self):
         return f"{self.event_type} - {self.delivery.id}"
+
+
+class OutboxEvent(TimeStampedUUIDModel):
+    """
+    Event waiting to be published to Kafka. Written in the same transaction
+    as the change it describes and published by the relay_outbox worker.
+    Failed publishes are retried with backoff (next_attempt_at) and parked
+    after too many attempts.
+    """
+
+    topic = models.CharField(max_length=255)
+    key = models.CharField(max_length=255, null=True, blank=True)
+    payload = models.JSONField()
+    sent_at = models.DateTimeField(null=True, blank=True)
+    attempts = models.PositiveIntegerField(default=0)
+    last_error = models.TextField(null=True, blank=True)
+    next_attempt_at = models.DateTimeField(null=True, blank=True)
+    parked_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        db_table = "event_outbox"
+        indexes = [
+            # Only unsent rows are scanned by the relay
+            models.Index(
+                fields=["created_at"],
+                name="event_outbox_pending_idx",
+                condition=models.Q(sent_at__isnull=True, parked_at__isnull=True),
+            ),
+            # Older pending rows of the same key hold back newer ones
+            models.Index(
+                fields=["key", "created_at"],
+                name="event_outbox_pending_key_idx",
+                condition=models.Q(sent_at__isnull=True, parked_at__isnull=True),
+            ),
+            models.Index(fields=["sent_at"]),
+        ]
+        ordering = ["created_at"]
+
+    def __str__(self):
+        return f"{self.topic} - {self.id}"
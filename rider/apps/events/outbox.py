@@ -0,0 +1,128 @@
+"""
+Relay from the event outbox table to Kafka.
+
+Each round claims a batch of unsent rows with SELECT ... FOR UPDATE SKIP
+LOCKED (so several relays can run side by side without publishing the same
+row twice), hands the whole batch to the producer, flushes once and marks
+the delivered rows sent in the same transaction. A relay that dies
+mid-batch releases its locks and the rows are picked up again
+(at-least-once, consumers de-duplicate on event_id).
+
+Rows that were not acknowledged are retried with exponential backoff and
+parked after `max_attempts`, so a permanently failing row cannot hold the
+head of the outbox. Per key (delivery id) events are published in creation
+order: only the oldest pending row of a key is claimed, even while it waits
+for a retry or sits in another relay's batch. A parked row no longer holds
+its key back, so ordering is not guaranteed across a parked event.
+"""
+import time
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from datetime import timedelta
+
+from django.db import transaction
+from django.db.models import Exists, F, OuterRef, Q
+from django.utils import timezone
+from infrastructure.kafka_client import kafka_client
+
+from .models import OutboxEvent
+from .services import mark_event_processed
+
+
+class OutboxRelay:
+    def __init__(
+        self,
+        batch_size: int = 500,
+        flush_timeout: float = 10.0,
+        max_attempts: int = 10,
+        backoff_seconds: float = 1.0,
+        max_backoff_seconds: float = 300.0,
+    ):
+        self.batch_size = batch_size
+        self.flush_timeout = flush_timeout
+        self.max_attempts = max_attempts
+        self.backoff_seconds = backoff_seconds
+        self.max_backoff_seconds = max_backoff_seconds
+
+    @staticmethod
+    def pending():
+        return OutboxEvent.objects.filter(sent_at__isnull=True, parked_at__isnull=True)
+
+    def claimable(self, now):
+        """Pending rows that are due and have no older pending row with the same key"""
+        older_pending = self.pending().filter(key=OuterRef("key"), created_at__lt=OuterRef("created_at"))
+        return (
+            self.pending()
+            .filter(Q(next_attempt_at__isnull=True) | Q(next_attempt_at__lte=now))
+            .exclude(Exists(older_pending))
+            .order_by("created_at")
+        )
+
+    def relay_batch(self) -> dict:
+        """Publish one batch of pending events. Returns sent/failed/parked counts."""
+        with transaction.atomic():
+            rows = list(
+                self.claimable(timezone.now()).select_for_update(skip_locked=True)[:self.batch_size]
+            )
+            if not rows:
+                return {"sent": 0, "failed": 0, "parked": 0}
+
+            futures = [
+                kafka_client.publish_async(row.topic, row.payload, key=row.key, dead_letter=False)
+                for row in rows
+            ]
+            deadline = time.monotonic() + self.flush_timeout
+            kafka_client.flush(timeout=self.flush_timeout)
+
+            # Delivery reports may still be served by the producer's poll
+            # thread after flush returns: wait for each against one deadline
+            sent, failed = [], []
+            for row, future in zip(rows, futures):
+                try:
+                    delivered = future.result(timeout=max(deadline - time.monotonic(), 0))
+                except FutureTimeoutError:
+                    delivered = False
+                if delivered:
+                    sent.append(row.id)
+                else:
+                    failed.append(row)
+
+            now = timezone.now()
+            OutboxEvent.objects.filter(id__in=sent).update(
+                sent_at=now, attempts=F("attempts") + 1, last_error=None
+            )
+            parked = 0
+            for row in failed:
+                row.attempts += 1
+                row.last_error = "Not acknowledged by Kafka"
+                row.updated_at = now
+                if row.attempts >= self.max_attempts:
+                    row.parked_at = now
+                    parked += 1
+                else:
+                    delay = min(self.backoff_seconds * 2 ** (row.attempts - 1), self.max_backoff_seconds)
+                    row.next_attempt_at = now + timedelta(seconds=delay)
+            if failed:
+                OutboxEvent.objects.bulk_update(
+                    failed, ["attempts", "last_error", "next_attempt_at", "parked_at", "updated_at"]
+                )
+
+        sent_ids = set(sent)
+        for row in rows:
+            if row.id in sent_ids and row.payload.get("event_id"):
+                try:
+                    mark_event_processed(row.payload["event_id"])
+                except Exception as e:
+                    print(f"Error marking event {row.payload['event_id']} processed: {e}")
+        if parked:
+            print(f"Parked {parked} outbox events after {self.max_attempts} attempts")
+        return {"sent": len(sent), "failed": len(failed), "parked": parked}
+
+    @staticmethod
+    def purge_sent(retention_hours: float) -> int:
+        """Delete events published more than `retention_hours` ago"""
+        cutoff = timezone.now() - timedelta(hours=retention_hours)
+        deleted, _ = OutboxEvent.objects.filter(sent_at__lt=cutoff).delete()
+        return deleted
+
+
+outbox_relay = OutboxRelay()
@@ -2,11 +2,10 @@ import json
 
 from django.db import transaction
 from infrastructure.cache import redis_client
-from infrastructure.kafka_client import kafka_client
 
 from apps.deliveries.constants import KAFKA_TOPICS
 
-from .models import DeliveryEvent
+from .models import DeliveryEvent, OutboxEvent
 
 
 # Event Idempotency
@@ -33,6 +32,15 @@ class EventService:
         event_data=None,
         location=None,
     ):
+        """
+        Record a delivery event. The Kafka message is written to the outbox
+        in the same transaction (the caller's, when there is one) and
+        published by the relay_outbox worker, so a rolled back change never
+        publishes and the request never waits for the broker. Inside a
+        caller's transaction errors propagate, so the change rolls back
+        rather than commit without its event.
+        """
+        in_caller_transaction = transaction.get_connection().in_atomic_block
         try:
             with transaction.atomic():
                 event = DeliveryEvent.objects.create(
@@ -42,11 +50,11 @@ class EventService:
                     event_type=event_type,
                     event_data=event_data or {},
                     location_lat=location.get("lat") if location else None,
-                    location_lng=location.get("lng") if location else None,
+                    location_long=location.get("lng") if location else None,
                 )
 
                 kafka_msg = {
-                    "event_id": event.id,
+                    "event_id": str(event.id),
                     "event_type": event_type,
                     "timestamp": event.timestamp.isoformat(),
                     "delivery_id": str(delivery_id),
@@ -56,12 +64,19 @@ class EventService:
                     "location": location,
                 }
 
-                topic = KAFKA_TOPICS.get("DELIVERY_STATUS_CHANGED")
-                kafka_client.publish(topic=topic, event_data=kafka_msg)
-                mark_event_processed(str(event.id))
+                OutboxEvent.objects.create(
+                    topic=KAFKA_TOPICS.get("DELIVERY_STATUS_CHANGED"),
+                    # Orders without a delivery are keyed by order; events
+                    # with neither are not ordered against anything
+                    key=str(delivery_id or order_id) if (delivery_id or order_id) else None,
+                    payload=kafka_msg,
+                )
                 return event
 
         except Exception as e:
+            print(f"Error creating {event_type} event: {e}")
+            if in_caller_transaction:
+                raise
             return None
 
     @staticmethod
@@ -1,3 +1,162 @@
+import uuid
+from concurrent.futures import Future
+from datetime import timedelta
+from unittest import mock
+
+from django.db import transaction
 from django.test import TestCase
+from django.utils import timezone
+from infrastructure.kafka_client import kafka_client
+
+from apps.deliveries.models import Delivery
+from apps.events.models import DeliveryEvent, OutboxEvent
+from apps.events.outbox import OutboxRelay
+from apps.events.services import event_service
+from apps.orders.models import Order
+from apps.riders.models import Rider
+
+
+def resolved(delivered):
+    future = Future()
+    future.set_result(delivered)
+    return future
+
+
+class OutboxRelayTests(TestCase):
+    def setUp(self):
+        patches = [
+            mock.patch.object(kafka_client, "flush"),
+            mock.patch("apps.events.outbox.mark_event_processed"),
+        ]
+        for patch in patches:
+            patch.start()
+            self.addCleanup(patch.stop)
+        self.relay = OutboxRelay(batch_size=10, flush_timeout=0.05, max_attempts=3, backoff_seconds=1.0)
+
+    @staticmethod
+    def event(key, n, **fields):
+        return OutboxEvent.objects.create(topic="t", key=key, payload={"n": n}, **fields)
+
+    def relay_with(self, delivered=True):
+        published = []
+
+        def publish_async(topic, payload, key=None, dead_letter=True):
+            published.append(payload["n"])
+            return delivered if isinstance(delivered, Future) else resolved(delivered)
+
+        with mock.patch.object(kafka_client, "publish_async", side_effect=publish_async):
+            result = self.relay.relay_batch()
+        return result, published
+
+    def claimable(self):
+        return [row.payload["n"] for row in self.relay.claimable(timezone.now())]
+
+    def test_only_oldest_pending_row_per_key_is_claimable(self):
+        first = self.event("k1", 1)
+        self.event("k1", 2)
+        self.event("k2", 3)
+        self.event(None, 4)
+        self.event(None, 5)
+        self.assertEqual(self.claimable(), [1, 3, 4, 5])
+
+        # Waiting for a retry still holds the key back
+        first.next_attempt_at = timezone.now() + timedelta(minutes=1)
+        first.save()
+        self.assertEqual(self.claimable(), [3, 4, 5])
+
+        # A parked row no longer does
+        first.parked_at = timezone.now()
+        first.save()
+        self.assertEqual(self.claimable(), [2, 3, 4, 5])
+
+    def test_events_of_a_key_are_published_in_order(self):
+        for n in range(3):
+            self.event("k1", n)
+        rounds = [self.relay_with(True)[1] for _ in range(4)]
+        self.assertEqual(rounds, [[0], [1], [2], []])
+
+    def test_sent_at_only_set_on_acknowledgement(self):
+        acked = self.event("k1", 1)
+        result, _ = self.relay_with(True)
+        self.assertEqual(result, {"sent": 1, "failed": 0, "parked": 0})
+        acked.refresh_from_db()
+        self.assertIsNotNone(acked.sent_at)
+
+        pending = self.event("k2", 2)
+        result, _ = self.relay_with(Future())  # never resolved before the deadline
+        self.assertEqual(result["failed"], 1)
+        pending.refresh_from_db()
+        self.assertIsNone(pending.sent_at)
+        self.assertEqual(pending.attempts, 1)
+
+    def test_failed_rows_back_off_then_park(self):
+        row = self.event("k1", 1)
+        self.event("k1", 2)
+        delays = []
+        for attempt in range(1, 4):
+            before = timezone.now()
+            result, published = self.relay_with(False)
+            self.assertEqual(published, [1])
+            row.refresh_from_db()
+            self.assertEqual(row.attempts, attempt)
+            if attempt < 3:
+                self.assertIsNone(row.parked_at)
+                delays.append(round((row.next_attempt_at - before).total_seconds()))
+                self.assertEqual(self.claimable(), [])
+                # Make the retry due
+                row.next_attempt_at = timezone.now() - timedelta(seconds=1)
+                row.save()
+        self.assertEqual(delays, [1, 2])
+        self.assertEqual(result["parked"], 1)
+        self.assertIsNotNone(row.parked_at)
+        # The parked row releases the next event of its key
+        self.assertEqual(self.claimable(), [2])
+
+
+class CreateEventTests(TestCase):
+    def setUp(self):
+        self.rider = Rider.objects.create(name="r", phone="9000000001", vehicle_type="bike")
+        self.order = Order.objects.create(
+            order_number="T1",
+            customer_id=uuid.uuid4(),
+            customer_name="c",
+            customer_phone="1",
+            pickup_address="a",
+            pickup_lat=28.61,
+            pickup_lng=77.21,
+            delivery_address="b",
+            delivery_lat=28.63,
+            delivery_lng=77.23,
+        )
+        self.delivery = Delivery.objects.create(order=self.order, rider=self.rider, status="in_progress")
+
+    def create_event(self, delivery_id=None, order_id=None):
+        return event_service.create_event(
+            delivery_id=delivery_id or self.delivery.id,
+            order_id=order_id or self.order.id,
+            rider_id=self.rider.id,
+            event_type="delivered",
+        )
+
+    def test_event_is_written_to_the_outbox_keyed_by_delivery(self):
+        event = self.create_event()
+        row = OutboxEvent.objects.get()
+        self.assertEqual(row.key, str(self.delivery.id))
+        self.assertEqual(row.payload["event_id"], str(event.id))
+
+    def test_failure_rolls_back_the_callers_transaction(self):
+        with mock.patch.object(OutboxEvent.objects, "create", side_effect=RuntimeError("outbox down")):
+            with self.assertRaises(RuntimeError):
+                with transaction.atomic():
+                    Delivery.objects.filter(id=self.delivery.id).update(status="completed")
+                    self.create_event()
+        self.delivery.refresh_from_db()
+        self.assertEqual(self.delivery.status, "in_progress")
+        self.assertFalse(DeliveryEvent.objects.exists())
 
-# Create your tests here.
+    def test_failure_outside_a_transaction_is_logged(self):
+        with mock.patch.object(OutboxEvent.objects, "create", side_effect=RuntimeError("outbox down")):
+            # TestCase wraps each test in a transaction, leave it for this call
+            with mock.patch("apps.events.services.transaction.get_connection") as get_connection:
+                get_connection.return_value.in_atomic_block = False
+                self.assertIsNone(self.create_event())
@@ -1,6 +1,23 @@
 from django.apps import AppConfig
+from django.conf import settings
 
 
 class OrdersConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'apps.orders'
+
+    def ready(self):
+        """
+        Start the order timer scheduler (resumes timers persisted in Redis)
+        when ORDER_SCHEDULER_AUTOSTART is set. Management commands other than
+        runserver never start it.
+        """
+        from apps.deliveries.apps import _is_management_command
+
+        if not settings.ORDER_SCHEDULER_AUTOSTART or _is_management_command():
+            return
+        try:
+            from apps.orders.scheduler import order_scheduler
+            order_scheduler.start()
+        except Exception as e:
+            print(f"Failed to start order scheduler: {e}")
@@ -57,6 +57,20 @@ class OrderConsumer(AsyncWebsocketConsumer):
             "data": event["data"]
         }))
 
+    async def eta_update(self, event):
+        """Send updated estimated delivery time"""
+        await self.send(text_data=json.dumps({
+            "type": "eta_update",
+            "data": event["data"]
+        }))
+
+    async def rider_nearby(self, event):
+        """Notify that the rider is close to the drop"""
+        await self.send(text_data=json.dumps({
+            "type": "rider_nearby",
+            "data": event["data"]
+        }))
+
     @database_sync_to_async
     def order_exists(self, order_id):
         try:
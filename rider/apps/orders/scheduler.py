@@ -0,0 +1,155 @@
+"""
+Central scheduler for order preparation timers.
+
+Timers are persisted in a Redis sorted set (member = order id, score = due
+unix time) so they survive restarts and are shared by every process. An
+in-memory heap only decides when this process wakes up next. A due timer
+is claimed by atomically moving its score to now + lease, so exactly one
+process runs it; the member is only removed once the handler succeeded.
+If the process dies or the handler fails, the lease expires and the timer
+is picked up again. The work runs in a bounded thread pool: one scheduler
+thread plus `max_workers` workers, however many orders are pending.
+"""
+import heapq
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Optional
+
+from django.conf import settings
+from django.db import close_old_connections
+from infrastructure.cache import redis_client
+
+
+class OrderScheduler:
+    # Claim a due timer: move its score to the lease expiry if it is still due
+    CLAIM_SCRIPT = """
+    local score = redis.call('ZSCORE', KEYS[1], ARGV[1])
+    if score and tonumber(score) <= tonumber(ARGV[2]) then
+        redis.call('ZADD', KEYS[1], 'XX', ARGV[3], ARGV[1])
+        return 1
+    end
+    return 0
+    """
+    # Remove a finished timer unless it was rescheduled or re-claimed meanwhile
+    COMPLETE_SCRIPT = """
+    local score = redis.call('ZSCORE', KEYS[1], ARGV[1])
+    if score and tonumber(score) == tonumber(ARGV[2]) then
+        return redis.call('ZREM', KEYS[1], ARGV[1])
+    end
+    return 0
+    """
+
+    def __init__(
+        self,
+        key: str,
+        handler: Callable[[str], None],
+        max_workers: int,
+        poll_interval: float,
+        lease_seconds: float,
+        claim_batch: int = 100,
+    ):
+        self.key = key
+        self.handler = handler
+        self.max_workers = max_workers
+        self.poll_interval = poll_interval
+        self.lease_seconds = lease_seconds
+        self.claim_batch = claim_batch
+        self._heap = []
+        self._condition = threading.Condition()
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._thread: Optional[threading.Thread] = None
+        self._running = False
+
+    def schedule(self, order_id: str, delay_seconds: float):
+        """Run the handler for `order_id` after `delay_seconds`"""
+        due_at = time.time() + delay_seconds
+        redis_client.zadd(self.key, {str(order_id): due_at})
+        with self._condition:
+            heapq.heappush(self._heap, due_at)
+            self._condition.notify()
+
+    def cancel(self, order_id: str) -> bool:
+        return bool(redis_client.zrem(self.key, str(order_id)))
+
+    def pending(self) -> int:
+        return redis_client.zcard(self.key)
+
+    def start(self):
+        if self._running:
+            return
+        # Counted before starting so a Redis error is not reported as a failed start
+        pending = self.pending()
+        self._running = True
+        self._executor = ThreadPoolExecutor(
+            max_workers=self.max_workers, thread_name_prefix="order-scheduler"
+        )
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+        print(f"Order scheduler started with {pending} pending timers")
+
+    def stop(self):
+        self._running = False
+        with self._condition:
+            self._condition.notify()
+        if self._thread:
+            self._thread.join(timeout=5)
+        if self._executor:
+            self._executor.shutdown(wait=True)
+
+    def _run(self):
+        while self._running:
+            with self._condition:
+                # Sleep until the next local timer, but poll Redis at least
+                # every poll_interval for timers other processes scheduled
+                timeout = self.poll_interval
+                if self._heap:
+                    timeout = max(0.0, min(timeout, self._heap[0] - time.time()))
+                self._condition.wait(timeout=timeout)
+                now = time.time()
+                while self._heap and self._heap[0] <= now:
+                    heapq.heappop(self._heap)
+            try:
+                self._dispatch_due(now)
+            except Exception as e:
+                print(f"Error dispatching order timers: {e}")
+
+    def _dispatch_due(self, now: float):
+        due = redis_client.zrangebyscore(
+            self.key, "-inf", now, start=0, num=self.claim_batch
+        )
+        lease_until = repr(now + self.lease_seconds)
+        for order_id in due:
+            # Only the process whose claim moves the score runs the timer
+            if redis_client.eval(self.CLAIM_SCRIPT, 1, self.key, order_id, now, lease_until):
+                self._executor.submit(self._execute, order_id, lease_until)
+
+    def _execute(self, order_id: str, lease_until: str):
+        try:
+            close_old_connections()
+            self.handler(order_id)
+        except Exception as e:
+            # Left in the set: retried once the lease expires
+            print(f"Error running order timer for {order_id}: {e}")
+            return
+        finally:
+            close_old_connections()
+        try:
+            redis_client.eval(self.COMPLETE_SCRIPT, 1, self.key, order_id, lease_until)
+        except Exception as e:
+            print(f"Error completing order timer for {order_id}: {e}")
+
+
+def _mark_order_ready(order_id: str):
+    from .services import OrderService
+
+    OrderService.mark_order_ready(order_id)
+
+
+order_scheduler = OrderScheduler(
+    key="order:ready_timers",
+    handler=_mark_order_ready,
+    max_workers=settings.ORDER_SCHEDULER_WORKERS,
+    poll_interval=settings.ORDER_SCHEDULER_POLL_INTERVAL,
+    lease_seconds=settings.ORDER_SCHEDULER_LEASE_SECONDS,
+)
@@ -1,4 +1,5 @@
 import json
+import random
 
 from django.db import transaction
 
@@ -8,6 +9,7 @@ from apps.events.services import event_service
 from apps.riders.services import rider_service
 
 from .models import Order
+from .scheduler import order_scheduler
 
 
 class OrderService:
@@ -20,40 +22,42 @@ class OrderService:
                 order = Order.objects.create(**order_data)
                 
                 # Simulate order preparation time (30-60 seconds)
-                import threading
-                import time
-                import random
-                from django.utils import timezone
-                
-                def mark_ready():
-                    prep_time = random.randint(30, 60)
-                    time.sleep(prep_time)
-                    try:
-                        order.refresh_from_db()
-                        if order.status == 'preparing':
-                            order.status = 'ready'
-                            order.save()
-                            # Auto-assign rider when order is ready
-                            from apps.deliveries.models import Delivery
-                            if not Delivery.objects.filter(order=order).exclude(status__in=['failed', 'completed']).exists():
-                                from apps.deliveries.services import delivery_service
-                                try:
-                                    delivery_service.assign_delivery(str(order.id))
-                                except Exception as e:
-                                    print(f"Auto-assignment failed: {e}")
-                                    # Order will be retried by the retry_unassigned_orders command
-                    except Exception as e:
-                        print(f"Error in mark_ready: {e}")
-                
-                # Start preparation timer in background
-                prep_thread = threading.Thread(target=mark_ready, daemon=True)
-                prep_thread.start()
+                prep_time = random.randint(30, 60)
+                transaction.on_commit(
+                    lambda: order_scheduler.schedule(str(order.id), prep_time)
+                )
                 
                 return order
         except Exception as e:
             print(f"Error creating order: {e}")
             return None
 
+    @staticmethod
+    def mark_order_ready(order_id):
+        """
+        Preparation timer fired: move the order to 'ready' and auto-assign a
+        rider. Orders that moved on in the meantime are left alone. Other
+        errors propagate so the scheduler retries the timer.
+        """
+        try:
+            with transaction.atomic():
+                order = Order.objects.select_for_update().get(id=order_id)
+                if order.status != 'preparing':
+                    return
+                order.status = 'ready'
+                order.save()
+
+            # Auto-assign rider when order is ready
+            if not Delivery.objects.filter(order=order).exclude(status__in=['failed', 'completed']).exists():
+                from apps.deliveries.services import delivery_service
+                try:
+                    delivery_service.assign_delivery(str(order.id))
+                except Exception as e:
+                    print(f"Auto-assignment failed: {e}")
+                    # Order will be retried by the retry_unassigned_orders command
+        except Order.DoesNotExist:
+            print(f"Order {order_id} no longer exists, dropping its ready timer")
+
     @staticmethod
     def update_order_status(
         self, order_id, new_status, rider_id=None, delivery_id=None
@@ -1,3 +1,72 @@
-from django.test import TestCase
+from unittest import mock
 
-# Create your tests here.
+import fakeredis
+from django.test import SimpleTestCase
+
+from .scheduler import OrderScheduler
+
+
+class OrderSchedulerLeaseTests(SimpleTestCase):
+    key = "test:ready_timers"
+
+    def setUp(self):
+        self.redis = fakeredis.FakeRedis(decode_responses=True)
+        patch = mock.patch("apps.orders.scheduler.redis_client", self.redis)
+        patch.start()
+        self.addCleanup(patch.stop)
+        self.handled = []
+        self.scheduler = OrderScheduler(
+            key=self.key, handler=self.handled.append, max_workers=1, poll_interval=1, lease_seconds=30
+        )
+        # Record submissions instead of running them on a pool
+        self.submitted = []
+        self.scheduler._executor = mock.Mock(submit=lambda fn, *args: self.submitted.append(args))
+
+    def dispatch(self, now):
+        self.submitted.clear()
+        self.scheduler._dispatch_due(now)
+        return [order_id for order_id, _ in self.submitted]
+
+    def test_claimed_timer_is_invisible_until_its_lease_expires(self):
+        self.redis.zadd(self.key, {"o1": 100.0, "o2": 200.0})
+
+        self.assertEqual(self.dispatch(150.0), ["o1"])
+        self.assertEqual(self.redis.zscore(self.key, "o1"), 180.0)
+        # Still leased: neither this nor another process claims it again
+        self.assertEqual(self.dispatch(179.0), [])
+        # The handler never completed it, so it is retried after the lease
+        self.assertEqual(self.dispatch(181.0), ["o1"])
+
+    def test_claim_only_moves_a_due_timer(self):
+        self.redis.zadd(self.key, {"o1": 100.0})
+        self.assertEqual(self.redis.eval(OrderScheduler.CLAIM_SCRIPT, 1, self.key, "o1", 99.0, 129.0), 0)
+        self.assertEqual(self.redis.eval(OrderScheduler.CLAIM_SCRIPT, 1, self.key, "missing", 150.0, 180.0), 0)
+        self.assertIsNone(self.redis.zscore(self.key, "missing"))
+        self.assertEqual(self.redis.zscore(self.key, "o1"), 100.0)
+
+    def test_complete_removes_the_timer(self):
+        self.redis.zadd(self.key, {"o1": 100.0})
+        self.dispatch(150.0)
+        ((order_id, lease_until),) = self.submitted
+
+        self.scheduler._execute(order_id, lease_until)
+        self.assertEqual(self.handled, ["o1"])
+        self.assertEqual(self.scheduler.pending(), 0)
+
+    def test_complete_keeps_a_rescheduled_timer(self):
+        self.redis.zadd(self.key, {"o1": 100.0})
+        self.dispatch(150.0)
+        ((order_id, lease_until),) = self.submitted
+        self.redis.zadd(self.key, {"o1": 500.0})
+
+        self.scheduler._execute(order_id, lease_until)
+        self.assertEqual(self.redis.zscore(self.key, "o1"), 500.0)
+
+    def test_failed_handler_leaves_the_timer_leased(self):
+        self.scheduler.handler = mock.Mock(side_effect=RuntimeError("db down"))
+        self.redis.zadd(self.key, {"o1": 100.0})
+        self.dispatch(150.0)
+        ((order_id, lease_until),) = self.submitted
+
+        self.scheduler._execute(order_id, lease_until)
+        self.assertEqual(self.redis.zscore(self.key, "o1"), 180.0)
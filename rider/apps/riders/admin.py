@@ -1,6 +1,14 @@
 from django.contrib import admin
 
-from .models import Rider, RiderLocation
+from .models import Rider, RiderCurrentLocation, RiderLocation, RiderLocationRollup
 
 admin.site.register(Rider)
 admin.site.register(RiderLocation)
+admin.site.register(RiderLocationRollup)
+
+
+@admin.register(RiderCurrentLocation)
+class RiderCurrentLocationAdmin(admin.ModelAdmin):
+    list_display = ("rider", "lat", "lng", "speed", "battery_level", "timestamp")
+    list_select_related = ("rider",)
+    ordering = ("-timestamp",)
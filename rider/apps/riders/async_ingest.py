@@ -0,0 +1,98 @@
+"""
+Async-native location ingest for rider WebSocket pings.
+
+Mirrors RiderService.update_rider_location without blocking the ASGI event
+loop: Redis through redis.asyncio, the Kafka produce is only handed to the
+producer queue, channel layer sends are awaited natively and the database
+row goes to the background batch writer.
+"""
+import asyncio
+import json
+from typing import Any, Dict, Optional
+
+from channels.layers import get_channel_layer
+from django.conf import settings
+from infrastructure.cache import async_redis_client
+from infrastructure.kafka_client import kafka_client
+
+from apps.deliveries.constants import KAFKA_TOPICS
+from apps.deliveries.context_cache import delivery_context_cache
+
+from .location_writer import location_writer
+from .models import RiderLocation
+from .services import rider_service
+
+
+class AsyncLocationIngestService:
+    async def set_rider_location(
+        self, rider_id: str, location_data: Dict[str, Any], ttl: Optional[int] = None
+    ):
+        """Async twin of RiderService.set_rider_location (cache + geo index)"""
+        async with async_redis_client.pipeline(transaction=False) as pipe:
+            pipe.setex(
+                f"rider:location:{rider_id}",
+                ttl or settings.RIDER_LOCATION_TTL_SECONDS,
+                json.dumps(location_data),
+            )
+            pipe.hget("rider:available", rider_id)
+            _, vehicle_type = await pipe.execute()
+        if vehicle_type:
+            await async_redis_client.geoadd(
+                f"rider:geo:available:{vehicle_type}",
+                [float(location_data["lng"]), float(location_data["lat"]), rider_id],
+            )
+
+    async def update_rider_location(
+        self, rider_id, location_data, delivery_id=None
+    ) -> RiderLocation:
+        rider_id = str(rider_id)
+        location = rider_service.build_location_row(rider_id, location_data, delivery_id)
+        location_writer.add(location)
+
+        payload = rider_service.build_location_payload(location_data)
+        await self.set_rider_location(rider_id, payload)
+
+        topic = KAFKA_TOPICS.get("RIDER_LOCATION_UPDATE")
+        if topic:
+            # Never wait for the broker here, whatever the producer mode; nor
+            # poll a full queue or write the DLQ row on the event loop
+            kafka_client.publish_async(
+                topic,
+                rider_service.build_location_message(rider_id, delivery_id, payload),
+                key=rider_id,
+                codec=settings.KAFKA_LOCATION_CODEC,
+                block=False,
+            )
+
+        channel_layer = get_channel_layer()
+        if delivery_id and channel_layer:
+            sends = [
+                channel_layer.group_send(
+                    f"rider_{rider_id}",
+                    {
+                        "type": "location_update",
+                        "data": {"location": payload, "delivery_id": str(delivery_id)},
+                    },
+                )
+            ]
+            context = await delivery_context_cache.aget(delivery_id)
+            if context:
+                sends.append(
+                    channel_layer.group_send(
+                        f"order_{context['order_id']}",
+                        {
+                            "type": "location_update",
+                            "data": {
+                                "rider_id": rider_id,
+                                "location": payload,
+                                "delivery_id": str(delivery_id),
+                            },
+                        },
+                    )
+                )
+            await asyncio.gather(*sends)
+
+        return location
+
+
+async_location_ingest = AsyncLocationIngestService()
@@ -1,6 +1,7 @@
 import json
 from channels.generic.websocket import AsyncWebsocketConsumer
 from channels.db import database_sync_to_async
+from apps.riders.async_ingest import async_location_ingest
 from apps.riders.models import Rider
 from apps.riders.services import rider_service
 
@@ -38,16 +39,20 @@ class RiderConsumer(AsyncWebsocketConsumer):
             if message_type == "ping":
                 await self.send(text_data=json.dumps({"type": "pong"}))
             elif message_type == "location_update":
-                # Rider device sending location update via WebSocket
+                # Rider device sending location update via WebSocket,
+                # ingested without blocking the event loop
                 location_data = data.get("data", {})
                 if location_data:
-                    from apps.riders.services import rider_service
                     delivery_id = location_data.get("delivery_id")
-                    rider_service.update_rider_location(
-                        rider_id=self.rider_id,
-                        location_data=location_data,
-                        delivery_id=delivery_id
-                    )
+                    try:
+                        await async_location_ingest.update_rider_location(
+                            rider_id=self.rider_id,
+                            location_data=location_data,
+                            delivery_id=delivery_id
+                        )
+                    except Exception as e:
+                        # A bad ping or a Redis error must not close the rider's socket
+                        print(f"Error updating rider location: {e}")
         except json.JSONDecodeError:
             pass
 
@@ -0,0 +1,180 @@
+"""
+Buffered bulk writer for RiderLocation rows.
+Location pings are collected in memory and persisted with bulk_create once the
+buffer reaches the batch size or the flush interval elapses, whichever is first.
+Each flush also upserts the newest ping per rider into rider_current_location.
+"""
+import atexit
+import threading
+import time
+from collections import deque
+from typing import Any, Dict, List
+
+from django.conf import settings
+from django.db import close_old_connections, connection, transaction
+
+from .models import RiderLocation
+
+
+CURRENT_LOCATION_COLUMNS = (
+    "rider_id", "delivery_id", "lat", "lng", "accuracy",
+    "speed", "heading", "battery_level", "timestamp",
+)
+
+
+def upsert_current_locations(locations: List[RiderLocation]):
+    """
+    INSERT ... ON CONFLICT the newest of `locations` per rider into
+    rider_current_location. Older pings never overwrite a newer snapshot,
+    whatever order flushes commit in.
+    """
+    newest = {}
+    for location in locations:
+        current = newest.get(location.rider_id)
+        if current is None or location.timestamp > current.timestamp:
+            newest[location.rider_id] = location
+    if not newest:
+        return
+
+    columns = ", ".join(f'"{column}"' for column in CURRENT_LOCATION_COLUMNS)
+    placeholders = ", ".join(
+        [f"({', '.join(['%s'] * len(CURRENT_LOCATION_COLUMNS))}, NOW())"] * len(newest)
+    )
+    updates = ", ".join(
+        f'"{column}" = EXCLUDED."{column}"' for column in CURRENT_LOCATION_COLUMNS[1:]
+    )
+    # Fixed row order keeps concurrent flushes from deadlocking on each other
+    rows = sorted(newest.values(), key=lambda location: str(location.rider_id))
+    params = [
+        getattr(location, column) for location in rows for column in CURRENT_LOCATION_COLUMNS
+    ]
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"""
+            INSERT INTO rider_current_location ({columns}, updated_at)
+            VALUES {placeholders}
+            ON CONFLICT (rider_id) DO UPDATE SET {updates}, updated_at = NOW()
+            WHERE rider_current_location."timestamp" <= EXCLUDED."timestamp"
+            """,
+            params,
+        )
+
+
+class LocationBatchWriter:
+    def __init__(self, batch_size: int, flush_interval: float, max_buffer: int):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_buffer = max_buffer
+        self._buffer = deque()
+        self._buffer_lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._running = False
+        self._thread = None
+        self._stats = {
+            "flushes": 0,
+            "rows_written": 0,
+            "rows_failed": 0,
+            "rows_dropped": 0,
+            "last_batch_size": 0,
+            "last_flush_ms": 0.0,
+            "max_flush_ms": 0.0,
+        }
+
+    def add(self, location: RiderLocation):
+        """Queue an unsaved RiderLocation for the next flush"""
+        self._ensure_started()
+        with self._buffer_lock:
+            if len(self._buffer) >= self.max_buffer:
+                # Bound memory: shed the oldest ping, the newest position matters most
+                self._buffer.popleft()
+                self._stats["rows_dropped"] += 1
+            self._buffer.append(location)
+            buffered = len(self._buffer)
+
+        if buffered >= self.batch_size:
+            self._wakeup.set()
+
+    def flush(self):
+        """Write everything currently buffered, one bulk_create per batch"""
+        with self._flush_lock:
+            while True:
+                with self._buffer_lock:
+                    count = min(len(self._buffer), self.batch_size)
+                    batch = [self._buffer.popleft() for _ in range(count)]
+                if not batch:
+                    return
+                self._write_batch(batch)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._buffer_lock:
+            return {**self._stats, "buffered": len(self._buffer)}
+
+    def close(self):
+        """Stop the flush thread and persist whatever is still buffered"""
+        self._running = False
+        self._wakeup.set()
+        if self._thread:
+            self._thread.join(timeout=self.flush_interval + 5)
+        self.flush()
+
+    def _write_batch(self, batch: List[RiderLocation]):
+        started = time.monotonic()
+        written = len(batch)
+        try:
+            with transaction.atomic():
+                RiderLocation.objects.bulk_create(batch)
+                upsert_current_locations(batch)
+        except Exception as e:
+            print(f"Bulk location write failed ({len(batch)} rows), retrying row by row: {e}")
+            written = self._write_individually(batch)
+
+        flush_ms = (time.monotonic() - started) * 1000
+        with self._buffer_lock:
+            self._stats["flushes"] += 1
+            self._stats["rows_written"] += written
+            self._stats["rows_failed"] += len(batch) - written
+            self._stats["last_batch_size"] = len(batch)
+            self._stats["last_flush_ms"] = flush_ms
+            self._stats["max_flush_ms"] = max(self._stats["max_flush_ms"], flush_ms)
+
+    def _write_individually(self, batch: List[RiderLocation]) -> int:
+        """Isolate rows that break the batch (e.g. a delivery that no longer exists)"""
+        written = 0
+        for location in batch:
+            try:
+                with transaction.atomic():
+                    RiderLocation.objects.bulk_create([location])
+                    upsert_current_locations([location])
+                written += 1
+            except Exception as e:
+                print(f"Dropping location for rider {location.rider_id}: {e}")
+        return written
+
+    def _ensure_started(self):
+        if self._running:
+            return
+        with self._flush_lock:
+            if self._running:
+                return
+            self._running = True
+            self._thread = threading.Thread(target=self._flush_loop, daemon=True)
+            self._thread.start()
+
+    def _flush_loop(self):
+        while self._running:
+            self._wakeup.wait(timeout=self.flush_interval)
+            self._wakeup.clear()
+            try:
+                close_old_connections()
+                self.flush()
+            except Exception as e:
+                print(f"Error flushing rider locations: {e}")
+
+
+location_writer = LocationBatchWriter(
+    batch_size=settings.RIDER_LOCATION_BATCH_SIZE,
+    flush_interval=settings.RIDER_LOCATION_FLUSH_INTERVAL,
+    max_buffer=settings.RIDER_LOCATION_MAX_BUFFER,
+)
+atexit.register(location_writer.close)
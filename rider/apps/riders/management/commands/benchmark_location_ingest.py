@@ -0,0 +1,317 @@
+"""
+Management command to load-test rider location ingest.
+Creates N test riders (through create_test_riders), gives each one a
+benchmark delivery and drives M pings/s per rider through the
+RiderViewSet.update_location REST action and/or the RiderConsumer WebSocket.
+
+Runs against local stand-ins: an in-memory channel layer, a fake Kafka
+producer and whatever Redis/Postgres the settings point at.
+Reports throughput plus p50/p95/p99 latency per stage.
+Usage: python manage.py benchmark_location_ingest --riders 50 --rate 2 --duration 30
+"""
+import asyncio
+import functools
+import io
+import json
+import random
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+from channels.layers import channel_layers, get_channel_layer
+from channels.routing import URLRouter
+from channels.testing import WebsocketCommunicator
+from django.conf import settings
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+from rest_framework.test import APIRequestFactory
+
+from apps.deliveries.models import Delivery
+from apps.orders.models import Order
+from apps.riders.async_ingest import async_location_ingest
+from apps.riders.location_writer import location_writer
+from apps.riders.models import Rider
+from apps.riders.routing import websocket_urlpatterns
+from apps.riders.services import rider_service
+from apps.riders.views import RiderViewSet
+from infrastructure.kafka_client import kafka_client
+
+
+class FakeProducer:
+    """Stand-in for confluent_kafka.Producer, acknowledges every message at once"""
+
+    def __init__(self):
+        self.messages = 0
+        self.bytes = 0
+
+    def produce(self, topic, value=None, key=None, partition=None, callback=None, **kwargs):
+        self.messages += 1
+        self.bytes += len(value or b"")
+        if callback:
+            callback(None, None)
+
+    def poll(self, timeout=None):
+        return 0
+
+    def flush(self, timeout=None):
+        return 0
+
+
+class StageTimer:
+    """Collects latency samples (ms) per stage from wrapped callables"""
+
+    def __init__(self):
+        self.samples = defaultdict(list)
+        self._lock = threading.Lock()
+
+    def record(self, stage, started):
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        with self._lock:
+            self.samples[stage].append(elapsed_ms)
+
+    def wrap(self, stage, func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                self.record(stage, started)
+        return wrapper
+
+    def wrap_async(self, stage, func):
+        @functools.wraps(func)
+        async def wrapper(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                return await func(*args, **kwargs)
+            finally:
+                self.record(stage, started)
+        return wrapper
+
+
+class Command(BaseCommand):
+    help = 'Benchmark rider location ingest over REST and WebSocket with per-stage latency'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--riders',
+            type=int,
+            default=10,
+            help='Number of test riders (default: 10)',
+        )
+        parser.add_argument(
+            '--rate',
+            type=float,
+            default=1.0,
+            help='Pings per second per rider (default: 1)',
+        )
+        parser.add_argument(
+            '--duration',
+            type=float,
+            default=10.0,
+            help='Seconds to drive load per transport (default: 10)',
+        )
+        parser.add_argument(
+            '--transport',
+            choices=['rest', 'websocket', 'both'],
+            default='both',
+            help='Ingest path to benchmark (default: both)',
+        )
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=8,
+            help='Concurrent REST request workers (default: 8)',
+        )
+        parser.add_argument(
+            '--keep-data',
+            action='store_true',
+            help='Keep the benchmark orders/deliveries afterwards',
+        )
+
+    def handle(self, *args, **options):
+        riders = self._create_riders(options['riders'])
+        deliveries = self._create_deliveries(riders)
+        timer = StageTimer()
+        restore = self._install_stand_ins(timer)
+
+        try:
+            if options['transport'] in ('rest', 'both'):
+                self._run_rest(riders, deliveries, timer, options)
+            if options['transport'] in ('websocket', 'both'):
+                self._run_websocket(riders, deliveries, timer, options)
+            location_writer.flush()
+        finally:
+            restore()
+            if not options['keep_data']:
+                Order.objects.filter(order_number__startswith='BENCH-').delete()
+
+        self._report(timer)
+
+    def _create_riders(self, count):
+        call_command('create_test_riders', count=count, stdout=io.StringIO())
+        riders = list(
+            Rider.objects.filter(phone__startswith='9876543').order_by('phone')[:count]
+        )
+        self.stdout.write(f'Using {len(riders)} test riders')
+        return riders
+
+    def _create_deliveries(self, riders):
+        """One delivery per rider so pings exercise the order/rider fanout"""
+        deliveries = {}
+        for rider in riders:
+            order, _ = Order.objects.get_or_create(
+                order_number=f'BENCH-{rider.phone}',
+                defaults={
+                    'customer_id': rider.id,
+                    'customer_name': 'Benchmark',
+                    'customer_phone': rider.phone,
+                    'pickup_address': 'Benchmark pickup',
+                    'pickup_lat': 28.6139,
+                    'pickup_lng': 77.2090,
+                    'delivery_address': 'Benchmark drop',
+                    'delivery_lat': 28.5355,
+                    'delivery_lng': 77.3910,
+                    'status': 'in_transit',
+                },
+            )
+            delivery, _ = Delivery.objects.get_or_create(
+                order=order, rider=rider, defaults={'status': 'in_progress'}
+            )
+            deliveries[str(rider.id)] = str(delivery.id)
+        return deliveries
+
+    def _install_stand_ins(self, timer):
+        """Swap in local stand-ins and timing wrappers, returns an undo callable"""
+        original_layers = settings.CHANNEL_LAYERS
+        original_producer = kafka_client.producer
+        originals = [
+            (rider_service, 'set_rider_location'),
+            (async_location_ingest, 'set_rider_location'),
+            (kafka_client, 'publish_async'),
+            (location_writer, '_write_batch'),
+        ]
+        saved = [(obj, name, getattr(obj, name)) for obj, name in originals]
+
+        settings.CHANNEL_LAYERS = {
+            'default': {'BACKEND': 'channels.layers.InMemoryChannelLayer'}
+        }
+        channel_layers.backends = {}
+        channel_layer = get_channel_layer()
+        channel_layer.group_send = timer.wrap_async('fanout', channel_layer.group_send)
+
+        kafka_client.producer = FakeProducer()
+        rider_service.set_rider_location = timer.wrap('cache_set', rider_service.set_rider_location)
+        async_location_ingest.set_rider_location = timer.wrap_async(
+            'cache_set', async_location_ingest.set_rider_location
+        )
+        # publish() goes through publish_async(), so this times both paths
+        kafka_client.publish_async = timer.wrap('publish', kafka_client.publish_async)
+        location_writer._write_batch = timer.wrap('db_insert_batch', location_writer._write_batch)
+
+        def restore():
+            for obj, name, value in saved:
+                setattr(obj, name, value)
+            kafka_client.producer = original_producer
+            settings.CHANNEL_LAYERS = original_layers
+            channel_layers.backends = {}
+
+        return restore
+
+    @staticmethod
+    def _ping(rider_index):
+        return {
+            'lat': 28.6139 + random.uniform(-0.05, 0.05),
+            'lng': 77.2090 + random.uniform(-0.05, 0.05),
+            'accuracy': 10.0,
+            'speed': random.uniform(0, 12),
+            'heading': random.uniform(0, 360),
+            'battery_level': 80,
+        }
+
+    def _run_rest(self, riders, deliveries, timer, options):
+        factory = APIRequestFactory()
+        view = RiderViewSet.as_view({'put': 'update_location'})
+        total = int(len(riders) * options['rate'] * options['duration'])
+        interval = 1.0 / (len(riders) * options['rate'])
+
+        def send(index):
+            rider_id = str(riders[index % len(riders)].id)
+            data = {**self._ping(index), 'delivery_id': deliveries[rider_id]}
+            started = time.perf_counter()
+            request = factory.put(
+                f'/api/v1/riders/{rider_id}/update_location/', data, format='json'
+            )
+            view(request, pk=rider_id)
+            timer.record('rest_end_to_end', started)
+
+        self.stdout.write(f'REST: sending {total} pings...')
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=options['workers']) as pool:
+            for index in range(total):
+                # Open-loop pacing, requests are not held back by slow responses
+                delay = started + index * interval - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+                pool.submit(send, index)
+        self._throughput('rest_end_to_end', total, time.perf_counter() - started)
+
+    def _run_websocket(self, riders, deliveries, timer, options):
+        application = URLRouter(websocket_urlpatterns)
+
+        async def drive(rider):
+            rider_id = str(rider.id)
+            communicator = WebsocketCommunicator(application, f'/ws/riders/{rider_id}/')
+            connected, _ = await communicator.connect()
+            if not connected:
+                return 0
+            sent = 0
+            interval = 1.0 / options['rate']
+            deadline = time.perf_counter() + options['duration']
+            while time.perf_counter() < deadline:
+                next_at = time.perf_counter() + interval
+                started = time.perf_counter()
+                await communicator.send_to(text_data=json.dumps({
+                    'type': 'location_update',
+                    'data': {**self._ping(sent), 'delivery_id': deliveries[rider_id]},
+                }))
+                # Messages are handled in order, the pong confirms the ping was ingested
+                await communicator.send_to(text_data=json.dumps({'type': 'ping'}))
+                while json.loads(await communicator.receive_from(timeout=10))['type'] != 'pong':
+                    pass
+                timer.record('websocket_end_to_end', started)
+                sent += 1
+                await asyncio.sleep(max(0.0, next_at - time.perf_counter()))
+            await communicator.disconnect()
+            return sent
+
+        async def run_all():
+            return await asyncio.gather(*(drive(rider) for rider in riders))
+
+        self.stdout.write(f'WebSocket: driving {len(riders)} sockets...')
+        started = time.perf_counter()
+        total = sum(asyncio.run(run_all()))
+        self._throughput('websocket_end_to_end', total, time.perf_counter() - started)
+
+    def _throughput(self, stage, total, elapsed):
+        self.stdout.write(
+            self.style.SUCCESS(f'{stage}: {total} pings in {elapsed:.1f}s ({total / elapsed:.1f} pings/s)')
+        )
+
+    def _report(self, timer):
+        self.stdout.write(
+            f'\n{"stage":<24}{"count":>8}{"p50 ms":>10}{"p95 ms":>10}{"p99 ms":>10}{"max ms":>10}'
+        )
+        for stage, samples in sorted(timer.samples.items()):
+            p50, p95, p99 = np.percentile(samples, [50, 95, 99])
+            self.stdout.write(
+                f'{stage:<24}{len(samples):>8}{p50:>10.2f}{p95:>10.2f}{p99:>10.2f}{max(samples):>10.2f}'
+            )
+        stats = location_writer.stats()
+        self.stdout.write(
+            f'\nBatch writer: {stats["rows_written"]} rows in {stats["flushes"]} flushes, '
+            f'{stats["rows_failed"]} failed, {stats["rows_dropped"]} dropped'
+        )
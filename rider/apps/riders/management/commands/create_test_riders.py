@@ -48,6 +48,8 @@ class Command(BaseCommand):
                 }
             )
             
+            rider_service.sync_rider_availability(rider)
+
             if created:
                 # Set initial location
                 rider_service.update_rider_location(
@@ -0,0 +1,79 @@
+"""
+Management command to maintain rider_locations partitions.
+Creates upcoming partitions and retires (rolls up, then drops or archives)
+expired ones. Run it periodically (e.g., hourly) via cron.
+Usage: python manage.py manage_location_partitions --ahead 7 --retention-days 30
+"""
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from apps.riders import partitions
+
+
+class Command(BaseCommand):
+    help = 'Create future rider_locations partitions and retire expired ones'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--granularity',
+            choices=sorted(partitions.GRANULARITIES),
+            default=settings.RIDER_LOCATION_PARTITION_GRANULARITY,
+            help=f'Partition size (default: {settings.RIDER_LOCATION_PARTITION_GRANULARITY})',
+        )
+        parser.add_argument(
+            '--ahead',
+            type=int,
+            default=7,
+            help='Number of future partitions to keep created (default: 7)',
+        )
+        parser.add_argument(
+            '--retention-days',
+            type=int,
+            default=settings.RIDER_LOCATION_RETENTION_DAYS,
+            help=f'Raw location retention in days (default: {settings.RIDER_LOCATION_RETENTION_DAYS})',
+        )
+        parser.add_argument(
+            '--archive',
+            action='store_true',
+            help='Detach expired partitions but keep the tables instead of dropping them',
+        )
+        parser.add_argument(
+            '--no-rollup',
+            action='store_true',
+            help='Skip the per-minute rollup of expired data',
+        )
+
+    def handle(self, *args, **options):
+        now = timezone.now()
+        cutoff = now - timedelta(days=options['retention_days'])
+        rollup = not options['no_rollup']
+
+        created = partitions.ensure_partitions(now, options['ahead'], options['granularity'])
+        for name in created:
+            self.stdout.write(self.style.SUCCESS(f'Created partition: {name}'))
+
+        retired = 0
+        for name, start, end in partitions.list_partitions():
+            if end > cutoff:
+                continue
+            rolled_up = partitions.retire_partition(name, archive=options['archive'], rollup=rollup)
+            retired += 1
+            action = 'Archived' if options['archive'] else 'Dropped'
+            self.stdout.write(
+                self.style.WARNING(f'{action} partition: {name} ({rolled_up} rollup rows)')
+            )
+
+        purged = partitions.purge_default_partition(cutoff, rollup=rollup)
+        if purged:
+            self.stdout.write(
+                self.style.WARNING(f'Purged {purged} expired rows from {partitions.DEFAULT_PARTITION}')
+            )
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f'\nPartition maintenance completed. Created: {len(created)}, Retired: {retired}'
+            )
+        )
@@ -0,0 +1,108 @@
+"""
+Management command to warm the rider location cache from the
+rider_current_location snapshot table (e.g. after a Redis restart).
+Also rebuilds the available riders geo index for riders that are available
+and not reserved by an assignment in progress.
+Only snapshots within the matching freshness window (RIDER_LOCATION_TTL_SECONDS)
+are loaded by default, and each expires when it would have gone stale.
+Usage: python manage.py warm_location_cache [--max-age-seconds 300]
+"""
+import json
+from datetime import timedelta
+from itertools import islice
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from infrastructure.cache import redis_client
+
+from apps.riders.models import RiderCurrentLocation
+from apps.riders.services import rider_service
+
+
+class Command(BaseCommand):
+    help = 'Load latest rider locations from the snapshot table into Redis'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--max-age-seconds',
+            type=int,
+            default=settings.RIDER_LOCATION_TTL_SECONDS,
+            help=f'Skip snapshots older than this (default: {settings.RIDER_LOCATION_TTL_SECONDS}, '
+                 f'the freshness window used for matching)',
+        )
+        parser.add_argument(
+            '--max-age-hours',
+            type=int,
+            help='Skip snapshots older than this many hours, overrides --max-age-seconds',
+        )
+        parser.add_argument(
+            '--ttl',
+            type=int,
+            default=settings.RIDER_LOCATION_TTL_SECONDS,
+            help=f'Longest TTL in seconds for the cached locations (default: {settings.RIDER_LOCATION_TTL_SECONDS})',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help='Snapshots per Redis pipeline (default: 1000)',
+        )
+
+    def handle(self, *args, **options):
+        max_age = options['max_age_seconds']
+        if options['max_age_hours'] is not None:
+            max_age = options['max_age_hours'] * 3600
+        now = timezone.now()
+        snapshots = (
+            RiderCurrentLocation.objects.filter(timestamp__gte=now - timedelta(seconds=max_age))
+            .select_related('rider')
+            .iterator(chunk_size=options['batch_size'])
+        )
+
+        warmed = indexed = skipped_reserved = 0
+        while True:
+            batch = list(islice(snapshots, options['batch_size']))
+            if not batch:
+                break
+            batch_indexed, batch_reserved = self._warm_batch(batch, now, max_age, options['ttl'])
+            warmed += len(batch)
+            indexed += batch_indexed
+            skipped_reserved += batch_reserved
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f'Warmed {warmed} rider locations ({indexed} available riders indexed, '
+                f'{skipped_reserved} reserved riders left out of the index)'
+            )
+        )
+
+    @staticmethod
+    def _warm_batch(snapshots, now, max_age, max_ttl):
+        """Cache one batch of snapshots in a single pipeline, returns (indexed, reserved)"""
+        available = {
+            str(snapshot.rider_id) for snapshot in snapshots
+            if snapshot.rider.is_active and snapshot.rider.current_status == "available"
+        }
+        # Reserved riders left the index when they were claimed, do not offer them again
+        reserved = rider_service.get_reserved_riders(available)
+
+        indexed = 0
+        pipe = redis_client.pipeline(transaction=False)
+        for snapshot in snapshots:
+            rider = snapshot.rider
+            rider_id = str(rider.id)
+            payload = rider_service.snapshot_payload(snapshot)
+            # Expire when the position leaves the freshness window, as a live ping would
+            remaining = max_age - (now - snapshot.timestamp).total_seconds()
+            ttl = max(1, min(max_ttl, int(remaining)))
+            pipe.setex(f"rider:location:{rider_id}", ttl, json.dumps(payload))
+            if rider_id in available and rider_id not in reserved:
+                pipe.hset("rider:available", rider_id, rider.vehicle_type)
+                pipe.geoadd(
+                    f"rider:geo:available:{rider.vehicle_type}",
+                    [payload["lng"], payload["lat"], rider_id],
+                )
+                indexed += 1
+        pipe.execute()
+        return indexed, len(reserved)
@@ -0,0 +1,19 @@
+# Generated by Django 6.0 on 2026-10-17 01:04
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('riders', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='riderlocation',
+            name='timestamp',
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 6.0 on 2026-10-17 01:09
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('riders', '0002_rider_location_timestamp_default'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RiderLocationRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('bucket', models.DateTimeField(help_text='Start of the minute')),
+                ('lat', models.DecimalField(decimal_places=8, help_text='Average latitude', max_digits=10)),
+                ('lng', models.DecimalField(decimal_places=8, help_text='Average longitude', max_digits=10)),
+                ('max_speed', models.DecimalField(blank=True, decimal_places=2, max_digits=8, null=True)),
+                ('sample_count', models.PositiveIntegerField(default=0)),
+                ('rider', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='location_rollups', to='riders.rider')),
+            ],
+            options={
+                'db_table': 'rider_location_rollups',
+                'ordering': ['-bucket'],
+                'indexes': [models.Index(fields=['rider', '-bucket'], name='rider_locat_rider_i_444568_idx')],
+                'constraints': [models.UniqueConstraint(fields=('rider', 'bucket'), name='unique_rider_location_rollup')],
+            },
+        ),
+    ]
@@ -0,0 +1,60 @@
+# Generated by Django 6.0 on 2026-10-17 01:15
+
+from django.db import migrations
+
+# rider_locations becomes a table partitioned by RANGE ("timestamp").
+# Partitioned tables need the partition key in the primary key, so the
+# database primary key is (id, timestamp); Django keeps treating id as the pk.
+# Rows land in the DEFAULT partition until manage_location_partitions has
+# created the daily/hourly partitions.
+PARTITION_SQL = """
+ALTER TABLE rider_locations RENAME TO rider_locations_unpartitioned;
+
+CREATE TABLE rider_locations (
+    LIKE rider_locations_unpartitioned INCLUDING DEFAULTS INCLUDING STORAGE
+) PARTITION BY RANGE ("timestamp");
+
+CREATE TABLE rider_locations_default PARTITION OF rider_locations DEFAULT;
+
+INSERT INTO rider_locations SELECT * FROM rider_locations_unpartitioned;
+DROP TABLE rider_locations_unpartitioned;
+
+ALTER TABLE rider_locations ADD CONSTRAINT rider_locations_pkey PRIMARY KEY (id, "timestamp");
+ALTER TABLE rider_locations ADD CONSTRAINT rider_locations_rider_id_fk_riders_id
+    FOREIGN KEY (rider_id) REFERENCES riders (id) DEFERRABLE INITIALLY DEFERRED;
+ALTER TABLE rider_locations ADD CONSTRAINT rider_locations_delivery_id_fk_deliveries_id
+    FOREIGN KEY (delivery_id) REFERENCES deliveries (id) DEFERRABLE INITIALLY DEFERRED;
+
+CREATE INDEX rider_locat_rider_i_d148ed_idx ON rider_locations (rider_id, "timestamp" DESC);
+CREATE INDEX rider_locat_deliver_a3b42b_idx ON rider_locations (delivery_id);
+"""
+
+UNPARTITION_SQL = """
+CREATE TABLE rider_locations_unpartitioned (
+    LIKE rider_locations INCLUDING DEFAULTS INCLUDING STORAGE
+);
+INSERT INTO rider_locations_unpartitioned SELECT * FROM rider_locations;
+DROP TABLE rider_locations CASCADE;
+ALTER TABLE rider_locations_unpartitioned RENAME TO rider_locations;
+
+ALTER TABLE rider_locations ADD CONSTRAINT rider_locations_pkey PRIMARY KEY (id);
+ALTER TABLE rider_locations ADD CONSTRAINT rider_locations_rider_id_fk_riders_id
+    FOREIGN KEY (rider_id) REFERENCES riders (id) DEFERRABLE INITIALLY DEFERRED;
+ALTER TABLE rider_locations ADD CONSTRAINT rider_locations_delivery_id_fk_deliveries_id
+    FOREIGN KEY (delivery_id) REFERENCES deliveries (id) DEFERRABLE INITIALLY DEFERRED;
+
+CREATE INDEX rider_locat_rider_i_d148ed_idx ON rider_locations (rider_id, "timestamp" DESC);
+CREATE INDEX rider_locat_deliver_a3b42b_idx ON rider_locations (delivery_id);
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('deliveries', '0004_merge_20260102_1535'),
+        ('riders', '0003_rider_location_rollup'),
+    ]
+
+    operations = [
+        migrations.RunSQL(PARTITION_SQL, reverse_sql=UNPARTITION_SQL),
+    ]
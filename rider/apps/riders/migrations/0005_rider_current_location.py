@@ -0,0 +1,46 @@
+# Generated by Django 6.0 on 2026-10-17 01:19
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('deliveries', '0004_merge_20260102_1535'),
+        ('riders', '0004_partition_rider_locations'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RiderCurrentLocation',
+            fields=[
+                ('rider', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='current_location', serialize=False, to='riders.rider')),
+                ('lat', models.DecimalField(decimal_places=8, max_digits=10)),
+                ('lng', models.DecimalField(decimal_places=8, max_digits=10)),
+                ('accuracy', models.DecimalField(blank=True, decimal_places=2, max_digits=8, null=True)),
+                ('speed', models.DecimalField(blank=True, decimal_places=2, max_digits=8, null=True)),
+                ('heading', models.DecimalField(blank=True, decimal_places=2, max_digits=5, null=True)),
+                ('battery_level', models.IntegerField(blank=True, null=True)),
+                ('timestamp', models.DateTimeField()),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('delivery', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='deliveries.delivery')),
+            ],
+            options={
+                'db_table': 'rider_current_location',
+                'indexes': [models.Index(fields=['-timestamp'], name='rider_curre_timesta_5d8fa6_idx')],
+            },
+        ),
+        # Seed the snapshot with each rider's newest ping
+        migrations.RunSQL(
+            sql="""
+            INSERT INTO rider_current_location
+                (rider_id, delivery_id, lat, lng, accuracy, speed, heading, battery_level, "timestamp", updated_at)
+            SELECT DISTINCT ON (rider_id)
+                rider_id, delivery_id, lat, lng, accuracy, speed, heading, battery_level, "timestamp", NOW()
+            FROM rider_locations
+            ORDER BY rider_id, "timestamp" DESC
+            """,
+            reverse_sql=migrations.RunSQL.noop,
+        ),
+    ]
@@ -1,4 +1,5 @@
 from django.db import models
+from django.utils import timezone
 
 from apps.core.models import TimeStampedUUIDModel
 
@@ -52,7 +53,8 @@ class RiderLocation(TimeStampedUUIDModel):
     speed = models.DecimalField(max_digits=8, decimal_places=2, null=True, blank=True)
     heading = models.DecimalField(max_digits=5, decimal_places=2, null=True, blank=True)
     battery_level = models.IntegerField(null=True, blank=True)
-    timestamp = models.DateTimeField(auto_now_add=True)
+    # Set when the ping is received, rows are persisted later by the batch writer
+    timestamp = models.DateTimeField(default=timezone.now)
 
     class Meta:
         db_table = "rider_locations"
@@ -61,3 +63,64 @@ class RiderLocation(TimeStampedUUIDModel):
             models.Index(fields=["delivery"]),
         ]
         ordering = ["-timestamp"]
+
+
+class RiderCurrentLocation(models.Model):
+    """
+    Latest known position per rider (one row each), upserted by the location
+    batch writer. Source for cache-miss fallbacks and cache warmups.
+    """
+
+    rider = models.OneToOneField(
+        Rider, on_delete=models.CASCADE, primary_key=True, related_name="current_location"
+    )
+    delivery = models.ForeignKey(
+        "deliveries.Delivery",
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name="+",
+    )
+    lat = models.DecimalField(max_digits=10, decimal_places=8)
+    lng = models.DecimalField(max_digits=10, decimal_places=8)
+    accuracy = models.DecimalField(
+        max_digits=8, decimal_places=2, null=True, blank=True
+    )
+    speed = models.DecimalField(max_digits=8, decimal_places=2, null=True, blank=True)
+    heading = models.DecimalField(max_digits=5, decimal_places=2, null=True, blank=True)
+    battery_level = models.IntegerField(null=True, blank=True)
+    timestamp = models.DateTimeField()
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        db_table = "rider_current_location"
+        indexes = [
+            models.Index(fields=["-timestamp"]),
+        ]
+
+    def __str__(self):
+        return f"{self.rider_id} @ ({self.lat}, {self.lng})"
+
+
+class RiderLocationRollup(models.Model):
+    """
+    Per-minute rollup of rider_locations, written before expired
+    partitions are dropped (see manage_location_partitions)
+    """
+
+    rider = models.ForeignKey(Rider, on_delete=models.CASCADE, related_name="location_rollups")
+    bucket = models.DateTimeField(help_text="Start of the minute")
+    lat = models.DecimalField(max_digits=10, decimal_places=8, help_text="Average latitude")
+    lng = models.DecimalField(max_digits=10, decimal_places=8, help_text="Average longitude")
+    max_speed = models.DecimalField(max_digits=8, decimal_places=2, null=True, blank=True)
+    sample_count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        db_table = "rider_location_rollups"
+        constraints = [
+            models.UniqueConstraint(fields=["rider", "bucket"], name="unique_rider_location_rollup"),
+        ]
+        indexes = [
+            models.Index(fields=["rider", "-bucket"]),
+        ]
+        ordering = ["-bucket"]
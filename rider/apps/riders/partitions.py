@@ -0,0 +1,148 @@
+"""
+Partition maintenance for rider_locations (declaratively partitioned by
+RANGE on "timestamp", see migration 0004_partition_rider_locations).
+
+Partitions are named rider_locations_pYYYYMMDD (daily) or
+rider_locations_pYYYYMMDDHH (hourly). Rows outside every partition land in
+rider_locations_default.
+"""
+import re
+from datetime import datetime, timedelta, timezone as dt_timezone
+from typing import List, Tuple
+
+from django.db import connection, transaction
+
+PARENT_TABLE = "rider_locations"
+DEFAULT_PARTITION = "rider_locations_default"
+GRANULARITIES = {
+    "daily": (timedelta(days=1), "%Y%m%d"),
+    "hourly": (timedelta(hours=1), "%Y%m%d%H"),
+}
+_PARTITION_NAME = re.compile(r"^rider_locations_p(\d{8}|\d{10})$")
+
+
+def floor_timestamp(ts: datetime, granularity: str) -> datetime:
+    ts = ts.astimezone(dt_timezone.utc)
+    if granularity == "daily":
+        return ts.replace(hour=0, minute=0, second=0, microsecond=0)
+    return ts.replace(minute=0, second=0, microsecond=0)
+
+
+def partition_name(start: datetime, granularity: str) -> str:
+    _, name_format = GRANULARITIES[granularity]
+    return f"{PARENT_TABLE}_p{start.strftime(name_format)}"
+
+
+def list_partitions() -> List[Tuple[str, datetime, datetime]]:
+    """Existing range partitions as (name, start, end), oldest first"""
+    with connection.cursor() as cursor:
+        cursor.execute(
+            """
+            SELECT child.relname
+            FROM pg_inherits
+            JOIN pg_class parent ON parent.oid = pg_inherits.inhparent
+            JOIN pg_class child ON child.oid = pg_inherits.inhrelid
+            WHERE parent.relname = %s
+            """,
+            [PARENT_TABLE],
+        )
+        names = [row[0] for row in cursor.fetchall()]
+
+    partitions = []
+    for name in names:
+        match = _PARTITION_NAME.match(name)
+        if not match:
+            continue
+        suffix = match.group(1)
+        granularity = "daily" if len(suffix) == 8 else "hourly"
+        step, name_format = GRANULARITIES[granularity]
+        start = datetime.strptime(suffix, name_format).replace(tzinfo=dt_timezone.utc)
+        partitions.append((name, start, start + step))
+    return sorted(partitions, key=lambda partition: partition[1])
+
+
+def create_partition(start: datetime, granularity: str) -> str:
+    """
+    Create and attach the partition starting at `start`. Rows for that range
+    that already sit in the default partition are moved into it first,
+    otherwise attaching would fail.
+    """
+    step, _ = GRANULARITIES[granularity]
+    end = start + step
+    name = partition_name(start, granularity)
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(
+            f'CREATE TABLE {name} (LIKE {PARENT_TABLE} INCLUDING DEFAULTS INCLUDING STORAGE)'
+        )
+        cursor.execute(
+            f"""
+            WITH moved AS (
+                DELETE FROM {DEFAULT_PARTITION}
+                WHERE "timestamp" >= %s AND "timestamp" < %s
+                RETURNING *
+            )
+            INSERT INTO {name} SELECT * FROM moved
+            """,
+            [start, end],
+        )
+        cursor.execute(
+            f"ALTER TABLE {PARENT_TABLE} ATTACH PARTITION {name} FOR VALUES FROM (%s) TO (%s)",
+            [start, end],
+        )
+    return name
+
+
+def ensure_partitions(now: datetime, ahead: int, granularity: str) -> List[str]:
+    """Make sure the current partition and the next `ahead` ones exist"""
+    step, _ = GRANULARITIES[granularity]
+    existing = list_partitions()
+    created = []
+    start = floor_timestamp(now, granularity)
+    for _ in range(ahead + 1):
+        end = start + step
+        overlaps = any(p_start < end and start < p_end for _, p_start, p_end in existing)
+        if not overlaps:
+            created.append(create_partition(start, granularity))
+        start = end
+    return created
+
+
+def rollup_rows(table: str, before: datetime = None) -> int:
+    """Aggregate raw rows of `table` into per-minute rider_location_rollups"""
+    where = 'WHERE "timestamp" < %s' if before else ""
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"""
+            INSERT INTO rider_location_rollups (rider_id, bucket, lat, lng, max_speed, sample_count)
+            SELECT rider_id, date_trunc('minute', "timestamp"), AVG(lat), AVG(lng), MAX(speed), COUNT(*)
+            FROM {table}
+            {where}
+            GROUP BY rider_id, date_trunc('minute', "timestamp")
+            ON CONFLICT (rider_id, bucket) DO NOTHING
+            """,
+            [before] if before else [],
+        )
+        return cursor.rowcount
+
+
+def retire_partition(name: str, archive: bool = False, rollup: bool = True) -> int:
+    """
+    Roll up and detach an expired partition. The detached table is dropped
+    unless `archive` is set, in which case it is left for export.
+    Retention is a metadata operation, not a DELETE over the live table.
+    """
+    with transaction.atomic(), connection.cursor() as cursor:
+        rolled_up = rollup_rows(name) if rollup else 0
+        cursor.execute(f"ALTER TABLE {PARENT_TABLE} DETACH PARTITION {name}")
+        if not archive:
+            cursor.execute(f"DROP TABLE {name}")
+    return rolled_up
+
+
+def purge_default_partition(before: datetime, rollup: bool = True) -> int:
+    """Expire rows stuck in the default partition (pre-partitioning data or gaps)"""
+    with transaction.atomic(), connection.cursor() as cursor:
+        if rollup:
+            rollup_rows(DEFAULT_PARTITION, before)
+        cursor.execute(f'DELETE FROM {DEFAULT_PARTITION} WHERE "timestamp" < %s', [before])
+        return cursor.rowcount
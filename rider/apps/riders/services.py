@@ -1,24 +1,38 @@
 import json
-from datetime import datetime
-from typing import Any, Dict, Optional, Set
+import uuid
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional, Set, Tuple
 from asgiref.sync import async_to_sync
 from channels.layers import get_channel_layer
+from django.conf import settings
+from django.utils import timezone
 
 from confluent_kafka.error import KafkaError
 from infrastructure.cache import redis_client
 from infrastructure.kafka_client import kafka_client
 
 from apps.deliveries.constants import KAFKA_TOPICS
+from apps.deliveries.context_cache import delivery_context_cache
 
-from .models import Rider, RiderLocation
+from .location_writer import location_writer
+from .models import Rider, RiderCurrentLocation, RiderLocation
 
 
 class RiderService:
     def set_rider_location(
-        self, rider_id: str, location_data: Dict[str, Any], ttl: int = 300
+        self, rider_id: str, location_data: Dict[str, Any], ttl: Optional[int] = None
     ):
         key = f"rider:location:{rider_id}"
-        redis_client.setex(key, ttl, json.dumps(location_data))
+        pipe = redis_client.pipeline()
+        pipe.setex(key, ttl or settings.RIDER_LOCATION_TTL_SECONDS, json.dumps(location_data))
+        pipe.hget("rider:available", rider_id)
+        _, vehicle_type = pipe.execute()
+        # Keep the geo index in step with the latest position of available riders
+        if vehicle_type:
+            redis_client.geoadd(
+                f"rider:geo:available:{vehicle_type}",
+                [float(location_data["lng"]), float(location_data["lat"]), rider_id],
+            )
 
     def get_rider_location(self, rider_id: str) -> Optional[Dict[str, Any]]:
         """
@@ -33,6 +47,158 @@ class RiderService:
             # Fallback to database - get latest location
             return self.get_rider_current_location(rider_id)
 
+    def get_rider_locations(self, rider_ids) -> Dict[str, Optional[Dict[str, Any]]]:
+        """
+        Bulk get_rider_location: one MGET for the cache and one query on the
+        rider_current_location snapshot for every miss.
+        Returns {rider_id: location or None} for each requested rider.
+        """
+        rider_ids = [str(rider_id) for rider_id in rider_ids]
+        if not rider_ids:
+            return {}
+        cached = redis_client.mget([f"rider:location:{rider_id}" for rider_id in rider_ids])
+        locations = {
+            rider_id: json.loads(data) if data else None
+            for rider_id, data in zip(rider_ids, cached)
+        }
+
+        misses = [rider_id for rider_id, location in locations.items() if location is None]
+        if misses:
+            try:
+                for snapshot in RiderCurrentLocation.objects.filter(rider_id__in=misses):
+                    locations[str(snapshot.rider_id)] = self.snapshot_payload(snapshot)
+            except Exception as e:
+                print(f"Error loading rider location snapshots: {e}")
+        return locations
+
+    # Available Rider Geo Index methods:
+    def mark_rider_available(
+        self,
+        rider_id: str,
+        vehicle_type: str,
+        location: Optional[Dict[str, Any]] = None,
+    ):
+        """
+        Add a rider to the available riders geo index (one GEO set per vehicle type).
+        Riders without a known location are registered and indexed on their next ping.
+        """
+        redis_client.hset("rider:available", rider_id, vehicle_type)
+        location = location or self.get_rider_location(rider_id)
+        if location:
+            redis_client.geoadd(
+                f"rider:geo:available:{vehicle_type}",
+                [float(location["lng"]), float(location["lat"]), rider_id],
+            )
+
+    def mark_rider_unavailable(self, rider_id: str):
+        pipe = redis_client.pipeline()
+        pipe.hdel("rider:available", rider_id)
+        for vehicle_type, _ in Rider.VEHICLE_TYPES:
+            pipe.zrem(f"rider:geo:available:{vehicle_type}", rider_id)
+        pipe.execute()
+
+    def sync_rider_availability(self, rider: Rider):
+        """Reflect a rider's current status in the geo index after it is saved"""
+        if rider.is_active and rider.current_status == "available":
+            self.mark_rider_available(str(rider.id), rider.vehicle_type)
+        else:
+            self.mark_rider_unavailable(str(rider.id))
+
+    def find_available_riders_near(
+        self,
+        lat: float,
+        lng: float,
+        radius_km: float,
+        count: int,
+        vehicle_type: Optional[str] = None,
+    ) -> List[Tuple[str, float]]:
+        """
+        Radius / k-nearest query against the geo index.
+        Returns up to `count` (rider_id, distance_km) tuples, nearest first.
+        """
+        vehicle_types = (
+            [vehicle_type] if vehicle_type else [v for v, _ in Rider.VEHICLE_TYPES]
+        )
+        pipe = redis_client.pipeline()
+        for v_type in vehicle_types:
+            pipe.geosearch(
+                f"rider:geo:available:{v_type}",
+                longitude=lng,
+                latitude=lat,
+                radius=radius_km,
+                unit="km",
+                sort="ASC",
+                count=count,
+                withdist=True,
+            )
+        candidates = [
+            (member, float(distance))
+            for result in pipe.execute()
+            for member, distance in result
+        ]
+        candidates.sort(key=lambda candidate: candidate[1])
+        return candidates[:count]
+
+    # Rider Reservation methods:
+    # Check-and-claim in one round trip: the reservation key is only set if
+    # nobody holds it, and the rider leaves the geo index so concurrent
+    # searches stop offering it.
+    RESERVE_SCRIPT = """
+    if not redis.call('SET', KEYS[1], ARGV[2], 'NX', 'PX', ARGV[3]) then
+        return 0
+    end
+    local vehicle_type = redis.call('HGET', KEYS[2], ARGV[1])
+    if vehicle_type then
+        redis.call('HDEL', KEYS[2], ARGV[1])
+        redis.call('ZREM', ARGV[4] .. vehicle_type, ARGV[1])
+    end
+    return 1
+    """
+    # Only the holder of the token may release the reservation
+    RELEASE_SCRIPT = """
+    if redis.call('GET', KEYS[1]) == ARGV[1] then
+        return redis.call('DEL', KEYS[1])
+    end
+    return 0
+    """
+
+    def reserve_rider(self, rider_id: str, ttl_ms: Optional[int] = None) -> Optional[str]:
+        """
+        Atomically reserve a rider for an assignment in progress.
+        Returns the reservation token, or None if someone else holds the rider.
+        The reservation expires after `ttl_ms` in case the holder dies.
+        """
+        token = uuid.uuid4().hex
+        reserved = redis_client.eval(
+            self.RESERVE_SCRIPT,
+            2,
+            f"rider:reservation:{rider_id}",
+            "rider:available",
+            str(rider_id),
+            token,
+            ttl_ms or settings.RIDER_RESERVATION_TTL_MS,
+            "rider:geo:available:",
+        )
+        return token if reserved else None
+
+    def release_rider(self, rider_id: str, token: str) -> bool:
+        """Release a reservation, a no-op if it expired or belongs to someone else"""
+        released = redis_client.eval(
+            self.RELEASE_SCRIPT, 1, f"rider:reservation:{rider_id}", token
+        )
+        return bool(released)
+
+    def is_rider_reserved(self, rider_id: str) -> bool:
+        return bool(redis_client.exists(f"rider:reservation:{rider_id}"))
+
+    def get_reserved_riders(self, rider_ids) -> Set[str]:
+        """Subset of `rider_ids` currently reserved, in one MGET"""
+        rider_ids = [str(rider_id) for rider_id in rider_ids]
+        if not rider_ids:
+            return set()
+        tokens = redis_client.mget([f"rider:reservation:{rider_id}" for rider_id in rider_ids])
+        return {rider_id for rider_id, token in zip(rider_ids, tokens) if token}
+
     # Active Delivery-Rider Cache methods:
     def add_active_delivery(self, rider_id: str, delivery_id: str, ttl: int = 7200):
         key = f"rider:active_deliveries:{rider_id}"
@@ -56,54 +222,71 @@ class RiderService:
         redis_client.delete(key)
 
     ## Rider Location Tracking Helper Methods
+    @staticmethod
+    def build_location_row(rider_id, location_data, delivery_id=None) -> RiderLocation:
+        """Unsaved RiderLocation for the batch writer"""
+        return RiderLocation(
+            rider_id=rider_id,
+            delivery_id=delivery_id,
+            lat=location_data["lat"],
+            lng=location_data["lng"],
+            accuracy=location_data.get("accuracy"),
+            speed=location_data.get("speed"),
+            heading=location_data.get("heading"),
+            battery_level=location_data.get("battery_level"),
+            timestamp=timezone.now(),
+        )
+
+    @staticmethod
+    def build_location_payload(location_data) -> Dict[str, Any]:
+        """Location as cached in Redis and pushed to Kafka/WebSocket clients"""
+        return {
+            "lat": float(location_data["lat"]),
+            "lng": float(location_data["lng"]),
+            "accuracy": location_data.get("accuracy"),
+            "speed": location_data.get("speed"),
+            "heading": location_data.get("heading"),
+            "battery_level": location_data.get("battery_level"),
+            "timestamp": datetime.now().isoformat(),
+        }
+
+    @staticmethod
+    def build_location_message(rider_id, delivery_id, payload) -> Dict[str, Any]:
+        return {
+            "rider_id": str(rider_id),
+            "delivery_id": str(delivery_id) if delivery_id else None,
+            "location": payload,
+            "timestamp": datetime.now().isoformat(),
+        }
+
     def update_rider_location(self, rider_id, location_data, delivery_id=None):
         try:
-            # rider = Rider.objects.get(id=rider_id)
-            location = RiderLocation.objects.create(
-                rider_id=rider_id,
-                delivery_id=delivery_id,
-                lat=location_data["lat"],
-                lng=location_data["lng"],
-                accuracy=location_data.get("accuracy"),
-                speed=location_data.get("speed"),
-                heading=location_data.get("heading"),
-                battery_level=location_data.get("battery_level"),
-            )
-            cache_data_value = {
-                "lat": float(location_data["lat"]),
-                "lng": float(location_data["lng"]),
-                "accuracy": location_data.get("accuracy"),
-                "speed": location_data.get("speed"),
-                "heading": location_data.get("heading"),
-                "battery_level": location_data.get("battery_level"),
-                "timestamp": datetime.now().isoformat(),
-            }
+            # Persistence is batched, the cache/Kafka/WebSocket path below stays real-time
+            location = self.build_location_row(rider_id, location_data, delivery_id)
+            location_writer.add(location)
+            cache_data_value = self.build_location_payload(location_data)
 
             self.set_rider_location(str(rider_id), cache_data_value)
 
-            kafka_msg = {
-                "rider_id": str(rider_id),
-                "delivery_id": str(delivery_id) if delivery_id else None,
-                "location": cache_data_value,
-                "timestamp": datetime.now().isoformat(),
-            }
+            kafka_msg = self.build_location_message(rider_id, delivery_id, cache_data_value)
 
             topic = KAFKA_TOPICS.get("RIDER_LOCATION_UPDATE")
             if topic:
                 # Use rider_id as partition key for consistent ordering per rider
-                kafka_client.publish(topic, kafka_msg, key=str(rider_id))
+                kafka_client.publish(
+                    topic, kafka_msg, key=str(rider_id), codec=settings.KAFKA_LOCATION_CODEC
+                )
 
             # Send WebSocket notification for location updates
             if delivery_id:
                 # Notify order channel about rider location
                 channel_layer = get_channel_layer()
                 if channel_layer:
-                    # Find order for this delivery
-                    from apps.deliveries.models import Delivery
-                    try:
-                        delivery = Delivery.objects.get(id=delivery_id)
+                    # Find order for this delivery without touching the database
+                    context = delivery_context_cache.get(delivery_id)
+                    if context:
                         async_to_sync(channel_layer.group_send)(
-                            f"order_{delivery.order.id}",
+                            f"order_{context['order_id']}",
                             {
                                 "type": "location_update",
                                 "data": {
@@ -113,8 +296,6 @@ class RiderService:
                                 }
                             }
                         )
-                    except Delivery.DoesNotExist:
-                        pass
                 
                 # Notify rider channel
                 channel_layer = get_channel_layer()
@@ -141,54 +322,44 @@ class RiderService:
 
     def get_rider_current_location(self, rider_id):
         """
-        Get rider's current location from database (latest RiderLocation entry).
+        Get rider's current location from database (rider_current_location
+        snapshot, one indexed row per rider).
         This is the source of truth for persistent location.
         """
         try:
-            # First check if there's an active delivery with last location
-            from apps.deliveries.models import Delivery
-            active_delivery = Delivery.objects.filter(
-                rider_id=rider_id,
-                status__in=['assigned', 'accepted', 'in_progress', 'collected']
-            ).exclude(
-                last_location_lat__isnull=True
-            ).order_by('-updated_at').first()
-            
-            if active_delivery and active_delivery.last_location_lat:
-                return {
-                    "lat": float(active_delivery.last_location_lat),
-                    "lng": float(active_delivery.last_location_lng),
-                    "timestamp": active_delivery.updated_at.isoformat(),
-                }
-            
-            # Fallback to latest RiderLocation entry
-            try:
-                db_location = RiderLocation.objects.filter(rider_id=rider_id).latest(
-                    "timestamp"
-                )
-                return {
-                    "lat": float(db_location.lat),
-                    "lng": float(db_location.lng),
-                    "timestamp": db_location.timestamp.isoformat(),
-                    "accuracy": float(db_location.accuracy) if db_location.accuracy else None,
-                    "speed": float(db_location.speed) if db_location.speed else None,
-                    "heading": float(db_location.heading) if db_location.heading else None,
-                    "battery_level": db_location.battery_level,
-                }
-            except RiderLocation.DoesNotExist:
-                return None
-            except Exception as e:
-                print(f"Error getting location from DB: {e}")
-                return None
+            snapshot = RiderCurrentLocation.objects.filter(rider_id=rider_id).first()
+            return self.snapshot_payload(snapshot) if snapshot else None
         except Exception as e:
             print(f"Error in get_rider_current_location: {e}")
             return None
 
-    def get_rider_location_history(self, rider_id, limit=10):
+    @staticmethod
+    def snapshot_payload(snapshot: RiderCurrentLocation) -> Dict[str, Any]:
+        return {
+            "lat": float(snapshot.lat),
+            "lng": float(snapshot.lng),
+            "timestamp": snapshot.timestamp.isoformat(),
+            "accuracy": float(snapshot.accuracy) if snapshot.accuracy else None,
+            "speed": float(snapshot.speed) if snapshot.speed else None,
+            "heading": float(snapshot.heading) if snapshot.heading else None,
+            "battery_level": snapshot.battery_level,
+        }
+
+    @staticmethod
+    def _location_lookback_start(hours=None):
+        return timezone.now() - timedelta(hours=hours or settings.RIDER_LOCATION_LOOKBACK_HOURS)
+
+    def get_rider_location_history(self, rider_id, limit=10, hours=None):
+        """
+        Latest locations within the last `hours` (RIDER_LOCATION_LOOKBACK_HOURS
+        by default, at most the retention period). The time bound lets
+        Postgres prune older partitions.
+        """
+        hours = min(hours or settings.RIDER_LOCATION_LOOKBACK_HOURS, settings.RIDER_LOCATION_RETENTION_DAYS * 24)
         try:
-            locations = RiderLocation.objects.filter(rider_id=rider_id).order_by(
-                "-timestamp"
-            )[:limit]
+            locations = RiderLocation.objects.filter(
+                rider_id=rider_id, timestamp__gte=self._location_lookback_start(hours)
+            ).order_by("-timestamp")[:limit]
             return [
                 {
                     "lat": float(location.lat),
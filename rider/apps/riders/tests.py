@@ -1,3 +1,177 @@
-from django.test import TestCase
+from datetime import timedelta
+from decimal import Decimal
+from io import StringIO
+from unittest import mock
 
-# Create your tests here.
+import fakeredis
+from django.core.management import call_command
+from django.test import SimpleTestCase, TestCase
+from django.utils import timezone
+
+from .location_writer import LocationBatchWriter, upsert_current_locations
+from .models import Rider, RiderCurrentLocation, RiderLocation
+from .services import rider_service
+
+
+class LocationWriterTests(TestCase):
+    def setUp(self):
+        self.riders = [
+            Rider.objects.create(name=f"r{n}", phone=f"900000000{n}", vehicle_type="bike")
+            for n in range(2)
+        ]
+        self.now = timezone.now()
+        # add() would start the background flush thread, tests flush explicitly
+        patch = mock.patch.object(LocationBatchWriter, "_ensure_started")
+        patch.start()
+        self.addCleanup(patch.stop)
+
+    def location(self, rider, seconds_ago=0, lat="28.61000000"):
+        return RiderLocation(
+            rider=rider,
+            lat=Decimal(lat),
+            lng=Decimal("77.21000000"),
+            timestamp=self.now - timedelta(seconds=seconds_ago),
+        )
+
+    def writer(self, batch_size=100, max_buffer=1000):
+        return LocationBatchWriter(batch_size=batch_size, flush_interval=60, max_buffer=max_buffer)
+
+    def test_flush_writes_one_bulk_create_and_one_snapshot_per_rider(self):
+        writer = self.writer()
+        for seconds_ago in (30, 10, 20):
+            writer.add(self.location(self.riders[0], seconds_ago, lat=f"28.6{seconds_ago}"))
+        writer.add(self.location(self.riders[1], 5))
+
+        with mock.patch.object(
+            RiderLocation.objects, "bulk_create", wraps=RiderLocation.objects.bulk_create
+        ) as bulk_create:
+            writer.flush()
+
+        bulk_create.assert_called_once()
+        self.assertEqual(RiderLocation.objects.count(), 4)
+        self.assertEqual(RiderCurrentLocation.objects.count(), 2)
+        newest = RiderCurrentLocation.objects.get(rider=self.riders[0])
+        self.assertEqual(newest.timestamp, self.now - timedelta(seconds=10))
+        self.assertEqual(newest.lat, Decimal("28.61"))
+        self.assertEqual(writer.stats()["rows_written"], 4)
+        self.assertEqual(writer.stats()["buffered"], 0)
+
+    def test_older_ping_does_not_overwrite_newer_snapshot(self):
+        rider = self.riders[0]
+        upsert_current_locations([self.location(rider, 0, lat="28.62000000")])
+        upsert_current_locations([self.location(rider, 60, lat="28.60000000")])
+
+        snapshot = RiderCurrentLocation.objects.get(rider=rider)
+        self.assertEqual(snapshot.lat, Decimal("28.62"))
+        self.assertEqual(snapshot.timestamp, self.now)
+
+        upsert_current_locations([self.location(rider, -5, lat="28.63000000")])
+        snapshot.refresh_from_db()
+        self.assertEqual(snapshot.lat, Decimal("28.63"))
+
+    def test_full_buffer_sheds_the_oldest_ping(self):
+        writer = self.writer(max_buffer=3)
+        locations = [self.location(self.riders[0], seconds_ago) for seconds_ago in (40, 30, 20, 10)]
+        for location in locations:
+            writer.add(location)
+
+        self.assertEqual(writer.stats()["rows_dropped"], 1)
+        self.assertEqual(list(writer._buffer), locations[1:])
+
+    def test_failed_batch_is_retried_row_by_row(self):
+        writer = self.writer()
+        # lat does not fit the column: this row fails in the batch and on its own
+        writer.add(self.location(self.riders[0], 10, lat="123.00000000"))
+        writer.add(self.location(self.riders[0], 20))
+        writer.add(self.location(self.riders[1], 5))
+
+        writer.flush()
+
+        stats = writer.stats()
+        self.assertEqual((stats["rows_written"], stats["rows_failed"]), (2, 1))
+        self.assertEqual(RiderLocation.objects.count(), 2)
+        self.assertEqual(RiderCurrentLocation.objects.count(), 2)
+        snapshot = RiderCurrentLocation.objects.get(rider=self.riders[0])
+        self.assertEqual(snapshot.timestamp, self.now - timedelta(seconds=20))
+
+
+class RiderReservationTests(SimpleTestCase):
+    rider_id = "6f1c1a52-8f5e-4a8e-9d0c-6f6b1b0f6a01"
+
+    def setUp(self):
+        self.redis = fakeredis.FakeRedis(decode_responses=True)
+        patch = mock.patch("apps.riders.services.redis_client", self.redis)
+        patch.start()
+        self.addCleanup(patch.stop)
+        self.redis.hset("rider:available", self.rider_id, "bike")
+        self.redis.geoadd("rider:geo:available:bike", (77.21, 28.61, self.rider_id))
+
+    def test_reserve_takes_the_rider_out_of_the_available_pool(self):
+        token = rider_service.reserve_rider(self.rider_id, ttl_ms=5000)
+        self.assertIsNotNone(token)
+        self.assertEqual(self.redis.get(f"rider:reservation:{self.rider_id}"), token)
+        self.assertLessEqual(self.redis.pttl(f"rider:reservation:{self.rider_id}"), 5000)
+        self.assertIsNone(self.redis.hget("rider:available", self.rider_id))
+        self.assertIsNone(self.redis.zscore("rider:geo:available:bike", self.rider_id))
+        self.assertEqual(rider_service.get_reserved_riders([self.rider_id, "other"]), {self.rider_id})
+
+    def test_second_reserve_fails_while_the_first_is_held(self):
+        token = rider_service.reserve_rider(self.rider_id, ttl_ms=5000)
+        self.assertIsNone(rider_service.reserve_rider(self.rider_id, ttl_ms=5000))
+
+        self.assertTrue(rider_service.release_rider(self.rider_id, token))
+        self.assertIsNotNone(rider_service.reserve_rider(self.rider_id, ttl_ms=5000))
+
+    def test_release_requires_the_matching_token(self):
+        token = rider_service.reserve_rider(self.rider_id, ttl_ms=5000)
+        self.assertFalse(rider_service.release_rider(self.rider_id, "not-the-token"))
+        self.assertTrue(rider_service.is_rider_reserved(self.rider_id))
+
+        self.assertTrue(rider_service.release_rider(self.rider_id, token))
+        self.assertFalse(rider_service.is_rider_reserved(self.rider_id))
+        # Releasing twice is a no-op
+        self.assertFalse(rider_service.release_rider(self.rider_id, token))
+
+
+class WarmLocationCacheTests(TestCase):
+    def setUp(self):
+        self.redis = fakeredis.FakeRedis(decode_responses=True)
+        for target in (
+            "apps.riders.services.redis_client",
+            "apps.riders.management.commands.warm_location_cache.redis_client",
+        ):
+            patch = mock.patch(target, self.redis)
+            patch.start()
+            self.addCleanup(patch.stop)
+        self.now = timezone.now()
+
+    def rider(self, n, seconds_ago, status="available"):
+        rider = Rider.objects.create(
+            name=f"r{n}", phone=f"900000000{n}", vehicle_type="bike", current_status=status
+        )
+        RiderCurrentLocation.objects.create(
+            rider=rider, lat=Decimal("28.61"), lng=Decimal("77.21"),
+            timestamp=self.now - timedelta(seconds=seconds_ago),
+        )
+        return str(rider.id)
+
+    def test_warms_fresh_unreserved_riders(self):
+        available = self.rider(0, 60)
+        reserved = self.rider(1, 60)
+        busy = self.rider(2, 60, status="busy")
+        self.rider(3, 600)  # outside the freshness window
+        self.redis.set(f"rider:reservation:{reserved}", "token")
+
+        call_command("warm_location_cache", stdout=StringIO())
+
+        cached = {key.split(":")[-1] for key in self.redis.keys("rider:location:*")}
+        self.assertEqual(cached, {available, reserved, busy})
+        self.assertEqual(set(self.redis.hkeys("rider:available")), {available})
+        self.assertEqual(set(self.redis.zrange("rider:geo:available:bike", 0, -1)), {available})
+        # Expires when the snapshot leaves the freshness window
+        self.assertLessEqual(self.redis.ttl(f"rider:location:{available}"), 240)
+
+    def test_max_age_override(self):
+        stale = self.rider(0, 600)
+        call_command("warm_location_cache", "--max-age-hours", "1", stdout=StringIO())
+        self.assertEqual(set(self.redis.hkeys("rider:available")), {stale})
@@ -1,3 +1,6 @@
+import uuid
+
+from django.conf import settings
 from rest_framework import status, viewsets
 from rest_framework.decorators import action
 from rest_framework.response import Response
@@ -27,7 +30,8 @@ class RiderViewSet(viewsets.ViewSet):
     def create(self, request):
         serializer = RiderSerializer(data=request.data)
         if serializer.is_valid():
-            serializer.save()
+            rider = serializer.save()
+            rider_service.sync_rider_availability(rider)
             return Response(serializer.data, status=status.HTTP_201_CREATED)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
@@ -88,6 +92,44 @@ class RiderViewSet(viewsets.ViewSet):
                 {"error": str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR
             )
 
+    @action(detail=False, methods=["get"])
+    def locations(self, request):
+        """
+        Current locations of many riders in one call (dashboards/maps).
+        ?ids=<id>,<id>... or, without ids, active riders. At most
+        RIDER_LOCATIONS_MAX_IDS riders per request.
+        """
+        max_ids = settings.RIDER_LOCATIONS_MAX_IDS
+        ids = request.query_params.get("ids")
+        if ids:
+            rider_ids = [rider_id for rider_id in ids.split(",") if rider_id]
+            if len(rider_ids) > max_ids:
+                return Response(
+                    {"error": f"At most {max_ids} rider ids per request"},
+                    status=status.HTTP_400_BAD_REQUEST,
+                )
+            try:
+                rider_ids = [str(uuid.UUID(rider_id)) for rider_id in rider_ids]
+            except ValueError:
+                return Response(
+                    {"error": "ids must be comma separated rider UUIDs"},
+                    status=status.HTTP_400_BAD_REQUEST,
+                )
+        else:
+            rider_ids = Rider.objects.filter(is_active=True).order_by("id").values_list("id", flat=True)[:max_ids]
+        try:
+            locations = rider_service.get_rider_locations(rider_ids)
+            return Response(
+                [
+                    {"rider_id": rider_id, "location": location}
+                    for rider_id, location in locations.items()
+                ]
+            )
+        except Exception as e:
+            return Response(
+                {"error": str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR
+            )
+
     @action(detail=True, methods=["get"])
     def current_location(self, request, pk=None):
         try:
@@ -115,7 +157,11 @@ class RiderViewSet(viewsets.ViewSet):
     @action(detail=True, methods=["get"])
     def location_history(self, request, pk=None):
         limit = int(request.query_params.get("limit", 10))
-        history = rider_service.get_rider_location_history(rider_id=pk, limit=limit)
+        # ?hours= widens the default lookback window (up to the retention period)
+        hours = request.query_params.get("hours")
+        history = rider_service.get_rider_location_history(
+            rider_id=pk, limit=limit, hours=float(hours) if hours else None
+        )
         if not history:
             return Response(
                 {"error": "Location history not available !!"},
@@ -195,6 +195,95 @@ REDIS_DB = os.getenv("REDIS_DB")
 KAFKA_BOOTSTRAP_SERVERS = os.getenv("KAFKA_BOOTSTRAP_SERVERS")
 KAFKA_CLIENT_ID = socket.gethostname()
 KAFKA_GROUP_ID = os.getenv("KAFKA_CONSUMER_GROUP_ID")
+# Producer: async (fire-and-forget) publishing and client side batching
+KAFKA_PRODUCER_ASYNC = os.getenv("KAFKA_PRODUCER_ASYNC", "true").lower() in ("1", "true", "yes")
+KAFKA_PRODUCER_LINGER_MS = int(os.getenv("KAFKA_PRODUCER_LINGER_MS", 5))
+KAFKA_PRODUCER_BATCH_SIZE = int(os.getenv("KAFKA_PRODUCER_BATCH_SIZE", 65536))
+KAFKA_PRODUCER_COMPRESSION = os.getenv("KAFKA_PRODUCER_COMPRESSION", "lz4")
+# Value codec for rider location events: "location.v1" (fixed binary layout)
+# or "json". Consumers decode either, based on the message's codec header
+KAFKA_LOCATION_CODEC = os.getenv("KAFKA_LOCATION_CODEC", "location.v1")
+# Location consumer: max messages per batch, how long to wait filling one
+# (seconds) and concurrent WebSocket sends per batch
+LOCATION_CONSUMER_BATCH_SIZE = int(os.getenv("LOCATION_CONSUMER_BATCH_SIZE", 500))
+LOCATION_CONSUMER_BATCH_TIMEOUT = float(os.getenv("LOCATION_CONSUMER_BATCH_TIMEOUT", 0.5))
+LOCATION_CONSUMER_FANOUT_CONCURRENCY = int(os.getenv("LOCATION_CONSUMER_FANOUT_CONCURRENCY", 100))
+# Locations older than this (seconds) are skipped and their partition jumps
+# to the newest offset, newest-wins for live tracking (0 disables)
+LOCATION_CONSUMER_MAX_STALENESS_SECONDS = float(os.getenv("LOCATION_CONSUMER_MAX_STALENESS_SECONDS", 30))
+# Start a location consumer thread inside server processes. Turn off when
+# consumers run as dedicated workers (manage.py run_location_consumer)
+LOCATION_CONSUMER_AUTOSTART = os.getenv("LOCATION_CONSUMER_AUTOSTART", "true").lower() in ("1", "true", "yes")
+
+# Rider matching (available riders geo index)
+RIDER_SEARCH_RADIUS_KM = float(os.getenv("RIDER_SEARCH_RADIUS_KM", 10))
+RIDER_SEARCH_MAX_CANDIDATES = int(os.getenv("RIDER_SEARCH_MAX_CANDIDATES", 20))
+# Cached rider positions expire after this, matching only uses positions this fresh
+RIDER_LOCATION_TTL_SECONDS = int(os.getenv("RIDER_LOCATION_TTL_SECONDS", 300))
+# How long an assignment may hold a rider reservation before it expires
+RIDER_RESERVATION_TTL_MS = int(os.getenv("RIDER_RESERVATION_TTL_MS", 10000))
+# Distance kernel accuracy: haversine, equirectangular or geodesic
+DISTANCE_MODE = os.getenv("DISTANCE_MODE", "haversine")
+# Dispatch sweep strategy: "greedy" (one order at a time) or "global" (min-cost matching)
+DISPATCH_STRATEGY = os.getenv("DISPATCH_STRATEGY", "greedy")
+# Time budget for improving a batch pickup/drop route
+BATCH_ROUTE_TIME_BUDGET_MS = float(os.getenv("BATCH_ROUTE_TIME_BUDGET_MS", 50))
+
+# ETA engine: straight-line to road distance factor, pickup/drop handover
+# time, minimum ETA change that is persisted/pushed, reported speed smoothing
+ETA_ROUTE_FACTOR = float(os.getenv("ETA_ROUTE_FACTOR", 1.3))
+ETA_HANDOVER_MINUTES = float(os.getenv("ETA_HANDOVER_MINUTES", 3))
+ETA_UPDATE_THRESHOLD_SECONDS = float(os.getenv("ETA_UPDATE_THRESHOLD_SECONDS", 60))
+ETA_SPEED_SMOOTHING = float(os.getenv("ETA_SPEED_SMOOTHING", 0.2))
+
+# Route progress: max distance from the route before a ping counts as off
+# route, consecutive off-route pings before re-routing, remaining distance
+# for the rider_nearby event, segments searched around the last match
+ROUTE_OFF_ROUTE_METERS = float(os.getenv("ROUTE_OFF_ROUTE_METERS", 75))
+ROUTE_REROUTE_AFTER = int(os.getenv("ROUTE_REROUTE_AFTER", 3))
+ROUTE_NEARBY_KM = float(os.getenv("ROUTE_NEARBY_KM", 0.5))
+ROUTE_SEARCH_WINDOW = int(os.getenv("ROUTE_SEARCH_WINDOW", 25))
+# Background threads building delivery routes (OSRM calls), per process
+ROUTE_BUILD_WORKERS = int(os.getenv("ROUTE_BUILD_WORKERS", 4))
+# Decoded routes kept in memory per process
+ROUTE_LOCAL_CACHE_ENTRIES = int(os.getenv("ROUTE_LOCAL_CACHE_ENTRIES", 5000))
+
+# Order preparation timer scheduler
+ORDER_SCHEDULER_WORKERS = int(os.getenv("ORDER_SCHEDULER_WORKERS", 4))
+ORDER_SCHEDULER_POLL_INTERVAL = float(os.getenv("ORDER_SCHEDULER_POLL_INTERVAL", 1.0))
+# A claimed timer whose handler has not finished within the lease runs again
+ORDER_SCHEDULER_LEASE_SECONDS = float(os.getenv("ORDER_SCHEDULER_LEASE_SECONDS", 60))
+# Run the scheduler inside server processes; management commands never start it
+ORDER_SCHEDULER_AUTOSTART = os.getenv("ORDER_SCHEDULER_AUTOSTART", "true").lower() in ("1", "true", "yes")
+
+# Routing: "osrm" (public OSRM HTTP API) or "local" (in-process road graph)
+ROUTING_BACKEND = os.getenv("ROUTING_BACKEND", "osrm")
+ROUTING_GRAPH_PATH = os.getenv("ROUTING_GRAPH_PATH")
+ROUTING_MAX_SNAP_KM = float(os.getenv("ROUTING_MAX_SNAP_KM", 1.0))
+# Route cache: in-process LRU (bytes of encoded polylines) + Redis tier with TTL
+ROUTE_CACHE_MAX_BYTES = int(os.getenv("ROUTE_CACHE_MAX_BYTES", 8 * 1024 * 1024))
+ROUTE_CACHE_TTL = int(os.getenv("ROUTE_CACHE_TTL", 86400))
+# Decimal places kept when quantizing route endpoints (4 ~= 11m)
+ROUTE_CACHE_KEY_PRECISION = int(os.getenv("ROUTE_CACHE_KEY_PRECISION", 4))
+
+# Delivery context cache (delivery -> order/rider/status) for location fanout
+DELIVERY_CONTEXT_TTL = int(os.getenv("DELIVERY_CONTEXT_TTL", 7200))
+DELIVERY_CONTEXT_LOCAL_TTL = float(os.getenv("DELIVERY_CONTEXT_LOCAL_TTL", 30))
+DELIVERY_CONTEXT_LOCAL_MAX_ENTRIES = int(os.getenv("DELIVERY_CONTEXT_LOCAL_MAX_ENTRIES", 10000))
+# Unknown delivery ids are remembered this long before the database is asked again
+DELIVERY_CONTEXT_MISS_TTL = int(os.getenv("DELIVERY_CONTEXT_MISS_TTL", 30))
+
+# Rider location persistence (buffered bulk writer)
+RIDER_LOCATION_BATCH_SIZE = int(os.getenv("RIDER_LOCATION_BATCH_SIZE", 500))
+RIDER_LOCATION_FLUSH_INTERVAL = float(os.getenv("RIDER_LOCATION_FLUSH_INTERVAL", 1.0))
+RIDER_LOCATION_MAX_BUFFER = int(os.getenv("RIDER_LOCATION_MAX_BUFFER", 50000))
+# rider_locations partitioning / retention (manage_location_partitions)
+RIDER_LOCATION_PARTITION_GRANULARITY = os.getenv("RIDER_LOCATION_PARTITION_GRANULARITY", "daily")
+RIDER_LOCATION_RETENTION_DAYS = int(os.getenv("RIDER_LOCATION_RETENTION_DAYS", 30))
+# How far back location lookups scan, keeps queries on recent partitions
+RIDER_LOCATION_LOOKBACK_HOURS = int(os.getenv("RIDER_LOCATION_LOOKBACK_HOURS", 24))
+# Most riders returned by one bulk locations request
+RIDER_LOCATIONS_MAX_IDS = int(os.getenv("RIDER_LOCATIONS_MAX_IDS", 500))
 
 # Channels (WebSocket)
 ASGI_APPLICATION = "config.asgi.application"
@@ -1,6 +1,7 @@
 import logging
 
 import redis
+import redis.asyncio
 from django.conf import settings
 from django.core.cache import cache
 from django_redis import get_redis_connection
@@ -20,6 +21,18 @@ class RedisClient:
         )
 
 
+class AsyncRedisClient:
+    """redis.asyncio client for code running on the ASGI event loop"""
+
+    def __init__(self):
+        self.client = redis.asyncio.Redis(
+            host=settings.REDIS_HOST,
+            port=settings.REDIS_PORT,
+            db=settings.REDIS_DB,
+            decode_responses=True,
+        )
+
+
 def check_cache_connection():
     # Check if the cache is configured correctly
     if not settings.CACHES:
@@ -96,3 +109,4 @@ def update_key_ttl(key, ttl):
 
 
 redis_client = RedisClient().client
+async_redis_client = AsyncRedisClient().client
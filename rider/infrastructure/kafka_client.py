@@ -1,51 +1,236 @@
+import atexit
 import json
+import math
+import struct
+import threading
+import uuid
+from concurrent.futures import Future, ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeoutError
 from django.utils import timezone
-from datetime import timedelta
+from datetime import datetime, timedelta
 
 from confluent_kafka import Consumer, Producer
 from confluent_kafka.error import KafkaError
 from django.conf import settings
 
 
-class KafkaClient:
-    def __init__(self):
-        self.producer = Producer(
-            {
-                "bootstrap.servers": settings.KAFKA_BOOTSTRAP_SERVERS,
-                "client.id": settings.KAFKA_CLIENT_ID,
-            }
+# Message header naming the codec of the value; messages without it are JSON
+CODEC_HEADER = "codec"
+JSON_CODEC = "json"
+LOCATION_CODEC_V1 = "location.v1"
+
+
+class JsonCodec:
+    name = JSON_CODEC
+
+    @staticmethod
+    def encode(event_data: dict) -> bytes:
+        return json.dumps(event_data).encode("utf-8")
+
+    @staticmethod
+    def decode(value: bytes) -> dict:
+        return json.loads(value.decode("utf-8"))
+
+
+class LocationCodecV1:
+    """
+    Fixed 62-byte layout for rider location messages (little endian):
+    flags (u8), rider id (16-byte UUID), delivery id (16-byte UUID, zeros when
+    absent), lat, lng, accuracy, speed, heading (float32, NaN when absent),
+    battery level (i8, -1 when absent), location time (i64 epoch millis).
+    Timestamps are naive local ISO strings on both sides, as produced by
+    rider_service.build_location_payload, to millisecond precision.
+    """
+
+    name = LOCATION_CODEC_V1
+    _layout = struct.Struct("<B16s16sfffffbq")
+    _HAS_DELIVERY = 0x01
+    _NO_DELIVERY = bytes(16)
+    _OPTIONAL_FLOATS = ("accuracy", "speed", "heading")
+
+    @classmethod
+    def encode(cls, event_data: dict) -> bytes:
+        location = event_data["location"]
+        delivery_id = event_data.get("delivery_id")
+        optional = [
+            math.nan if location.get(field) is None else float(location[field])
+            for field in cls._OPTIONAL_FLOATS
+        ]
+        battery = location.get("battery_level")
+        timestamp = location.get("timestamp") or event_data.get("timestamp")
+        millis = (
+            int(datetime.fromisoformat(timestamp).timestamp() * 1000)
+            if timestamp else int(datetime.now().timestamp() * 1000)
         )
-        self.consumer = Consumer(
-            {
-                "bootstrap.servers": settings.KAFKA_BOOTSTRAP_SERVERS,
-                "auto.offset.reset": "earliest",
-                "group.id": settings.KAFKA_GROUP_ID,
-            }
+        return cls._layout.pack(
+            cls._HAS_DELIVERY if delivery_id else 0,
+            uuid.UUID(str(event_data["rider_id"])).bytes,
+            uuid.UUID(str(delivery_id)).bytes if delivery_id else cls._NO_DELIVERY,
+            float(location["lat"]),
+            float(location["lng"]),
+            *optional,
+            -1 if battery is None else int(battery),
+            millis,
         )
 
-    def publish(self, topic: str, event_data: dict, partition=None, key=None):
-        """Publish event to Kafka topic, with automatic DLQ on failure"""
-        delivery_failed = {'failed': False, 'error': None}
-        
+    @staticmethod
+    def _uuid_str(raw: bytes) -> str:
+        # Same as str(uuid.UUID(bytes=raw)) at a fraction of the cost
+        h = raw.hex()
+        return f"{h[:8]}-{h[8:12]}-{h[12:16]}-{h[16:20]}-{h[20:]}"
+
+    @classmethod
+    def decode(cls, value: bytes) -> dict:
+        flags, rider, delivery, lat, lng, accuracy, speed, heading, battery, millis = cls._layout.unpack(value)
+        timestamp = datetime.fromtimestamp(millis / 1000).isoformat()
+        return {
+            "rider_id": cls._uuid_str(rider),
+            "delivery_id": cls._uuid_str(delivery) if flags & cls._HAS_DELIVERY else None,
+            "location": {
+                # float32 carries ~7 significant digits, drop the noise beyond them
+                "lat": round(lat, 6),
+                "lng": round(lng, 6),
+                "accuracy": None if math.isnan(accuracy) else accuracy,
+                "speed": None if math.isnan(speed) else speed,
+                "heading": None if math.isnan(heading) else heading,
+                "battery_level": None if battery < 0 else battery,
+                "timestamp": timestamp,
+            },
+            "timestamp": timestamp,
+        }
+
+
+CODECS = {codec.name: codec for codec in (JsonCodec, LocationCodecV1)}
+
+
+def decode_message(value: bytes, headers=None) -> dict:
+    """
+    Decode a message value with the codec named in its headers (JSON when
+    there is none). An unknown codec raises ValueError; consumers skip such
+    a message rather than block their partition on it.
+    """
+    codec = JsonCodec
+    for header, header_value in headers or ():
+        if header == CODEC_HEADER:
+            name = header_value.decode("ascii")
+            if name not in CODECS:
+                raise ValueError(f"Unknown message codec: {name}")
+            codec = CODECS[name]
+            break
+    return codec.decode(value)
+
+
+class KafkaClient:
+    def __init__(self):
+        # librdkafka handles are created on first use: they own background
+        # threads and must not exist in a process that forks workers
+        self._producer = None
+        self._consumer = None
+        self._dlq_executor = None
+        self._init_lock = threading.Lock()
+        # Fire-and-forget by default, delivery callbacks are served by a poll thread
+        self.async_mode = settings.KAFKA_PRODUCER_ASYNC
+        self._polling = False
+        self._poll_thread = None
+        self._poll_lock = threading.Lock()
+
+    @property
+    def producer(self):
+        if self._producer is None:
+            with self._init_lock:
+                if self._producer is None:
+                    self._producer = Producer(
+                        {
+                            "bootstrap.servers": settings.KAFKA_BOOTSTRAP_SERVERS,
+                            "client.id": settings.KAFKA_CLIENT_ID,
+                            "linger.ms": settings.KAFKA_PRODUCER_LINGER_MS,
+                            "batch.size": settings.KAFKA_PRODUCER_BATCH_SIZE,
+                            "compression.type": settings.KAFKA_PRODUCER_COMPRESSION,
+                        }
+                    )
+        return self._producer
+
+    @producer.setter
+    def producer(self, producer):
+        self._producer = producer
+
+    @property
+    def consumer(self):
+        if self._consumer is None:
+            with self._init_lock:
+                if self._consumer is None:
+                    self._consumer = Consumer(
+                        {
+                            "bootstrap.servers": settings.KAFKA_BOOTSTRAP_SERVERS,
+                            "auto.offset.reset": "earliest",
+                            "group.id": settings.KAFKA_GROUP_ID,
+                        }
+                    )
+        return self._consumer
+
+    @property
+    def initialized(self) -> bool:
+        return self._producer is not None or self._consumer is not None
+
+    def publish(self, topic: str, event_data: dict, partition=None, key=None, wait=None, codec=None):
+        """
+        Publish event to Kafka topic, with automatic DLQ on failure.
+        In async mode the message is only handed to the producer queue and True
+        means it was enqueued; pass wait=True to block until the broker acks it.
+        `codec` names the value encoding (see CODECS), JSON by default.
+        """
+        if wait is None:
+            wait = not self.async_mode
+
+        future = self.publish_async(topic, event_data, partition=partition, key=key, codec=codec)
+        if not wait:
+            # Only an immediate produce failure is known at this point
+            return not future.done() or future.result()
+
+        self.producer.flush(timeout=5)
+        try:
+            return future.result(timeout=5)
+        except FutureTimeoutError:
+            print(f"Timed out waiting for delivery to topic: {topic}")
+            return False
+
+    def publish_async(
+        self, topic: str, event_data: dict, partition=None, key=None, codec=None, dead_letter=True,
+        block=True,
+    ) -> Future:
+        """
+        Enqueue an event without waiting for the broker.
+        Returns a Future resolving to True once delivered, or False once the
+        event was sent to the DLQ. Async callers can await asyncio.wrap_future(...).
+        With dead_letter=False failures are only reported through the Future,
+        for callers that retry themselves (the outbox relay).
+        Callers on an event loop pass block=False: a full producer queue then
+        fails at once instead of polling, and the DLQ row (an ORM write) is
+        written from a background thread.
+        """
+        future = Future()
+
         def delivery_callback(err, msg):
             """Callback for message delivery"""
             if err is not None:
-                delivery_failed['failed'] = True
-                delivery_failed['error'] = str(err)
                 print(f"Message delivery failed: {err}")
                 # Send to DLQ
                 try:
-                    self._send_to_dlq(topic, event_data, str(err))
+                    if dead_letter:
+                        self._send_to_dlq(topic, event_data, str(err))
                 except Exception as e:
                     print(f"Error sending to DLQ: {e}")
-        
+                future.set_result(False)
+            else:
+                future.set_result(True)
+
         try:
-            # Use delivery_id or rider_id as partition key for better distribution
-            event_json = json.dumps(event_data)
+            value, codec_name = self._encode(event_data, codec)
             
             # Prepare produce arguments - only include partition if it's not None
             produce_kwargs = {
-                'value': event_json.encode("utf-8"),
+                'value': value,
+                'headers': [(CODEC_HEADER, codec_name.encode("ascii"))],
                 'callback': delivery_callback
             }
             
@@ -56,21 +241,72 @@ class KafkaClient:
             if partition is not None:
                 produce_kwargs['partition'] = partition
             
-            self.producer.produce(topic, **produce_kwargs)
-            self.producer.poll(0)  # Trigger delivery callbacks
-            self.producer.flush(timeout=5)
-            
-            if delivery_failed['failed']:
-                return False
-            return True
+            self._produce(topic, produce_kwargs, block=block)
+            self._ensure_poll_thread()
         except KafkaError as e:
             print(f"Kafka error: {e}")
-            self._send_to_dlq(topic, event_data, str(e))
-            return False
+            if dead_letter:
+                self._dead_letter(topic, event_data, str(e), background=not block)
+            future.set_result(False)
         except Exception as e:
             print(f"Unexpected error publishing to Kafka: {e}")
-            self._send_to_dlq(topic, event_data, str(e))
-            return False
+            if dead_letter:
+                self._dead_letter(topic, event_data, str(e), background=not block)
+            future.set_result(False)
+        return future
+
+    @staticmethod
+    def _encode(event_data: dict, codec=None):
+        """Encode with the requested codec, falling back to JSON for events it cannot represent"""
+        if codec and codec != JSON_CODEC:
+            try:
+                return CODECS[codec].encode(event_data), codec
+            except (KeyError, TypeError, ValueError, struct.error) as e:
+                print(f"Cannot encode event with codec {codec}, using JSON: {e}")
+        return JsonCodec.encode(event_data), JSON_CODEC
+
+    def flush(self, timeout: float = 10):
+        """Block until every queued message is delivered (or the timeout expires)"""
+        if self._producer is None:
+            return 0
+        return self._producer.flush(timeout=timeout)
+
+    def _produce(self, topic: str, produce_kwargs: dict, block: bool = True):
+        try:
+            self.producer.produce(topic, **produce_kwargs)
+        except BufferError:
+            if not block:
+                raise
+            # Local queue is full, serve delivery reports to make room and retry once
+            self.producer.poll(0.5)
+            self.producer.produce(topic, **produce_kwargs)
+
+    def _dead_letter(self, topic: str, event_data: dict, error_message: str, background: bool):
+        if not background:
+            self._send_to_dlq(topic, event_data, error_message)
+            return
+        with self._init_lock:
+            if self._dlq_executor is None:
+                self._dlq_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="kafka-dlq")
+        self._dlq_executor.submit(self._send_to_dlq, topic, event_data, error_message)
+
+    def _ensure_poll_thread(self):
+        if self._polling:
+            return
+        with self._poll_lock:
+            if self._polling:
+                return
+            self._polling = True
+            self._poll_thread = threading.Thread(target=self._poll_loop, daemon=True)
+            self._poll_thread.start()
+
+    def _poll_loop(self):
+        """Serve delivery callbacks in the background"""
+        while self._polling:
+            try:
+                self.producer.poll(0.1)
+            except Exception as e:
+                print(f"Error polling Kafka producer: {e}")
 
     def _send_to_dlq(self, topic: str, event_data: dict, error_message: str):
         """Send failed event to Dead Letter Queue"""
@@ -95,8 +331,14 @@ class KafkaClient:
             print(f"Error creating DLQ entry: {e}")
 
     def close(self):
-        self.producer.flush()
-        self.consumer.close()
+        self._polling = False
+        if self._poll_thread:
+            self._poll_thread.join(timeout=5)
+        if self._producer is not None:
+            self._producer.flush()
+        if self._consumer is not None:
+            self._consumer.close()
 
 
 kafka_client = KafkaClient()
+atexit.register(kafka_client.flush)